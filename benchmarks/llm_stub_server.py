@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+本地LLM桩服务器
+模拟 extract_info_with_llm 与 initialize_qwen_agent 使用的 Ollama /api/generate、/api/chat
+与 OpenAI 兼容 /v1/chat/completions 接口，以可设置的延迟、生成速度与并行槽位
+返回模板化的回答，可在没有模型的环境下对并发、合并批次与缓存功能做全量负载测试
+
+用法:
+    python benchmarks/llm_stub_server.py --port 11435 --latency 0.2 --tokens-per-second 40 --parallel 2
+    OLLAMA_HOST=http://127.0.0.1:11435 python scripts/multi_source_extraction.py
+
+GET /stub/stats 返回累计的请求数、token 数与最高并发/排队数
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RESPONSES_FILE = Path(__file__).parent / "fixtures" / "llm_responses.json"
+
+# 合并批次提示词 (scripts/llm_batcher.py) 的药物数量
+_PACKED_COUNT = re.compile(r'以下共有 (\d+) 種藥品')
+_DRUG_NAME = re.compile(r'藥品名稱[:：]\s*(\S+)')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数 (约 4 个 UTF-8 字节一个 token)"""
+    return max(1, len(text.encode('utf-8')) // 4)
+
+
+def _strip_code_fence(text: str) -> str:
+    match = re.search(r'```json(.*?)```', text, re.DOTALL)
+    return match.group(1).strip() if match else text.strip()
+
+
+class LLMStub:
+    """桩模型：依提示词选择模板回答，并以并行槽位与生成速度模拟推理耗时
+
+    responses 格式同 fixtures/llm_responses.json：
+    generate 为 {模板名: 回答或回答列表}，chat 为回答或回答列表 (缺省时使用 summaries)；
+    回答中的 {drug_name} 会替换为提示词里「藥品名稱：」之后的名称
+    """
+
+    def __init__(self, responses: dict, latency: float = 0.0, tokens_per_second: float = 0.0,
+                 prompt_tokens_per_second: float = 0.0, parallel: int = 0,
+                 error_rate: float = 0.0, seed: int = 0, model: str = 'stub'):
+        self.responses = responses
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.error_rate = error_rate
+        self.model = model
+        # 0 表示不限制，对应 OLLAMA_NUM_PARALLEL
+        self._slots = threading.Semaphore(parallel) if parallel > 0 else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0, 'errors': 0, 'packed_requests': 0, 'packed_drugs': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0,
+            'in_flight': 0, 'max_in_flight': 0, 'queued': 0, 'max_queued': 0
+        }
+
+    def _pick(self, answers, prompt: str) -> str:
+        """回答列表时以提示词的哈希固定选取，使同一提示词每次得到相同回答"""
+        if isinstance(answers, list):
+            digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+            answers = answers[int.from_bytes(digest[:4], 'big') % len(answers)]
+        match = _DRUG_NAME.search(prompt)
+        return answers.replace('{drug_name}', match.group(1) if match else '')
+
+    def answer_generate(self, prompt: str) -> str:
+        templates = self.responses['generate']
+        packed = _PACKED_COUNT.search(prompt)
+        if packed:
+            count = int(packed.group(1))
+            template = 'ingredient_translation' if '翻譯' in prompt else 'general'
+            item = json.loads(_strip_code_fence(self._pick(templates[template], prompt)))
+            with self._lock:
+                self.stats['packed_requests'] += 1
+                self.stats['packed_drugs'] += count
+            return json.dumps({str(number): item for number in range(1, count + 1)}, ensure_ascii=False)
+        template = 'ingredient_translation' if '翻譯' in prompt else 'general'
+        return self._pick(templates.get(template, templates['general']), prompt)
+
+    def answer_chat(self, messages: list) -> str:
+        prompt = "\n".join(str(message.get('content', '')) for message in messages)
+        answers = self.responses.get('chat') or self.responses.get('summaries') or self.responses['generate']['general']
+        return self._pick(answers, prompt)
+
+    def serve(self, prompt: str, answer_func):
+        """占用一个并行槽位并等待模拟的推理时间，返回 (回答, prompt tokens, completion tokens)；
+        注入失败时返回 None"""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['queued'] += 1
+            self.stats['max_queued'] = max(self.stats['max_queued'], self.stats['queued'])
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            with self._lock:
+                self.stats['queued'] -= 1
+                self.stats['in_flight'] += 1
+                self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            text = answer_func()
+            prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(text)
+            delay = self.latency
+            if self.prompt_tokens_per_second > 0:
+                delay += prompt_tokens / self.prompt_tokens_per_second
+            if self.tokens_per_second > 0:
+                delay += completion_tokens / self.tokens_per_second
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+        with self._lock:
+            if failed:
+                self.stats['errors'] += 1
+                return None
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+        return text, prompt_tokens, completion_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+class LLMStubHandler(BaseHTTPRequestHandler):
+    """Ollama 与 OpenAI 兼容接口；server.llm 须为 LLMStub"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, content_type: str, chunks: list):
+        """无 Content-Length 的流式回应，以关闭连接结束"""
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk.encode('utf-8'))
+            self.wfile.flush()
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def handle_llm_get(self, path: str) -> bool:
+        """处理LLM相关的 GET 路径，未匹配时返回 False"""
+        stub = self.server.llm
+        if path == '/stub/stats':
+            self._send_json(200, stub.snapshot())
+        elif path == '/api/tags':
+            self._send_json(200, {'models': [{'name': stub.model, 'model': stub.model}]})
+        elif path == '/api/version':
+            self._send_json(200, {'version': '0.0.0-stub'})
+        elif path == '/v1/models':
+            self._send_json(200, {'object': 'list', 'data': [{'id': stub.model, 'object': 'model', 'owned_by': 'stub'}]})
+        else:
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.handle_llm_get(self.path.split('?', 1)[0]):
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        handlers = {
+            '/api/generate': self._ollama_generate,
+            '/api/chat': self._ollama_chat,
+            '/v1/chat/completions': self._openai_chat,
+        }
+        if path not in handlers:
+            self._send_json(404, {'error': 'not found'})
+            return
+        handlers[path](self._read_json())
+
+    def _ollama_reply(self, request: dict, prompt: str, answer_func, message: bool):
+        result = self.server.llm.serve(prompt, answer_func)
+        if result is None:
+            self._send_json(500, {'error': 'stub injected failure'})
+            return
+        text, prompt_tokens, completion_tokens = result
+        created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        content = {'message': {'role': 'assistant', 'content': text}} if message else {'response': text}
+        empty = {'message': {'role': 'assistant', 'content': ''}} if message else {'response': ''}
+        final = {
+            'model': request.get('model', ''), 'created_at': created_at, 'done': True, 'done_reason': 'stop',
+            'prompt_eval_count': prompt_tokens, 'eval_count': completion_tokens
+        }
+        if request.get('stream', True) is False:
+            self._send_json(200, {**final, **content})
+        else:
+            partial = {'model': request.get('model', ''), 'created_at': created_at, 'done': False, **content}
+            self._send_stream('application/x-ndjson', [
+                json.dumps(partial, ensure_ascii=False) + "\n",
+                json.dumps({**final, **empty}, ensure_ascii=False) + "\n"
+            ])
+
+    def _ollama_generate(self, request: dict):
+        prompt = request.get('prompt', '')
+        self._ollama_reply(request, prompt, lambda: self.server.llm.answer_generate(prompt), message=False)
+
+    def _ollama_chat(self, request: dict):
+        messages = request.get('messages', [])
+        prompt = "\n".join(str(m.get('content', '')) for m in messages)
+        self._ollama_reply(request, prompt, lambda: self.server.llm.answer_chat(messages), message=True)
+
+    def _openai_chat(self, request: dict):
+        messages = request.get('messages', [])
+        prompt = "\n".join(str(m.get('content', '')) for m in messages)
+        result = self.server.llm.serve(prompt, lambda: self.server.llm.answer_chat(messages))
+        if result is None:
+            self._send_json(500, {'error': {'message': 'stub injected failure', 'type': 'server_error'}})
+            return
+        text, prompt_tokens, completion_tokens = result
+        completion_id = f"chatcmpl-{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]}"
+        base = {'id': completion_id, 'created': int(time.time()), 'model': request.get('model', '')}
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        if not request.get('stream'):
+            self._send_json(200, {
+                **base, 'object': 'chat.completion',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': usage
+            })
+            return
+        chunks = [
+            {**base, 'object': 'chat.completion.chunk',
+             'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': text}, 'finish_reason': None}]},
+            {**base, 'object': 'chat.completion.chunk',
+             'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage},
+        ]
+        self._send_stream('text/event-stream', [
+            *(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n" for chunk in chunks),
+            "data: [DONE]\n\n"
+        ])
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的 listen 队列只有 5，负载测试时会拒绝连接
+    request_queue_size = 1024
+
+
+def load_responses(path: Path = RESPONSES_FILE) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def start_llm_stub(stub: LLMStub, host: str = '127.0.0.1', port: int = 0, handler=LLMStubHandler):
+    """在背景线程启动桩服务器，返回 (server, base_url)"""
+    server = StubHTTPServer((host, port), handler)
+    server.llm = stub
+    threading.Thread(target=server.serve_forever, name='llm-stub-server', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Ollama / OpenAI 兼容LLM桩服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--responses', type=Path, default=RESPONSES_FILE, help="回答模板 JSON 文件")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的固定延迟(秒)")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="生成速度，0 为不限")
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=0.0, help="提示词处理速度，0 为不限")
+    parser.add_argument('--parallel', type=int, default=0, help="同时处理的请求数 (同 OLLAMA_NUM_PARALLEL)，0 为不限")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument('--seed', type=int, default=0, help="注入失败使用的随机种子")
+    parser.add_argument('--model', default='gpt-oss:20b', help="/api/tags 与 /v1/models 列出的模型名称")
+    args = parser.parse_args()
+
+    stub = LLMStub(
+        load_responses(args.responses), latency=args.latency, tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second, parallel=args.parallel,
+        error_rate=args.error_rate, seed=args.seed, model=args.model
+    )
+    server = StubHTTPServer((args.host, args.port), LLMStubHandler)
+    server.llm = stub
+    print(f"LLM桩服务器: http://{args.host}:{server.server_address[1]}  (Ctrl+C 结束)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stub.snapshot(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+提取流程热点基准测试
+以 fixtures 录制资料与本地桩服务器离线执行，统计各阶段 p50/p95 与端到端吞吐量，
+并与 baseline.json 比较，超出容许倍数时以非零状态码结束；
+端到端 (main) 每轮耗时数百毫秒、受机器负载影响大，以多轮中最快的一轮比较
+
+用法:
+    python benchmarks/run_benchmarks.py                    # 执行并与基线比较
+    python benchmarks/run_benchmarks.py --update-baseline  # 以本次结果更新基线
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.stub_server import FIXTURES_DIR, start_stub_server
+from scripts.summary_parser import parse_google_summary
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+# 比基线慢不到此毫秒数时不算退化 (亚毫秒级阶段的倍数主要反映调度噪声)
+MIN_DELTA_MS = 1.0
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """最近秩百分位数"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def time_calls(func, args_list: list, iterations: int) -> list:
+    """逐次计时，返回每次调用的毫秒数"""
+    samples = []
+    for _ in range(iterations):
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def setup_environment(work_dir: str, latency: float, **llm_options):
+    """启动桩服务器并将项目的资料源、输出目录与 Ollama 主机指向离线环境"""
+    server, base_url = start_stub_server(FIXTURES_DIR, latency, **llm_options)
+    # 须在导入项目模块之前设置
+    os.environ['DRUG_EXTRACTION_OUTPUT_DIR'] = work_dir
+    # 追踪文件也写入临时目录，不留在项目的 logs/metrics
+    os.environ['DRUG_EXTRACTION_TRACE_DIR'] = os.path.join(work_dir, 'metrics')
+    os.environ['OLLAMA_HOST'] = base_url
+
+    from config.project_config import SOURCE_URLS
+    SOURCE_URLS['TFDA'] = f"{base_url}/tfda"
+    SOURCE_URLS['NHI_DATA_DOWNLOAD'] = f"{base_url}/nhi.csv"
+
+    import scripts.multi_source_extraction as extraction
+    from scripts import async_fetcher
+
+    logging.getLogger().setLevel(logging.WARNING)
+    page_urls = [f"{base_url}/pages/{page.name}" for page in sorted((FIXTURES_DIR / 'pages').glob('*.html'))]
+    extraction.google_search = lambda query, **kwargs: iter(page_urls)
+    if not extraction.search_libs_available():
+        raise RuntimeError("基准测试需要 googlesearch-python 与 trafilatura")
+    # 基准测试量测LLM调用与网页下载本身，不使用响应缓存与网页缓存
+    extraction.LLM_CACHE_ENABLED = False
+    extraction.PAGE_CACHE_ENABLED = False
+    if async_fetcher.HAS_AIOHTTP:
+        # 桩服务器只有一个主机，取消礼貌间隔以免量测到的是等待时间
+        async_fetcher._fetcher = async_fetcher.AsyncPageFetcher(per_host_delay=0.0, use_cache=False)
+    return server, extraction
+
+
+def run_suite(extraction, iterations: int, main_iterations: int) -> dict:
+    import pandas as pd
+    from config.project_config import PROGRESS_LEDGER_DB
+
+    drugs_csv = FIXTURES_DIR / 'drugs.csv'
+    drugs = pd.read_csv(drugs_csv, encoding='utf-8-sig', keep_default_na=False, dtype=str).to_dict('records')
+    with open(FIXTURES_DIR / 'llm_responses.json', encoding='utf-8') as f:
+        summaries = json.load(f)['summaries']
+
+    lookup_args = [(d['藥品中文名稱'], d['製造廠名稱'], d['成份']) for d in drugs]
+    # 首次调用会下载快照与建立资料表，不计入
+    extraction.scrape_tfda(*lookup_args[0])
+    extraction.scrape_nhi(*lookup_args[0])
+
+    results = {}
+    stages = {
+        'scrape_tfda': (extraction.scrape_tfda, lookup_args),
+        'scrape_nhi': (extraction.scrape_nhi, lookup_args),
+        'parse_google_summary': (parse_google_summary, [(text,) for text in summaries] * 20),
+        'extract_info_with_llm': (
+            extraction.extract_info_with_llm,
+            [(extraction.scrape_tfda(*args) or args[0], args[0], 'tfda_api') for args in lookup_args[:10]]
+        ),
+        'search_and_extract_web_content': (
+            extraction.search_and_extract_web_content,
+            [(d['藥品中文名稱'], d['藥品中文名稱'], 'chinese_search') for d in drugs[:10]]
+        ),
+    }
+    for name, (func, args_list) in stages.items():
+        samples = time_calls(func, args_list, iterations)
+        results[name] = {
+            'calls': len(samples),
+            'p50_ms': round(percentile(samples, 0.50), 3),
+            'p95_ms': round(percentile(samples, 0.95), 3)
+        }
+
+    # 端到端: 以 fixtures 药物清单执行 main，每轮清除输出与进度账本
+    extraction.INPUT_CSV = str(drugs_csv)
+    extraction.IS_DEMO = False
+    extraction.BATCH_SIZE = 10
+    run_seconds = []
+    for _ in range(main_iterations):
+        for name in (extraction.OUTPUT_CSV, extraction.INCOMPLETE_OUTPUT_CSV, PROGRESS_LEDGER_DB):
+            for path in (name, name + '-wal', name + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+        start = time.perf_counter()
+        extraction.main()
+        run_seconds.append(time.perf_counter() - start)
+    best = min(run_seconds)
+    results['main'] = {
+        'drugs': len(drugs),
+        'p50_ms': round(percentile(run_seconds, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(run_seconds, 0.95) * 1000, 3),
+        'best_ms': round(best * 1000, 3),
+        'drugs_per_second': round(len(drugs) / best, 2)
+    }
+    return results
+
+
+def print_report(results: dict, baseline: dict):
+    print(f"{'阶段':<32}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'基线p50':>12}")
+    for name, stats in results.items():
+        base = baseline.get(name, {}).get('p50_ms')
+        calls = stats.get('calls', stats.get('drugs'))
+        print(f"{name:<32}{calls:>8}{stats['p50_ms']:>12.3f}{stats['p95_ms']:>12.3f}{(base if base is not None else '-'):>12}")
+    print(f"端到端吞吐量: {results['main']['drugs_per_second']} 药物/秒 (最快一轮 {results['main']['best_ms']:.3f}ms, "
+          f"基线 {baseline.get('main', {}).get('best_ms', '-')})")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float, min_delta_ms: float = MIN_DELTA_MS) -> list:
+    """p50 (端到端为最快一轮) 超过基线 tolerance 倍且多出至少 min_delta_ms 毫秒，
+    或吞吐量低于基线 1/tolerance 时视为退化；亚毫秒级的阶段只差调度噪声时不算退化"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        metric = 'best_ms' if 'best_ms' in stats and 'best_ms' in base else 'p50_ms'
+        if stats[metric] > base[metric] * tolerance and stats[metric] - base[metric] >= min_delta_ms:
+            regressions.append(
+                f"{name}: {metric[:-3]} {stats[metric]:.3f}ms > 基线 {base[metric]:.3f}ms × {tolerance}"
+            )
+        if 'drugs_per_second' in base and stats['drugs_per_second'] < base['drugs_per_second'] / tolerance:
+            regressions.append(f"{name}: 吞吐量 {stats['drugs_per_second']} < 基线 {base['drugs_per_second']} / {tolerance}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提取流程热点基准测试")
+    parser.add_argument('--iterations', type=int, default=3, help="每个阶段重复的轮数")
+    parser.add_argument('--main-iterations', type=int, default=5, help="端到端 main 执行的轮数 (取最快一轮比较)")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="相对基线的容许倍数")
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS, help="视为退化所需的最小绝对差(毫秒)")
+    parser.add_argument('--latency', type=float, default=0.0, help="桩服务器每个请求的模拟延迟(秒)")
+    parser.add_argument('--llm-tokens-per-second', type=float, default=0.0, help="桩模型的生成速度，0 为不限")
+    parser.add_argument('--llm-parallel', type=int, default=0, help="桩模型同时处理的请求数，0 为不限")
+    parser.add_argument('--update-baseline', action='store_true', help="以本次结果覆盖基线")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='drug-bench-')
+    try:
+        server, extraction = setup_environment(
+            work_dir, args.latency, tokens_per_second=args.llm_tokens_per_second, parallel=args.llm_parallel
+        )
+        results = run_suite(extraction, args.iterations, args.main_iterations)
+        from scripts.async_fetcher import HAS_AIOHTTP, get_fetcher
+        if HAS_AIOHTTP:
+            get_fetcher().close()
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = {}
+    if BASELINE_FILE.exists():
+        baseline = json.loads(BASELINE_FILE.read_text(encoding='utf-8'))
+    print_report(results, baseline)
+
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding='utf-8')
+        print(f"基线已更新: {BASELINE_FILE}")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("性能退化:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("未发现性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+基准测试用的本地桩服务器
+以 fixtures 目录的录制资料回应 TFDA、NHI 与网页请求，LLM 接口由 llm_stub_server 提供，
+使基准测试无需连网也不需要本地模型
+"""
+
+import time
+import zlib
+from pathlib import Path
+
+from benchmarks.llm_stub_server import LLMStub, LLMStubHandler, load_responses, start_llm_stub
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class FixtureHandler(LLMStubHandler):
+    """按路径返回录制资料"""
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fixtures = self.server.fixtures_dir
+        path = self.path.split('?', 1)[0]
+        if path == '/tfda':
+            self._send(200, (fixtures / 'tfda.json').read_bytes(), 'application/json; charset=utf-8',
+                       {'ETag': '"tfda-fixture"'})
+        elif path == '/nhi.csv':
+            self._send(200, (fixtures / 'nhi.csv').read_bytes(), 'text/csv; charset=utf-8')
+        elif path.startswith('/pages/') and (fixtures / path.lstrip('/')).is_file():
+            body = (fixtures / path.lstrip('/')).read_bytes()
+            # 网页带 ETag，条件请求命中时返回 304 (供网页缓存的重新验证使用)
+            etag = f'"{zlib.crc32(body):08x}"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', 'text/html; charset=utf-8', {'ETag': etag})
+            else:
+                self._send(200, body, 'text/html; charset=utf-8', {'ETag': etag})
+        elif not self.handle_llm_get(path):
+            self._send(404, b'not found', 'text/plain')
+
+
+def start_stub_server(fixtures_dir: Path = FIXTURES_DIR, latency: float = 0.0, **llm_options):
+    """在背景线程启动桩服务器，返回 (server, base_url)；
+    llm_options 传给 LLMStub (tokens_per_second、parallel 等)"""
+    fixtures_dir = Path(fixtures_dir)
+    stub = LLMStub(load_responses(fixtures_dir / 'llm_responses.json'), latency=latency, **llm_options)
+    server, base_url = start_llm_stub(stub, handler=FixtureHandler)
+    server.fixtures_dir = fixtures_dir
+    server.latency = latency
+    return server, base_url
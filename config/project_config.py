@@ -10,43 +10,105 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # 数据文件路径
 DATA_DIR = os.path.join(BASE_DIR, 'data')
-OUTPUT_DIR = os.path.join(BASE_DIR, 'output') 
+OUTPUT_DIR = os.environ.get('DRUG_EXTRACTION_OUTPUT_DIR') or os.path.join(BASE_DIR, 'output')  # 可由环境变量改写 (如基准测试)
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
+CACHE_DIR = os.path.join(OUTPUT_DIR, 'cache')
 
 # 输入输出文件
 INPUT_CSV = os.path.join(DATA_DIR, '1140816健保用藥品項查詢項目檔_健保用藥品項.csv')
 OUTPUT_CSV = os.path.join(OUTPUT_DIR, 'drug_info_extracted_final.csv')
 INCOMPLETE_OUTPUT_CSV = os.path.join(OUTPUT_DIR, 'uncomplete-research.csv')
 GOOGLE_SEARCH_RESULTS_CSV = os.path.join(OUTPUT_DIR, 'google_search_results.csv')
+PROGRESS_LEDGER_DB = os.path.join(OUTPUT_DIR, 'progress_ledger.sqlite')  # 已处理药物的进度账本
+RUN_STATS_FILE = os.path.join(OUTPUT_DIR, 'run_stats.json')  # 每次检查点累加的结果统计
+OUTPUT_FORMAT = 'csv'  # csv: 直接追加CSV, parquet: 每批写入 Parquet 资料集 (需 pyarrow)，CSV 于运行结束时导出
 
 # MCP 配置
 MCP_CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'mcp_config.json')
 
 # 模型配置
-OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST') or "http://localhost:11434"  # 可设环境变量指向 benchmarks/llm_stub_server.py
+if '://' not in OLLAMA_HOST:
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
 OLLAMA_MODEL = "gpt-oss:20b"
 MODEL = OLLAMA_MODEL  # 兼容性别名
 
+# LLM 响应缓存配置
+LLM_CACHE_ENABLED = True
+LLM_CACHE_DB = os.path.join(CACHE_DIR, 'llm_cache.sqlite')
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 缓存容量上限，超出时淘汰最久未使用的条目
+
+# 网页缓存配置 (搜索步骤下载的网页与提取后的正文)
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_DB = os.path.join(CACHE_DIR, 'page_cache.sqlite')
+PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 压缩后的容量上限，超出时淘汰最久未使用的网页
+PAGE_CACHE_TTL = 7 * 24 * 60 * 60  # 秒；期限内直接使用缓存，过期后以 ETag/Last-Modified 条件请求重新验证
+
 # 运行模式配置
 IS_DEMO = True  # True: 演示模式(处理前10种药物), False: 生产模式(处理所有药物)
 DEMO_LIMIT = 10  # 演示模式处理数量
 BATCH_SIZE = 10  # 生产模式每批处理数量
+INPUT_CHUNK_SIZE = 2000  # 流式读取输入CSV时每块的行数
+
+# 并发配置
+DRUG_WORKERS = 1  # 同时处理的药物数量 (1: 依序处理)
+NETWORK_WORKERS = 16  # 网络I/O并发上限 (TFDA/搜索/网页抓取)
+LLM_WORKERS = 2  # LLM调用并发上限 (建议与 OLLAMA_NUM_PARALLEL 一致)
+DEDUP_BY_INGREDIENT = True  # 成份/剂型/含量相同的药物共享一次提取结果
+SPECULATIVE_SEARCH = False  # True: 第3-5步搜索同时启动，按原优先顺序合并，栏位齐全后取消其余步骤
+PIPELINE_MODE = False  # True: 五步法各步骤以独立队列与线程池组成流水线，不同药物的网络与LLM工作互相重叠
+PIPELINE_STAGE_WORKERS = {  # 流水线各阶段的工作线程数
+    'google_results': 1,
+    'tfda': 4,
+    'chinese_search': 4,
+    'english_search': 4,
+    'ingredient_search': 4
+}
+SHARD_COUNT = 1  # >1: 按药品代号哈希分片，各分片在独立进程处理后合并 (各进程各自套用上述并发设置)
+SHARD_DIR = os.path.join(OUTPUT_DIR, 'shards')  # 分片的部分输出与进度账本
+
+# LLM 批量推理配置 (需 DRUG_WORKERS > 1 才能汇集多种药物的请求)
+LLM_BATCH_MODE = 'off'  # off: 各药物直接调用, parallel: 共享队列并行送出, pack: 多种药物合并为一个提示词
+LLM_PACK_SIZE = 4  # pack 模式每个提示词最多包含的药物数
+LLM_PACK_WINDOW = 0.5  # pack 模式等待凑批的秒数
 
 # 搜索配置
 SEARCH_TIMEOUT = 15
 MAX_RESULTS_PER_DRUG = 3
 REQUEST_TIMEOUT = 30
 
+# 网页抓取配置
+ASYNC_FETCH = True  # 安装 aiohttp 时并行抓取候选网页
+FETCH_PER_HOST_LIMIT = 2  # 同一主机的并发连接上限
+FETCH_PER_HOST_DELAY = 1.0  # 同一主机相邻请求的最小间隔(秒)
+SOURCE_CONTENT_LIMIT = 1000  # 每个来源保留的字符数
+PROMPT_CONTENT_LIMIT = 4000  # 送入LLM的内容字符上限
+PASSAGE_RANKING = True  # True: 以 BM25 对各来源的句子段落评分 (适应症/用法用量/注意事项相关词)，只将高分段落装入 PROMPT_CONTENT_LIMIT；False 为每个来源取开头 SOURCE_CONTENT_LIMIT 字
+STREAM_EXTRACT = False  # True: 边下载边提取「適應症/用法/dosage」等标题附近的段落，收集到 SOURCE_CONTENT_LIMIT 字后即停止下载与解析 (取代 trafilatura)
+STREAM_MAX_BYTES = 2 * 1024 * 1024  # 流式提取时每个网页最多下载的字节数
+EXTRACT_PROCESSES = 0  # >0 时网页正文提取 (trafilatura/BeautifulSoup) 在此数量的进程池中执行，0 为在抓取线程中执行
+
+# 步骤量测配置
+METRICS_TRACE_DIR = os.environ.get('DRUG_EXTRACTION_TRACE_DIR') or os.path.join(LOG_DIR, 'metrics')  # 每次运行的 JSONL 追踪文件目录，可由环境变量改写 (如基准测试)
+
 # 数据源URL
 SOURCE_URLS = {
     "TFDA": "https://data.fda.gov.tw/opendata/exportDataList.do",
     "NHI_DATA_DOWNLOAD": "https://data.nhi.gov.tw/resource/mask/maskdata.csv"
 }
 
+# TFDA 本地快照配置
+TFDA_SNAPSHOT_DB = os.path.join(CACHE_DIR, 'tfda_snapshot.sqlite')
+TFDA_SNAPSHOT_MAX_AGE = 24 * 60 * 60  # 快照重新验证间隔(秒)
+
+# NHI 参考资料缓存配置
+NHI_REFERENCE_CACHE = os.path.join(CACHE_DIR, 'nhi_reference.csv')
+NHI_REFERENCE_MAX_AGE = 24 * 60 * 60  # 本地缓存有效期(秒)，过期后重新下载
+
 # 确保目录存在
 def ensure_directories():
     """确保所有必要的目录都存在"""
-    directories = [DATA_DIR, OUTPUT_DIR, LOG_DIR]
+    directories = [DATA_DIR, OUTPUT_DIR, LOG_DIR, CACHE_DIR]
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
         print(f"确保目录存在: {directory}")
@@ -4,16 +4,32 @@
 整合Google搜索、TFDA/NHI抓取和本地LLM处理
 """
 
+import argparse
+import csv
 import os
+import subprocess
 import sys
 import logging
+import time
 from pathlib import Path
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from config.project_config import ensure_directories, INPUT_CSV, OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV, GOOGLE_SEARCH_RESULTS_CSV
+from config.project_config import (
+    ensure_directories, INPUT_CSV, OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV, GOOGLE_SEARCH_RESULTS_CSV,
+    IS_DEMO, SHARD_COUNT
+)
+
+# 各阶段的模块只在该阶段执行时导入；--profile-startup 量测的模块
+STARTUP_MODULES = [
+    ("命令行入口", "run_extraction_pipeline"),
+    ("结果统计 (--stats)", "scripts.run_stats"),
+    ("Google搜索阶段", "scripts.qwen_agent_integration"),
+    ("主提取流程", "scripts.multi_source_extraction"),
+    ("分片模式", "scripts.shard_runner"),
+]
 
 def setup_logging():
     """设置日志配置"""
@@ -82,6 +98,15 @@ def run_main_extraction():
     logging.info("=" * 50)
     
     try:
+        if SHARD_COUNT > 1:
+            # 分片模式: 各分片在独立进程中处理，完成后合并输出
+            from scripts.shard_runner import run_sharded
+
+            if IS_DEMO:
+                logging.warning("演示模式下每个分片各处理至多 DEMO_LIMIT 种药物")
+            logging.info(f"开始执行主提取流程 (分片数: {SHARD_COUNT})...")
+            return run_sharded(SHARD_COUNT)
+
         # 导入主提取脚本
         from scripts.multi_source_extraction import main as extraction_main
         
@@ -103,27 +128,89 @@ def summarize_results():
     logging.info("结果总结")
     logging.info("=" * 50)
     
-    import pandas as pd
+    from scripts.run_stats import RunStats
     
-    # 检查输出文件
-    files_to_check = [
-        (OUTPUT_CSV, "完整药物信息"),
-        (INCOMPLETE_OUTPUT_CSV, "不完整药物信息"),
-        (GOOGLE_SEARCH_RESULTS_CSV, "Google搜索结果")
-    ]
-    
-    for file_path, description in files_to_check:
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-                logging.info(f"{description}: {len(df)} 条记录 - {file_path}")
-            except Exception as e:
-                logging.error(f"读取 {file_path} 失败: {e}")
-        else:
-            logging.info(f"{description}: 文件不存在 - {file_path}")
+    # 提取结果的计数取自检查点维护的统计文件 (与输出不一致时才重新读取)
+    stats = RunStats()
+    stats.sync()
+    logging.info(f"完整药物信息: {stats.data['complete']} 条记录 - {OUTPUT_CSV}")
+    logging.info(f"不完整药物信息: {stats.data['incomplete']} 条记录 - {INCOMPLETE_OUTPUT_CSV}")
+
+    if os.path.exists(GOOGLE_SEARCH_RESULTS_CSV):
+        try:
+            # 只计行数，不需载入 pandas (栏位内的换行由 csv 模块处理)
+            with open(GOOGLE_SEARCH_RESULTS_CSV, encoding='utf-8-sig', newline='') as f:
+                count = max(sum(1 for _ in csv.reader(f)) - 1, 0)
+            logging.info(f"Google搜索结果: {count} 条记录 - {GOOGLE_SEARCH_RESULTS_CSV}")
+        except Exception as e:
+            logging.error(f"读取 {GOOGLE_SEARCH_RESULTS_CSV} 失败: {e}")
+    else:
+        logging.info(f"Google搜索结果: 文件不存在 - {GOOGLE_SEARCH_RESULTS_CSV}")
+
+def show_stats():
+    """输出结果统计: 行数、栏位填充率与各来源提供的栏位数"""
+    from scripts.run_stats import RunStats
+
+    stats = RunStats()
+    if not stats.is_current():
+        print("统计文件与输出不一致，由输出重建 (来源记为 unrecorded)")
+        stats.sync()
+    print("\n".join(stats.report_lines()))
+
+def _import_costs(module: str) -> tuple:
+    """在独立进程中以 -X importtime 导入模块，返回 (进程耗时秒数, 该模块与各顶层包首次导入的累计微秒数)"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=str(project_root), capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1])
+
+    costs = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if cumulative.strip().isdigit() and ('.' not in name or name == module):
+            costs.setdefault(name, int(cumulative))
+    return elapsed, costs
+
+def profile_startup(top: int = 5):
+    """输出各阶段模块的导入耗时与其中最耗时的依赖"""
+    for label, module in STARTUP_MODULES:
+        try:
+            elapsed, costs = _import_costs(module)
+        except ImportError as e:
+            print(f"{label} ({module}): 导入失败 - {e}")
+            continue
+        # site 属于解释器启动，不是模块的导入开销
+        heaviest = sorted(
+            ((name, us) for name, us in costs.items() if name not in (module, module.split('.')[0], 'site')),
+            key=lambda item: -item[1]
+        )[:top]
+        print(f"{label} ({module}): 进程 {elapsed:.2f}s, 导入 {costs.get(module, 0) / 1e6:.2f}s")
+        if heaviest:
+            print("    " + ", ".join(f"{name} {us / 1e6:.2f}s" for name, us in heaviest))
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="药物信息提取管道")
+    parser.add_argument('--stats', action='store_true', help="只输出结果统计后结束")
+    parser.add_argument('--profile-startup', action='store_true', help="输出各阶段模块的导入耗时后结束")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+        return
+
+    if args.stats:
+        show_stats()
+        return
+
     # 确保目录存在
     ensure_directories()
     
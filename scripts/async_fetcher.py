@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+异步网页抓取层
+在背景事件循环线程上以共享连接池并行下载候选网页，
+按主机限制并发数与请求间隔，收集到足够提示词内容后即提前返回；
+下载经网页缓存 (page_cache)，TTL 内不发请求，过期后以条件请求重新验证；
+STREAM_EXTRACT 时边下载边提取相关段落，收集到足够字数后即断开
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import (
+    NETWORK_WORKERS, FETCH_PER_HOST_LIMIT, FETCH_PER_HOST_DELAY, SEARCH_TIMEOUT, PAGE_CACHE_ENABLED,
+    STREAM_EXTRACT, STREAM_MAX_BYTES
+)
+from scripts import metrics
+from scripts.page_cache import get_cache as get_page_cache, is_cacheable
+from scripts.stream_extract import CHUNK_BYTES, StreamingExtractor
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class AsyncPageFetcher:
+    """共享连接池的网页抓取器，可由任意线程同步调用"""
+
+    def __init__(self, total_limit: int = NETWORK_WORKERS, per_host_limit: int = FETCH_PER_HOST_LIMIT,
+                 per_host_delay: float = FETCH_PER_HOST_DELAY, timeout: float = SEARCH_TIMEOUT,
+                 use_cache: bool = PAGE_CACHE_ENABLED, stream: bool = STREAM_EXTRACT):
+        self.total_limit = total_limit
+        self.per_host_limit = per_host_limit
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.cache = get_page_cache() if use_cache else None
+        self.stream = stream
+
+        self._session = None
+        self._host_semaphores = {}
+        self._host_locks = {}
+        self._host_next_start = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='page-fetcher', daemon=True)
+        self._thread.start()
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.total_limit, limit_per_host=self.per_host_limit)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self._session
+
+    async def _wait_for_host(self, host: str):
+        """同一主机相邻两次请求至少间隔 per_host_delay 秒"""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._host_next_start.get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._host_next_start[host] = time.monotonic() + self.per_host_delay
+
+    async def _cache_call(self, method, *args):
+        """网页缓存的 SQLite 读写会阻塞 (含等待锁)，放到线程池执行以免拖住其他进行中的下载"""
+        return await self._loop.run_in_executor(None, method, *args)
+
+    async def _fetch(self, url: str, stats: dict, min_chars: int = None) -> tuple:
+        """返回 (HTML, None)；min_chars 不为 None 且须下载时改为流式提取，返回 (None, 正文)"""
+        cached = await self._cache_call(self.cache.get, url) if self.cache else None
+        if cached and cached.fresh:
+            stats['cache_hits'] += 1
+            return cached.text, None
+
+        host = urlsplit(url).hostname or ''
+        semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        async with semaphore:
+            # 重新验证缓存的条件请求同样会访问主机，与首次下载一样遵守请求间隔
+            await self._wait_for_host(host)
+            headers = cached.conditional_headers() if cached else None
+            async with self._get_session().get(url, headers=headers) as response:
+                if response.status == 304 and cached:
+                    await self._cache_call(
+                        self.cache.mark_revalidated, url, response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                    stats['cache_hits'] += 1
+                    return cached.text, None
+                if response.status != 200:
+                    logging.warning(f"网页返回状态码 {response.status}: {url}")
+                    return "", None
+                if min_chars is not None:
+                    return None, await self._stream_text(url, response, min_chars, stats)
+                body = await response.read()
+                stats['bytes'] += len(body)
+                encoding = response.get_encoding()
+                if self.cache and is_cacheable(response.headers):
+                    await self._cache_call(
+                        self.cache.put, url, body, encoding, response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                return body.decode(encoding, errors='replace'), None
+
+    async def _stream_text(self, url: str, response, min_chars: int, stats: dict) -> str:
+        """边读取响应边提取相关段落，足够 min_chars 字或达到 STREAM_MAX_BYTES 后即断开；
+        读完整个响应时网页仍写入网页缓存"""
+        extractor = StreamingExtractor(min_chars, response.charset)
+        chunks = []
+        received = 0
+        parse_seconds = 0.0
+        complete = True
+        async for chunk in response.content.iter_chunked(CHUNK_BYTES):
+            chunks.append(chunk)
+            received += len(chunk)
+            start = time.perf_counter()
+            extractor.feed_bytes(chunk)
+            parse_seconds += time.perf_counter() - start
+            if extractor.done or received >= STREAM_MAX_BYTES:
+                # 提前停止时网络上的响应若已全部收到 (如小网页)，读出缓冲区剩余的 (解压后) 内容仍写入缓存；
+                # 不与 Content-Length 比较，压缩响应的 Content-Length 是压缩后的大小
+                complete = response.content.is_eof()
+                if complete:
+                    chunks.extend([rest async for rest in response.content.iter_chunked(CHUNK_BYTES)])
+                break
+        if complete:
+            extractor.close()
+            if self.cache and is_cacheable(response.headers):
+                await self._cache_call(
+                    self.cache.put, url, b''.join(chunks), extractor.encoding or 'utf-8',
+                    response.headers.get('ETag'), response.headers.get('Last-Modified')
+                )
+        stats['bytes'] += received
+        stats['extract_ms'] += parse_seconds * 1000
+        return extractor.text()
+
+    @staticmethod
+    def _timed_extract(extract, url: str, html: str, stats: dict) -> str:
+        start = time.perf_counter()
+        try:
+            return extract(url, html)
+        finally:
+            stats['extract_ms'] += (time.perf_counter() - start) * 1000
+
+    async def _fetch_and_extract(self, index: int, url: str, extract, stats: dict, per_source_limit: int) -> tuple:
+        try:
+            html, text = await self._fetch(url, stats, per_source_limit if self.stream else None)
+            if text is not None:
+                return index, url, text
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"提取網頁內容失敗 {url}: {e}")
+            return index, url, ""
+        if not html:
+            return index, url, ""
+        # HTML解析属于CPU工作，放到线程池执行以免阻塞事件循环 (extract 可再转交进程池)
+        try:
+            text = await self._loop.run_in_executor(None, self._timed_extract, extract, url, html, stats)
+        except Exception as e:
+            logging.warning(f"網頁文字提取失敗 {url}: {e}")
+            return index, url, ""
+        return index, url, text or ""
+
+    async def _fetch_all(self, urls: list, extract, min_chars: int, per_source_limit: int, stats: dict) -> list:
+        tasks = [
+            asyncio.ensure_future(self._fetch_and_extract(i, url, extract, stats, per_source_limit))
+            for i, url in enumerate(urls)
+        ]
+        results = {}
+        collected = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, url, text = await next_done
+                if not text:
+                    continue
+                results[index] = (index, url, text)
+                collected += min(len(text), per_source_limit)
+                if collected >= min_chars:
+                    logging.info(f"已收集足够内容 ({collected} 字)，取消其余 {sum(not t.done() for t in tasks)} 个请求")
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return [results[i] for i in sorted(results)]
+
+    def fetch_texts(self, urls: list, extract, min_chars: int, per_source_limit: int) -> list:
+        """并行下载 urls 并以 extract(url, html) 提取文字，返回 [(序号, url, 文字)] (按原顺序)；
+        下载字节数、网页缓存命中数与提取耗时计入调用方当前的步骤量测"""
+        stats = {'bytes': 0, 'cache_hits': 0, 'extract_ms': 0.0}
+        start = time.perf_counter()
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._fetch_all(urls, extract, min_chars, per_source_limit, stats), self._loop
+            )
+            return future.result()
+        finally:
+            metrics.add('bytes_fetched', stats['bytes'])
+            metrics.add('page_cache_hits', stats['cache_hits'])
+            # fetch 为整体等待时间 (含并行的正文提取)，extract 为提取累计耗时
+            metrics.add_time('fetch', (time.perf_counter() - start) * 1000)
+            metrics.add_time('extract', stats['extract_ms'])
+
+    def close(self):
+        """关闭连接池与事件循环"""
+        async def _close():
+            if self._session is not None:
+                await self._session.close()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> AsyncPageFetcher:
+    """取得全进程共享的抓取器"""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = AsyncPageFetcher()
+    return _fetcher
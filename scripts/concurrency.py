@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+并发执行工具
+为网络I/O (TFDA/搜索/网页抓取) 与LLM调用提供各自独立的有界资源池，
+并以固定顺序返回多种药物的并发处理结果
+"""
+
+import contextvars
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import NETWORK_WORKERS, LLM_WORKERS
+
+_network_slots = threading.BoundedSemaphore(NETWORK_WORKERS)
+_llm_slots = threading.BoundedSemaphore(LLM_WORKERS)
+
+# 当前药物的LLM调用计数器 (每种药物各自独立)
+_llm_call_counter = contextvars.ContextVar('llm_call_counter', default=None)
+
+# 推测执行时当前步骤的取消信号
+_cancel_event = contextvars.ContextVar('cancel_event', default=None)
+
+
+class StepCancelled(BaseException):
+    """推测执行的步骤已被取消 (与 asyncio.CancelledError 相同，不被一般的 except Exception 吞掉)"""
+
+
+def raise_if_cancelled():
+    """当前步骤已被取消时抛出 StepCancelled"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise StepCancelled()
+
+
+def run_cancellable(cancel_event: threading.Event, func, *args):
+    """在带取消信号的上下文中执行 func，供 contextvars.copy_context().run 在线程池中调用"""
+    _cancel_event.set(cancel_event)
+    raise_if_cancelled()
+    return func(*args)
+
+
+@contextmanager
+def network_slot():
+    """占用一个网络I/O名额"""
+    with _network_slots:
+        raise_if_cancelled()
+        yield
+
+
+def record_llm_call():
+    """为当前药物累计一次LLM调用"""
+    counter = _llm_call_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@contextmanager
+def llm_slot():
+    """占用一个LLM调用名额"""
+    raise_if_cancelled()
+    record_llm_call()
+    with _llm_slots:
+        # 等待名额期间可能已被取消
+        raise_if_cancelled()
+        yield
+
+
+@contextmanager
+def count_llm_calls():
+    """统计区块内发出的LLM调用次数，counter[0] 为累计值"""
+    counter = [0]
+    token = _llm_call_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _llm_call_counter.reset(token)
+
+
+def imap_ordered(func, items, workers: int):
+    """并发执行 func，最多 workers 个任务同时进行，结果按输入顺序逐一产出；
+    workers<=1 时依序执行"""
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='drug') as executor:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            # 队首已完成即产出；积压超过两倍并发数时等待队首，避免一次提交全部药物
+            while pending and (pending[0].done() or len(pending) >= workers * 2):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+药物清单流式读取
+分块读取健保药品CSV，逐行产出轻量的 namedtuple 记录，所有栏位以字符串读取
+(药品代号不会被推断为数字)，内存用量不随输入行数增长
+"""
+
+import itertools
+import sys
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import INPUT_CHUNK_SIZE
+
+CODE_COLUMN = '藥品代號'
+
+
+def shard_of(drug_code: str, shard_count: int) -> int:
+    """药品代号所属的分片 (CRC32，跨进程与跨次运行保持一致)"""
+    return zlib.crc32(drug_code.encode('utf-8')) % shard_count
+
+
+class DrugInput:
+    """可重复迭代的药物清单；每次迭代重新分块读取文件
+
+    栏位名不是合法标识符时 (如结尾逗号产生的 'Unnamed: 14')，namedtuple 以 _索引 命名，
+    as_dict() 仍使用原始栏位名
+    """
+
+    def __init__(self, path: str, chunksize: int = INPUT_CHUNK_SIZE, encoding: str = 'utf-8-sig'):
+        self.path = path
+        self.chunksize = chunksize
+        self.encoding = encoding
+        self.columns = pd.read_csv(path, encoding=encoding, nrows=0).columns.tolist()
+        self.Record = namedtuple('DrugRecord', self.columns, rename=True)
+
+    def _chunks(self, usecols=None):
+        return pd.read_csv(
+            self.path, encoding=self.encoding, dtype=str, keep_default_na=False,
+            chunksize=self.chunksize, usecols=usecols
+        )
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, exclude_codes=None, limit: int = None, shard: tuple = None):
+        """依序产出记录；exclude_codes 中的药品代号略过，limit 限制产出数量，
+        shard 为 (分片序号, 分片数) 时只产出属于该分片的药物"""
+        make = self.Record._make
+        code_index = self.columns.index(CODE_COLUMN) if exclude_codes or shard else None
+
+        def generate():
+            for chunk in self._chunks():
+                for values in chunk.itertuples(index=False, name=None):
+                    if code_index is not None:
+                        if exclude_codes and values[code_index] in exclude_codes:
+                            continue
+                        if shard and shard_of(values[code_index], shard[1]) != shard[0]:
+                            continue
+                    yield make(values)
+
+        return itertools.islice(generate(), limit) if limit is not None else generate()
+
+    def codes(self):
+        """依序产出药品代号 (只读取该栏)"""
+        for chunk in self._chunks(usecols=[CODE_COLUMN]):
+            yield from chunk[CODE_COLUMN]
+
+    def count(self, exclude_codes=None, shard: tuple = None) -> int:
+        """只读取药品代号栏计算行数"""
+        if shard:
+            return sum(
+                1 for code in self.codes()
+                if shard_of(code, shard[1]) == shard[0] and not (exclude_codes and code in exclude_codes)
+            )
+        total = 0
+        for chunk in self._chunks(usecols=[CODE_COLUMN]):
+            codes = chunk[CODE_COLUMN]
+            total += len(codes) if not exclude_codes else int((~codes.isin(exclude_codes)).sum())
+        return total
+
+    def as_dict(self, record) -> dict:
+        """以原始栏位名转为字典 (输出CSV的栏位顺序与输入一致)"""
+        return dict(zip(self.columns, record))
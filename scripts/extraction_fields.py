@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+提取栏位定义
+三个目标栏位、判断栏位是否取得有效内容的规则，以及提示词中的栏位说明，
+供五步法、结果统计、摘要解析与LLM批量推理共用
+"""
+
+import json
+
+FIELDS = ("適應症", "用法用量", "注意事項")
+# 表示栏位未取得的值
+MISSING_VALUES = ("", "資訊不足", "模型提取失敗", "模型回傳格式錯誤")
+
+# 各模板提示词中的栏位说明
+FIELD_DESCRIPTIONS = {
+    "general": {
+        "適應症": "適應症（主治、治療什麼疾病）",
+        "用法用量": "用法用量（怎麼服用、一次多少劑量、一天幾次、飯前或飯後）",
+        "注意事項": "注意事項（副作用、禁忌、注意什麼）"
+    },
+    "ingredient_translation": {
+        "適應症": "適應症（主治）",
+        "用法用量": "用法及用量（劑量）",
+        "注意事項": "注意事項（含禁忌）"
+    }
+}
+
+
+def is_filled(value) -> bool:
+    """栏位是否取得有效内容 (非字符串如 NaN、或含「資訊不足 - 關鍵資訊缺失」等说明时视为未填)"""
+    return isinstance(value, str) and value not in MISSING_VALUES and not value.startswith("資訊不足")
+
+
+def json_format_example(fields) -> str:
+    """只含指定栏位的 JSON 格式示例，如 {"用法用量": "..."}"""
+    return json.dumps({field: "..." for field in fields}, ensure_ascii=False)
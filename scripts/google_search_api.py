@@ -12,6 +12,7 @@ sys.path.insert(0, str(project_root))
 
 # 导入项目配置
 from config.project_config import INPUT_CSV, GOOGLE_SEARCH_RESULTS_CSV
+from scripts.summary_parser import parse_section_summary
 
 # --- Configuration ---
 LOG_FILE = "logs/google_search.log"
@@ -29,59 +30,7 @@ logger = logging.getLogger(__name__)
 
 def parse_google_summary(summary_text):
     """從 Google 搜尋的 AI 摘要中解析出我們需要的資訊"""
-    info = {"適應症": "", "用法用量": "", "注意事項": ""}
-    if not summary_text:
-        return info
-
-    # 嘗試解析 JSON 格式的響應
-    try:
-        if isinstance(summary_text, str) and summary_text.strip().startswith('{'):
-            data = json.loads(summary_text)
-            info["適應症"] = data.get("適應症", "")[:150]
-            info["用法用量"] = data.get("用法用量", "")[:150]
-            info["注意事項"] = data.get("注意事項", "")[:150]
-            return info
-    except json.JSONDecodeError:
-        pass
-
-    # 嘗試解析模擬數據的文本格式
-    if "適應症：" in summary_text and "用法用量：" in summary_text and "注意事項：" in summary_text:
-        # 模擬數據格式：這是 {query} 的搜尋結果摘要。適應症：...用法用量：...注意事項：...
-        try:
-            # 使用正則表達式提取信息
-            indication_match = re.search(r'適應症[：:]\s*(.*?)(?=用法用量|注意事項|$)', summary_text)
-            dosage_match = re.search(r'用法用量[：:]\s*(.*?)(?=注意事項|$)', summary_text)
-            precaution_match = re.search(r'注意事項[：:]\s*(.*?)$', summary_text)
-            
-            if indication_match:
-                info["適應症"] = indication_match.group(1).strip()[:150]
-            if dosage_match:
-                info["用法用量"] = dosage_match.group(1).strip()[:150]
-            if precaution_match:
-                info["注意事項"] = precaution_match.group(1).strip()[:150]
-                
-            return info
-        except Exception:
-            pass
-
-    # 如果沒有 JSON 或模擬數據格式，嘗試解析 Markdown 格式
-    pattern = re.compile(r'### \*\*(.*?)\*\*\n(.*?)(?=\n###|\Z)', re.DOTALL)
-    matches = pattern.findall(summary_text)
-
-    for title, content in matches:
-        title = title.strip()
-        content = content.strip().replace('\n', ' ')
-        if '適應症' in title:
-            info['適應症'] = content
-        elif '用法用量' in title or '劑量' in title:
-            info['用法用量'] = content
-        elif '注意事項' in title:
-            info['注意事項'] = content
-            
-    for key, value in info.items():
-        info[key] = value.strip()[:150]  # 限制長度
-
-    return info
+    return parse_section_summary(summary_text, max_length=150, labeled=True)
 
 def google_web_search_api(query):
     """
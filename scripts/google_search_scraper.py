@@ -2,6 +2,14 @@ import pandas as pd
 import logging
 import os
 import re
+import sys
+from pathlib import Path
+
+# Add the project root to the import path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from scripts.summary_parser import parse_section_summary
 
 # --- Configuration ---
 INPUT_CSV = "uncomplete-research.csv"  # Or any file with a '藥品中文名稱' column
@@ -20,28 +28,7 @@ logging.basicConfig(
 
 def parse_google_summary(summary_text: str) -> dict:
     """Parses the AI summary from Google search results."""
-    info = {"適應症": "", "用法用量": "", "注意事項": ""}
-    if not summary_text:
-        return info
-
-    pattern = re.compile(r'### \*\*(.*?)\*\*
-(.*?)(?=\n###|\Z)', re.DOTALL)
-    matches = pattern.findall(summary_text)
-
-    for title, content in matches:
-        title = title.strip()
-        content = content.strip().replace('\n', ' ')
-        if '適應症' in title:
-            info['適應症'] = content
-        elif '用法用量' in title or '劑量' in title:
-            info['用法用量'] = content
-        elif '注意事項' in title:
-            info['注意事項'] = content
-            
-    for key, value in info.items():
-        info[key] = value.strip()[:150] # Limit length
-
-    return info
+    return parse_section_summary(summary_text, max_length=150)
 
 def main():
     """
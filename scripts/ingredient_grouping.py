@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+成份分组
+将成份、ATC代码、剂型与含量相同 (仅厂商或包装不同) 的药物归为同一组，
+每组只执行一次搜索与LLM提取，结果共享给组内所有药物
+(第1步的Google搜索结果按药品代号对应，不共享，由各药物自行执行)
+"""
+
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+# 英文品名中的含量，例如 25MG、0.3 GM、0.5MG/GM、100MCG/ML
+STRENGTH_PATTERN = re.compile(
+    r'(?<![A-Z0-9.])(\d+(?:\.\d+)?)\s*(MCG|MG|GM|G|ML|IU|%)(?:\s*/\s*(\d+(?:\.\d+)?)?\s*(ML|GM|G))?(?![A-Z])'
+)
+
+
+def normalize_label(value) -> str:
+    """全形转半形、转大写并压缩空白"""
+    text = unicodedata.normalize('NFKC', str(value or ''))
+    return ' '.join(text.upper().split())
+
+
+def extract_strength(english_name: str) -> str:
+    """从英文品名取出含量字串，找不到时返回空字串"""
+    matches = STRENGTH_PATTERN.findall(normalize_label(english_name))
+    return '+'.join(
+        f"{amount}{unit}" + (f"/{per_amount}{per_unit}" if per_unit else '')
+        for amount, unit, per_amount, per_unit in matches
+    )
+
+
+def cluster_key(drug_info: dict) -> tuple:
+    """成份 + ATC代码 + 剂型 + 含量"""
+    return (
+        normalize_label(drug_info.get('成份', '')),
+        normalize_label(drug_info.get('ATC_CODE', '')),
+        normalize_label(drug_info.get('劑型', '')),
+        extract_strength(drug_info.get('藥品英文名稱', ''))
+    )
+
+
+class ClusterResults:
+    """线程安全的分组结果表：每组由最先登记的药物计算，其余药物等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._representatives = {}
+        self._futures = {}
+        self.computed_drugs = 0
+        self.shared_drugs = 0
+        self.llm_calls_made = 0
+        self.llm_calls_avoided = 0
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def register(self, drug_info: dict):
+        """按输入顺序登记药物 (须在提交处理前于同一线程调用)，每组第一笔为代表"""
+        key = cluster_key(drug_info)
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = Future()
+                self._representatives[key] = drug_info.get('藥品代號', '')
+
+    def should_compute(self, drug_info: dict) -> bool:
+        """该药物是否需自行计算 (分组代表或未登记的药物)"""
+        key = cluster_key(drug_info)
+        with self._lock:
+            return key not in self._futures or self._representatives[key] == drug_info.get('藥品代號', '')
+
+    def get_or_compute(self, drug_info: dict, compute) -> tuple:
+        """返回 (结果, 是否共享)；compute() 需返回 (结果, LLM调用次数)"""
+        key = cluster_key(drug_info)
+        with self._lock:
+            future = self._futures.get(key)
+            is_representative = self._representatives.get(key) == drug_info.get('藥品代號', '')
+
+        if future is None:
+            # 未登记的药物单独计算
+            result, _ = compute()
+            return result, False
+
+        if is_representative:
+            try:
+                result, llm_calls = compute()
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            future.set_result((result, llm_calls))
+            with self._lock:
+                self.computed_drugs += 1
+                self.llm_calls_made += llm_calls
+            return result, False
+
+        try:
+            result, llm_calls = future.result()
+        except Exception:
+            # 代表药物计算失败时各自计算
+            result, _ = compute()
+            return result, False
+        with self._lock:
+            self.shared_drugs += 1
+            self.llm_calls_avoided += llm_calls
+        return result, True
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+LLM 批量推理客户端
+将多种药物待处理的提取提示词集中到同一队列，按设定并行度同时送往 Ollama，
+或将数种药物的内容合并为一个结构化的多药物提示词，再把结果分送回等待中的药物
+"""
+
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import (
+    MODEL, LLM_WORKERS, LLM_BATCH_MODE, LLM_PACK_SIZE, LLM_PACK_WINDOW
+)
+from scripts.extraction_fields import FIELDS, FIELD_DESCRIPTIONS, json_format_example
+
+# 合并提示词中各模板的任务说明 ({fields} 为要提取的栏位说明)
+PACK_INSTRUCTIONS = {
+    "general": "從每種藥品的內容提取：{fields}。",
+    "ingredient_translation": "先將每種藥品的英文藥理資訊翻譯成台灣繁體中文，再從中提取：{fields}。"
+}
+
+
+class ExtractionRequest:
+    """一笔待送出的提取请求"""
+
+    __slots__ = ('prompt', 'template_name', 'content', 'drug_name', 'fields', 'future')
+
+    def __init__(self, prompt: str, template_name: str, content: str, drug_name: str, fields: tuple):
+        self.prompt = prompt
+        self.template_name = template_name
+        self.content = content
+        self.drug_name = drug_name
+        self.fields = fields
+        self.future = Future()
+
+
+def build_packed_prompt(requests: list) -> str:
+    """将多种药物的内容合并为一个结构化提示词 (同一批的模板与栏位相同)"""
+    template_name = requests[0].template_name
+    if template_name not in PACK_INSTRUCTIONS:
+        template_name = "general"
+    fields = requests[0].fields
+    descriptions = "、".join(FIELD_DESCRIPTIONS[template_name][field] for field in fields)
+    parts = [
+        f"你是藥品資訊提取助手。以下共有 {len(requests)} 種藥品，每種以「=== 藥品 編號 ===」開頭。",
+        PACK_INSTRUCTIONS[template_name].format(fields=descriptions),
+        "",
+        "嚴格遵守以下規則：",
+        "1. 以台灣繁體中文簡潔地回答，每個欄位都必須少於100個字元。",
+        "2. 各藥品只能使用自己區塊內的內容，不可混用。",
+        "3. 如果資訊完全不存在，在該欄位回答「資訊不足」。",
+        f'4. 輸出一個 JSON 物件，鍵為藥品編號，例如：{{"1": {json_format_example(fields)}, "2": {{...}}}}',
+        ""
+    ]
+    for number, request in enumerate(requests, 1):
+        parts.append(f"=== 藥品 {number} ===")
+        parts.append(request.content)
+        parts.append("")
+    return "\n".join(parts)
+
+
+def split_packed_response(resp_text: str, count: int) -> dict:
+    """解析合并提示词的回应，返回 {编号: 单一药物的JSON字串}"""
+    text = resp_text.strip()
+    if not (text.startswith('{') and text.endswith('}')):
+        json_match = re.search(r'```json(.*?)```', text, re.DOTALL)
+        if not json_match:
+            return {}
+        text = json_match.group(1).strip()
+    data = json.loads(text)
+    results = {}
+    for number in range(1, count + 1):
+        item = data.get(str(number))
+        if isinstance(item, dict):
+            results[number] = json.dumps(item, ensure_ascii=False)
+    return results
+
+
+class LLMBatcher:
+    """多药物共享的LLM请求队列，由固定数量的派送线程消化"""
+
+    def __init__(self, model: str = MODEL, mode: str = LLM_BATCH_MODE, parallelism: int = LLM_WORKERS,
+                 pack_size: int = LLM_PACK_SIZE, pack_window: float = LLM_PACK_WINDOW):
+        self.model = model
+        self.mode = mode
+        self.pack_size = max(1, pack_size)
+        self.pack_window = pack_window
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.started_at = time.time()
+        self.calls = 0
+        self.completed = 0
+        self.drug_names = set()
+
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch_loop, name=f'llm-dispatch-{i}', daemon=True)
+            for i in range(max(1, parallelism))
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+
+    def submit(self, prompt: str, template_name: str, content: str, drug_name: str, fields=FIELDS) -> Future:
+        """加入队列，Future 的结果为该药物的模型回应文字；fields 为提示词要求的栏位"""
+        request = ExtractionRequest(prompt, template_name, content, drug_name, tuple(fields))
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, template_name: str, content: str, drug_name: str, fields=FIELDS) -> str:
+        """送出请求并等待回应"""
+        return self.submit(prompt, template_name, content, drug_name, fields).result()
+
+    def _take_batch(self) -> list:
+        first = self._queue.get()
+        batch = [first]
+        if self.mode != 'pack':
+            return batch
+        # 在凑批时间窗内收集同一模板、同一组栏位的其他请求
+        deadline = time.monotonic() + self.pack_window
+        deferred = []
+        while len(batch) < self.pack_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if (request.template_name, request.fields) == (first.template_name, first.fields):
+                batch.append(request)
+            else:
+                deferred.append(request)
+        for request in deferred:
+            self._queue.put(request)
+        return batch
+
+    def _call_model(self, prompt: str) -> str:
+        import ollama
+
+        response = ollama.generate(model=self.model, prompt=prompt)
+        with self._stats_lock:
+            self.calls += 1
+        return response['response']
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                if len(batch) == 1:
+                    self._complete(batch[0], self._call_model(batch[0].prompt))
+                else:
+                    self._run_packed(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run_packed(self, batch: list):
+        logging.info(f"合并 {len(batch)} 种药物为一个提示词")
+        try:
+            answers = split_packed_response(self._call_model(build_packed_prompt(batch)), len(batch))
+        except Exception as e:
+            logging.warning(f"合并提示词回应解析失败，改为逐笔请求: {e}")
+            answers = {}
+        for number, request in enumerate(batch, 1):
+            if number in answers:
+                self._complete(request, answers[number])
+            else:
+                # 合并回应缺少该药物时单独重送
+                self._complete(request, self._call_model(request.prompt))
+
+    def _complete(self, request: ExtractionRequest, resp_text: str):
+        with self._stats_lock:
+            self.completed += 1
+            self.drug_names.add(request.drug_name)
+        request.future.set_result(resp_text)
+
+    def log_throughput(self):
+        """记录吞吐量 (药物/分钟)"""
+        minutes = max(time.time() - self.started_at, 1e-9) / 60
+        with self._stats_lock:
+            logging.info(
+                f"LLM批量推理统计 ({self.mode}): 模型调用 {self.calls} 次, 完成请求 {self.completed} 笔, "
+                f"涉及 {len(self.drug_names)} 种药物, 吞吐量 {len(self.drug_names) / minutes:.1f} 药物/分钟"
+            )
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> LLMBatcher:
+    """取得全进程共享的批量推理客户端"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = LLMBatcher()
+    return _batcher
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+LLM 响应缓存
+以 (模型, 提示词模板版本, 截断后内容) 的哈希为键，将解析后的提取结果存于 SQLite，
+按最近使用时间淘汰以限制总大小，重跑或接续批次时相同内容无需再次推理
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import LLM_CACHE_DB, LLM_CACHE_MAX_BYTES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+-- 总大小由触发器在写入的同一事务中维护，多个进程共用数据库时也一致
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM responses;
+CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses BEGIN
+    UPDATE cache_size SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+
+# 本进程已执行过 SCHEMA 的数据库路径
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def make_key(model: str, template_version, template_name: str, content: str) -> str:
+    """缓存键: 模型、模板版本、模板名称与截断后内容的 SHA-256"""
+    payload = json.dumps([model, template_version, template_name, content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """容量受限、按最近使用淘汰的LLM响应缓存 (线程安全，可多进程共享同一数据库)"""
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 建表与总大小初始化 (含全表 SUM 的写事务) 每个进程每个数据库只执行一次，新线程的连接不再重复
+            with _schema_lock:
+                if self.db_path not in _schema_ready:
+                    conn.executescript(SCHEMA)
+                    _schema_ready.add(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """命中时返回缓存的结果字典，否则返回 None"""
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with conn:
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        """写入结果，超出容量时淘汰最久未使用的条目"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        now = time.time()
+        conn = self._connect()
+        with self._lock:
+            with conn:
+                # 写入后在同一事务中读取总大小 (此时已持有写锁，其他进程的写入不会穿插)
+                conn.execute(
+                    "INSERT INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "created_at = excluded.created_at, last_access = excluded.last_access",
+                    (key, data, size, now, now)
+                )
+                total = self._total_bytes(conn)
+                if total > self.max_bytes:
+                    self._evict(conn, total)
+
+    @staticmethod
+    def _total_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, total: int):
+        # 淘汰至容量上限的 90%，避免每次写入都触发淘汰
+        target = int(self.max_bytes * 0.9)
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """命中/未命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'bytes': self._total_bytes(self._connect())
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(
+            f"LLM缓存统计: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+            f"命中率 {stats['hit_rate']:.1%}, 淘汰 {stats['evictions']} 条, "
+            f"占用 {stats['bytes'] / 1024 / 1024:.1f} MB"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """取得全进程共享的LLM响应缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+五步法各步骤的计时与计数
+每种药物的每个步骤记录耗时、下载字节数、缓存命中、LLM token 与结果，
+写入 JSONL 追踪文件并于运行结束时输出汇总表
+
+汇总已有的追踪文件:
+    python scripts/metrics.py logs/metrics/trace_*.jsonl
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import METRICS_TRACE_DIR
+
+COUNTERS = ('bytes_fetched', 'page_cache_hits', 'cache_hits', 'llm_calls', 'llm_tokens_in', 'llm_tokens_out')
+
+# 当前正在执行的步骤记录 (随线程与 copy_context 传递)
+_current_record = contextvars.ContextVar('metrics_record', default=None)
+
+
+class StepRecord:
+    """一种药物一个步骤的量测结果"""
+
+    __slots__ = ('drug_code', 'step', 'started_at', 'wall_ms', 'outcome', 'counters', 'timings')
+
+    def __init__(self, drug_code: str, step: str):
+        self.drug_code = drug_code
+        self.step = step
+        self.started_at = time.time()
+        self.wall_ms = 0.0
+        self.outcome = 'empty'
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.timings = {}
+
+    def to_dict(self) -> dict:
+        return {
+            'drug_code': self.drug_code,
+            'step': self.step,
+            'started_at': round(self.started_at, 3),
+            'wall_ms': round(self.wall_ms, 3),
+            'outcome': self.outcome,
+            **self.counters,
+            'timings_ms': {name: round(value, 3) for name, value in self.timings.items()}
+        }
+
+
+def add(counter: str, value: int = 1):
+    """为当前步骤累加计数 (不在步骤内时忽略)"""
+    record = _current_record.get()
+    if record is not None and value:
+        record.counters[counter] += value
+
+
+def add_time(phase: str, milliseconds: float):
+    """为当前步骤累加子阶段耗时 (如 google_search、fetch、extract、llm)"""
+    record = _current_record.get()
+    if record is not None:
+        record.timings[phase] = record.timings.get(phase, 0.0) + milliseconds
+
+
+@contextmanager
+def timed(phase: str):
+    """计量区块耗时并计入当前步骤的子阶段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, (time.perf_counter() - start) * 1000)
+
+
+class MetricsRecorder:
+    """开始运行后将各步骤记录逐笔写入追踪文件 (不在内存中保留，汇总表由追踪文件生成)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trace = None
+        self.trace_path = None
+
+    def start_run(self, trace_dir: str = METRICS_TRACE_DIR) -> str:
+        """开启新的追踪文件"""
+        os.makedirs(trace_dir, exist_ok=True)
+        # 文件名含纳秒，同一进程在同一秒内的多次运行 (如基准测试) 各自写入新文件
+        now_ns = time.time_ns()
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(now_ns / 1e9))
+        path = os.path.join(trace_dir, f"trace_{stamp}_{now_ns % 1_000_000_000:09d}_{os.getpid()}.jsonl")
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+            self._trace = open(path, 'w', encoding='utf-8', buffering=1)
+            self.trace_path = path
+        return path
+
+    def finish(self, record: StepRecord):
+        data = record.to_dict()
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def summary(self) -> list:
+        """由本次运行的追踪文件汇总 (未开始运行时为空)"""
+        if self.trace_path is None or not os.path.exists(self.trace_path):
+            return []
+        return summarize(read_trace([self.trace_path]))
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    return _recorder
+
+
+@contextmanager
+def step_metrics(drug_code: str, step: str):
+    """量测一个步骤；区块内可设置 record.outcome，异常时记为 error 或 cancelled"""
+    record = StepRecord(drug_code, step)
+    token = _current_record.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record.outcome = 'error'
+        raise
+    except BaseException:
+        record.outcome = 'cancelled'
+        raise
+    finally:
+        record.wall_ms = (time.perf_counter() - start) * 1000
+        _current_record.reset(token)
+        _recorder.finish(record)
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def summarize(records) -> list:
+    """按步骤汇总，返回依首次出现顺序排列的统计行"""
+    steps = {}
+    for data in records:
+        row = steps.setdefault(data['step'], {
+            'step': data['step'], 'count': 0, 'wall': [], 'outcomes': {}, 'timings_ms': {},
+            **dict.fromkeys(COUNTERS, 0)
+        })
+        row['count'] += 1
+        row['wall'].append(data['wall_ms'])
+        row['outcomes'][data['outcome']] = row['outcomes'].get(data['outcome'], 0) + 1
+        for counter in COUNTERS:
+            row[counter] += data.get(counter, 0)
+        for phase, value in data.get('timings_ms', {}).items():
+            row['timings_ms'][phase] = row['timings_ms'].get(phase, 0.0) + value
+
+    summary = []
+    for row in steps.values():
+        wall = row.pop('wall')
+        row['total_s'] = sum(wall) / 1000
+        row['mean_ms'] = sum(wall) / len(wall)
+        row['p95_ms'] = _percentile(wall, 0.95)
+        summary.append(row)
+    return summary
+
+
+def format_table(summary: list) -> str:
+    """输出汇总表文字"""
+    lines = [
+        f"{'步骤':<20}{'次数':>6}{'总秒数':>10}{'平均ms':>10}{'p95ms':>10}{'下载KB':>10}"
+        f"{'网页缓存':>8}{'LLM缓存':>8}{'LLM次数':>8}{'tokens入':>10}{'tokens出':>10}  结果 / 子阶段(秒)"
+    ]
+    for row in summary:
+        outcomes = ", ".join(f"{name}={count}" for name, count in sorted(row['outcomes'].items()))
+        timings = ", ".join(f"{name}={value / 1000:.1f}" for name, value in sorted(row['timings_ms'].items()))
+        lines.append(
+            f"{row['step']:<20}{row['count']:>6}{row['total_s']:>10.1f}{row['mean_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+            f"{row['bytes_fetched'] / 1024:>10.1f}{row['page_cache_hits']:>8}{row['cache_hits']:>8}{row['llm_calls']:>8}"
+            f"{row['llm_tokens_in']:>10}{row['llm_tokens_out']:>10}  {outcomes}" + (f" / {timings}" if timings else "")
+        )
+    return "\n".join(lines)
+
+
+def read_trace(paths: list):
+    """逐行读取一个或多个追踪文件"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="汇总五步法追踪文件")
+    parser.add_argument('traces', nargs='+', help="JSONL 追踪文件")
+    args = parser.parse_args()
+    print(format_table(summarize(read_trace(args.traces))))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,18 +7,18 @@
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
 import time
 import logging
-import random
 import os
 import sys
-import ollama
 import json
 import re
-import fitz  # PyMuPDF
-import io
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 
 # 导入项目配置
 project_root = Path(__file__).parent.parent
@@ -26,156 +26,228 @@ sys.path.insert(0, str(project_root))
 
 from config.project_config import (
     INPUT_CSV, OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV, GOOGLE_SEARCH_RESULTS_CSV,
-    REQUEST_TIMEOUT, MODEL, IS_DEMO, DEMO_LIMIT, BATCH_SIZE, SOURCE_URLS
+    MODEL, IS_DEMO, DEMO_LIMIT, BATCH_SIZE, DRUG_WORKERS, DEDUP_BY_INGREDIENT,
+    ASYNC_FETCH, SOURCE_CONTENT_LIMIT, PROMPT_CONTENT_LIMIT, LLM_CACHE_ENABLED, LLM_BATCH_MODE,
+    PIPELINE_MODE, PIPELINE_STAGE_WORKERS, SPECULATIVE_SEARCH, PAGE_CACHE_ENABLED, EXTRACT_PROCESSES,
+    STREAM_EXTRACT, STREAM_MAX_BYTES, PASSAGE_RANKING, FETCH_PER_HOST_DELAY, NETWORK_WORKERS
 )
-
-# 導入新的搜索庫
-try:
-    from googlesearch import search as google_search
-    import trafilatura
-    HAS_SEARCH_LIBS = True
-except ImportError:
-    HAS_SEARCH_LIBS = False
-    logging.warning("搜索庫未安裝，請運行: uv pip install googlesearch-python trafilatura")
-
-# 设置日志
-log_dir = project_root / "logs"
-log_dir.mkdir(exist_ok=True)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_dir / "multi_source_extraction.log", mode='w', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+from scripts.concurrency import (
+    network_slot, llm_slot, imap_ordered, count_llm_calls, record_llm_call,
+    raise_if_cancelled, run_cancellable
 )
+from scripts.tfda_snapshot import ensure_snapshot as ensure_tfda_snapshot, find_entry as find_tfda_entry
+from scripts.nhi_reference import load_table as load_nhi_table, search as search_nhi_table
+from scripts.ingredient_grouping import ClusterResults
+from scripts.llm_cache import get_cache as get_llm_cache, make_key as make_llm_cache_key
+from scripts.llm_batcher import get_batcher as get_llm_batcher
+from scripts.extraction_fields import FIELDS, FIELD_DESCRIPTIONS, is_filled, json_format_example
+from scripts.page_cache import get_cache as get_page_cache, is_cacheable, make_text_key
+from scripts.stream_extract import CHUNK_BYTES, StreamingExtractor, extract_text as extract_relevant_text
+from scripts.passage_ranking import pack_passages
+from scripts.progress_ledger import ProgressLedger
+from scripts.stage_pipeline import StagePipeline
+from scripts.drug_input import DrugInput
+from scripts.shard_runner import shard_paths, shard_stats
+from scripts.run_stats import RunStats
+from scripts import result_store
+from scripts import metrics
+
+# 搜索庫、BeautifulSoup、ollama 與 aiohttp 在使用它們的步驟首次執行時才導入，
+# 導入本模組 (如只查看狀態或統計) 不需載入這些依賴
+google_search = None
+trafilatura = None
+HAS_SEARCH_LIBS = None
+
+def search_libs_available() -> bool:
+    """首次調用時導入 googlesearch 與 trafilatura，返回是否可用"""
+    global google_search, trafilatura, HAS_SEARCH_LIBS
+    if HAS_SEARCH_LIBS is None:
+        try:
+            from googlesearch import search
+            import trafilatura as trafilatura_module
+        except ImportError:
+            HAS_SEARCH_LIBS = False
+            logging.warning("搜索庫未安裝，請運行: uv pip install googlesearch-python trafilatura")
+        else:
+            # 已被替換 (如基準測試) 的 google_search 保持不變
+            google_search = google_search or search
+            trafilatura = trafilatura_module
+            HAS_SEARCH_LIBS = True
+    return HAS_SEARCH_LIBS
+
+def setup_logging():
+    """直接執行本腳本時的日志配置 (由主流程或分片進程調用時沿用其配置)"""
+    log_dir = project_root / "logs"
+    log_dir.mkdir(exist_ok=True)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_dir / "multi_source_extraction.log", mode='w', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
 
 def scrape_tfda(drug_name: str, manufacturer: str, ingredient: str) -> str:
-    """从TFDA抓取药物信息"""
+    """从TFDA本地快照查询药物信息"""
     logging.info(f"尝试从TFDA抓取: {drug_name}")
-    tfda_api_url = SOURCE_URLS["TFDA"]
-    params = {
-        'method': 'openData',
-        'InfoId': '36'
-    }
-    
-    # 重试机制
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(tfda_api_url, params=params, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            
-            # 檢查 Content-Type 是否為 JSON
-            content_type = response.headers.get('Content-Type', '')
-            if 'application/json' not in content_type:
-                # 記錄錯誤 HTML 內容到 debug 文件
-                debug_dir = Path("logs/debug")
-                debug_dir.mkdir(exist_ok=True)
-                error_file = debug_dir / f"tfda_error_{drug_name}.html"
-                with open(error_file, 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                logging.warning(f"TFDA 返回非JSON內容，已保存到 {error_file}")
-                return ""
-            
-            all_drugs_data_raw = response.json()
-            
-            all_drugs_data = all_drugs_data_raw
-
-            if isinstance(all_drugs_data, list) and len(all_drugs_data) > 0:
-                pass
-            else:
-                return ""
-
-            found_info = []
-            if isinstance(all_drugs_data, list):
-                for drug_entry in all_drugs_data:
-                    if not isinstance(drug_entry, dict):
-                        continue
-
-                    entry_c_name = drug_entry.get('中文品名', '').lower().replace(' ', '')
-                    entry_e_name = drug_entry.get('英文品名', '').lower().replace(' ', '')
-                    entry_manuf = drug_entry.get('製造廠名稱', '').lower().replace(' ', '')
-                    entry_app_manuf = drug_entry.get('申請商名稱', '').lower().replace(' ', '')
-
-                    search_drug_name = drug_name.lower().replace(' ', '')
-                    search_manufacturer = manufacturer.lower().replace(' ', '')
-                    search_ingredient = ingredient.lower().replace(' ', '')
-
-                    name_match = (search_drug_name and (search_drug_name in entry_c_name or search_drug_name in entry_e_name))
-                    manuf_match = (search_manufacturer and (search_manufacturer in entry_manuf or search_manufacturer in entry_app_manuf))
-                    
-                    ingredient_match = (search_ingredient and search_ingredient in drug_entry.get('成份', '').lower().replace(' ', ''))
-
-                    if (name_match and manuf_match) or (name_match and ingredient_match):
-                        info_parts = []
-                        info_parts.append(f"中文品名: {drug_entry.get('中文品名', '資訊不足')}")
-                        info_parts.append(f"英文品名: {drug_entry.get('英文品名', '資訊不足')}")
-                        info_parts.append(f"許可證字號: {drug_entry.get('許可證字號', '資訊不足')}")
-                        info_parts.append(f"申請商名稱: {drug_entry.get('申請商名稱', '資訊不足')}")
-                        info_parts.append(f"製造廠名稱: {drug_entry.get('製造廠名稱', '資訊不足')}")
-                        info_parts.append(f"適應症: {drug_entry.get('適應症', '資訊不足')}")
-                        info_parts.append(f"用法用量: {drug_entry.get('用法用量', '資訊不足')}")
-                        info_parts.append(f"注意事項: {drug_entry.get('注意事項', '資訊不足')}")
-                        found_info.append("\n".join(info_parts))
-                        if found_info:
-                            logging.info(f"找到TFDA数据: {drug_name}")
-                            return "\n\n".join(found_info)
-
-            if not found_info:
-                logging.info(f"TFDA中未找到相关数据: {drug_name}")
-            return "\n\n".join(found_info)
 
-        except requests.exceptions.Timeout:
-            logging.warning(f"TFDA请求超时 (尝试 {attempt + 1}/{max_retries}): {drug_name}")
-            if attempt < max_retries - 1:
-                time.sleep(2)  # 等待2秒后重试
-                continue
-            else:
-                logging.error(f"TFDA抓取超时 {drug_name}: 超过最大重试次数")
-                return ""
-                
-        except requests.exceptions.ConnectionError:
-            logging.warning(f"TFDA连接错误 (尝试 {attempt + 1}/{max_retries}): {drug_name}")
-            if attempt < max_retries - 1:
-                time.sleep(3)  # 等待3秒后重试
-                continue
-            else:
-                logging.error(f"TFDA连接失败 {drug_name}: 超过最大重试次数")
-                return ""
-                
-        except json.JSONDecodeError:
-            logging.error(f"TFDA JSON 解析失敗: {drug_name}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # 等待1秒后重试
-                continue
-            else:
-                return ""
-                
-        except Exception as e:
-            logging.error(f"TFDA抓取失败 {drug_name}: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # 等待1秒后重试
-                continue
-            else:
-                return ""
-    
-    return ""
+    # 快照每次运行只下载或重新验证一次 (此时才占用网络名额)，之后均为本地索引查询
+    with metrics.timed('tfda_snapshot'):
+        snapshot_available = ensure_tfda_snapshot()
+    if not snapshot_available:
+        logging.warning(f"TFDA快照不可用，跳过: {drug_name}")
+        return ""
+
+    try:
+        with metrics.timed('tfda_lookup'):
+            drug_entry = find_tfda_entry(drug_name, manufacturer, ingredient)
+    except Exception as e:
+        logging.error(f"TFDA查询失败 {drug_name}: {e}")
+        return ""
+
+    if not drug_entry:
+        logging.info(f"TFDA中未找到相关数据: {drug_name}")
+        return ""
+
+    info_parts = []
+    info_parts.append(f"中文品名: {drug_entry.get('中文品名', '資訊不足')}")
+    info_parts.append(f"英文品名: {drug_entry.get('英文品名', '資訊不足')}")
+    info_parts.append(f"許可證字號: {drug_entry.get('許可證字號', '資訊不足')}")
+    info_parts.append(f"申請商名稱: {drug_entry.get('申請商名稱', '資訊不足')}")
+    info_parts.append(f"製造廠名稱: {drug_entry.get('製造廠名稱', '資訊不足')}")
+    info_parts.append(f"適應症: {drug_entry.get('適應症', '資訊不足')}")
+    info_parts.append(f"用法用量: {drug_entry.get('用法用量', '資訊不足')}")
+    info_parts.append(f"注意事項: {drug_entry.get('注意事項', '資訊不足')}")
+    logging.info(f"找到TFDA数据: {drug_name}")
+    return "\n".join(info_parts)
+
+def missing_fields(status: dict) -> list:
+    """尚未取得的欄位 (按 FIELDS 順序)"""
+    return [field for field in FIELDS if not status.get(field)]
 
 def update_extraction_status(status: dict, result: dict) -> dict:
     """更新提取狀態字典"""
-    for field in ['適應症', '用法用量', '注意事項']:
-        if result.get(field, '') not in ['', '資訊不足', '模型提取失敗', '模型回傳格式錯誤']:
+    for field in FIELDS:
+        if is_filled(result.get(field, '')):
             status[field] = True
     return status
 
+def step1_google_results(drug_info: dict, google_results_df: pd.DataFrame) -> dict:
+    """第1步: 使用Google搜索結果 (中文名搜索)"""
+    drug_code = drug_info.get('藥品代號', '')
+    if google_results_df.empty or drug_code not in google_results_df.index:
+        return {}
+    google_info = google_results_df.loc[drug_code]
+    return {
+        "適應症": google_info.get("適應症", ""),
+        "用法用量": google_info.get("用法用量", ""),
+        "注意事項": google_info.get("注意事項", "")
+    }
+
+def step2_tfda(drug_info: dict, google_results_df: pd.DataFrame, fields: list = FIELDS) -> dict:
+    """第2步: TFDA API"""
+    drug_name = drug_info.get('藥品中文名稱', '')
+    tfda_content = scrape_tfda(drug_name, drug_info.get('製造廠名稱', ''), drug_info.get('成份', ''))
+    if not tfda_content:
+        return {}
+    return extract_info_with_llm(tfda_content, drug_name, "tfda_api", fields)
+
+# 五步法的步驟順序：(名稱, 日誌說明, 處理函數, 是否需要搜索庫)；
+# 處理函數的參數為 (藥物資料, Google搜索結果, 尚未取得的欄位)
+CASCADE_STEPS = [
+    ("google_results", "第1步: 使用Google搜索結果 (中文名)", lambda drug_info, df, _: step1_google_results(drug_info, df), False),
+    ("tfda", "第2步: 嘗試TFDA API", step2_tfda, False),
+    ("chinese_search", "第3步: 中文名搜索", lambda drug_info, _, fields: step3_chinese_search(drug_info, fields), True),
+    ("english_search", "第4步: 英文名搜索", lambda drug_info, _, fields: step4_english_search(drug_info, fields), True),
+    ("ingredient_search", "第5步: 成分搜索", lambda drug_info, _, fields: step5_ingredient_search(drug_info, fields), True),
+]
+
+def active_cascade_steps() -> list:
+    """當前環境可執行的步驟 (未安裝搜索庫時略過第3-5步)"""
+    return [step for step in CASCADE_STEPS if not step[3] or search_libs_available()]
+
+def execute_step(step: tuple, drug_info: dict, google_results_df: pd.DataFrame, fields: list = FIELDS) -> dict:
+    """執行一個步驟的處理函數 (只提取 fields 中的欄位)，並記錄耗時、計數與結果"""
+    name, _, func, _ = step
+    with metrics.step_metrics(drug_info.get('藥品代號', ''), name) as record:
+        step_result = func(drug_info, google_results_df, fields)
+        filled = sum(1 for field in fields if is_filled((step_result or {}).get(field, '')))
+        record.outcome = 'complete' if filled == len(fields) else 'partial' if filled else 'empty'
+    return step_result
+
+def merge_step_result(step_name: str, step_result: dict, result: dict, status: dict) -> dict:
+    """合併一個步驟的結果，並在 result['_sources'] 記錄各欄位的值來自哪個步驟；
+    已取得的欄位保留較早步驟的值，不會被之後的「資訊不足」或其他值覆蓋"""
+    sources = result.setdefault('_sources', {})
+    for key, value in step_result.items():
+        if key not in FIELDS:
+            result[key] = value
+        elif not is_filled(result.get(key, '')):
+            result[key] = value
+            sources[key] = step_name
+    return update_extraction_status(status, result)
+
+def run_cascade_step(step: tuple, drug_info: dict, google_results_df: pd.DataFrame, result: dict, status: dict) -> dict:
+    """執行一個步驟並合併結果，返回更新後的狀態；步驟只提取尚未取得的欄位"""
+    logging.info(step[1])
+    step_result = execute_step(step, drug_info, google_results_df, missing_fields(status))
+    if step_result:
+        status = merge_step_result(step[0], step_result, result, status)
+    return status
+
+def run_speculative_steps(steps: list, drug_info: dict, google_results_df: pd.DataFrame, result: dict, status: dict) -> dict:
+    """同時啟動多個搜索步驟 (均只提取啟動時尚未取得的欄位)，按原步驟順序合併結果；
+    三個欄位都取得後，取消仍在進行的低優先步驟"""
+    cancel_event = threading.Event()
+    executor = get_speculative_executor()
+    fields = missing_fields(status)
+    # 複製上下文使LLM調用計數歸入當前藥物
+    futures = [
+        executor.submit(contextvars.copy_context().run, run_cancellable, cancel_event, execute_step, step, drug_info, google_results_df, fields)
+        for step in steps
+    ]
+    try:
+        for step, future in zip(steps, futures):
+            if all(status.values()):
+                logging.info("欄位已齊全，取消其餘推測步驟")
+                break
+            logging.info(f"{step[1]} (推測執行)")
+            step_result = future.result()
+            if step_result:
+                status = merge_step_result(step[0], step_result, result, status)
+    finally:
+        cancel_event.set()
+        # 不等待已取消的步驟結束，進行中的請求返回後即被丟棄；尚未開始的步驟直接取消
+        for future in futures:
+            future.cancel()
+    return status
+
+_speculative_executor = None
+_speculative_executor_lock = threading.Lock()
+
+def get_speculative_executor() -> ThreadPoolExecutor:
+    """推測執行的線程池，整個運行共用 (不為每種藥物另建線程與緩存連接)；
+    步驟都在網絡名額內執行，線程數與網絡並發上限相同"""
+    global _speculative_executor
+    if _speculative_executor is None:
+        with _speculative_executor_lock:
+            if _speculative_executor is None:
+                _speculative_executor = ThreadPoolExecutor(max_workers=NETWORK_WORKERS, thread_name_prefix='speculative')
+    return _speculative_executor
+
+def close_speculative_executor():
+    global _speculative_executor
+    with _speculative_executor_lock:
+        if _speculative_executor is not None:
+            _speculative_executor.shutdown(wait=False, cancel_futures=True)
+            _speculative_executor = None
+
 def process_drug_with_five_steps(drug_info: dict, google_results_df: pd.DataFrame) -> dict:
     """五步法藥物信息提取流程"""
     drug_name = drug_info.get('藥品中文名稱', '')
     drug_code = drug_info.get('藥品代號', '')
-    manufacturer = drug_info.get('製造廠名稱', '')
-    ingredient = drug_info.get('成份', '')
     
     # 初始化狀態和結果
     status = {
@@ -187,84 +259,272 @@ def process_drug_with_five_steps(drug_info: dict, google_results_df: pd.DataFram
     
     logging.info(f"開始五步法處理: {drug_code} - {drug_name}")
     
-    # 第1步: 檢查Google搜索結果 (中文名搜索)
-    if not all(status.values()) and not google_results_df.empty and drug_code in google_results_df.index:
-        logging.info(f"第1步: 使用Google搜索結果 (中文名)")
-        google_info = google_results_df.loc[drug_code]
-        result.update({
-            "適應症": google_info.get("適應症", ""),
-            "用法用量": google_info.get("用法用量", ""),
-            "注意事項": google_info.get("注意事項", "")
-        })
-        status = update_extraction_status(status, result)
-    
-    # 第2步: TFDA API (修復後)
-    if not all(status.values()):
-        logging.info(f"第2步: 嘗試TFDA API")
-        tfda_content = scrape_tfda(drug_name, manufacturer, ingredient)
-        if tfda_content:
-            tfda_result = extract_info_with_llm(tfda_content, drug_name, "tfda_api")
-            result.update(tfda_result)
-            status = update_extraction_status(status, result)
-    
-    # 第3步: 中文名搜索
-    if not all(status.values()) and HAS_SEARCH_LIBS:
-        logging.info(f"第3步: 中文名搜索")
-        chinese_result = step3_chinese_search(drug_info)
-        if chinese_result:
-            result.update(chinese_result)
-            status = update_extraction_status(status, result)
-    
-    # 第4步: 英文名搜索
-    if not all(status.values()) and HAS_SEARCH_LIBS:
-        logging.info(f"第4步: 英文名搜索")
-        english_result = step4_english_search(drug_info)
-        if english_result:
-            result.update(english_result)
-            status = update_extraction_status(status, result)
-    
-    # 第5步: 成分搜索
-    if not all(status.values()) and HAS_SEARCH_LIBS:
-        logging.info(f"第5步: 成分搜索")
-        ingredient_result = step5_ingredient_search(drug_info)
-        if ingredient_result:
-            result.update(ingredient_result)
-            status = update_extraction_status(status, result)
-    
-    # 如果仍有缺失字段，使用當前邏輯作為備用
-    if not all(status.values()):
-        logging.info(f"使用備用方案處理缺失字段")
-        # 保持現有備用邏輯
+    status = run_cascade(active_cascade_steps(), drug_info, google_results_df, result, status)
         
     logging.info(f"五步法處理完成: 適應症={status['適應症']}, 用法用量={status['用法用量']}, 注意事項={status['注意事項']}")
     return result
 
-def search_and_extract_web_content(query: str, drug_name: str, search_type: str) -> dict:
-    """搜索並提取網頁內容"""
+def run_cascade(steps: list, drug_info: dict, google_results_df: pd.DataFrame, result: dict, status: dict) -> dict:
+    """依序執行各步驟，三個欄位都取得後即停止；推測模式下第3-5步同時啟動"""
+    for position, step in enumerate(steps):
+        if all(status.values()):
+            break
+        if SPECULATIVE_SEARCH and step[3]:
+            return run_speculative_steps(steps[position:], drug_info, google_results_df, result, status)
+        status = run_cascade_step(step, drug_info, google_results_df, result, status)
+    return status
+
+def apply_shared_result(drug_info: dict, google_results_df: pd.DataFrame, shared_info: dict) -> dict:
+    """同成份分組成員的提取結果：第1步的Google搜索結果按藥品代號對應，不能共享，由本藥物自行執行；
+    其餘欄位沿用代表藥物第2-5步的結果；代表藥物由其第1步取得而本藥物仍缺少的欄位，由本藥物繼續執行第2-5步"""
+    steps = active_cascade_steps()
+    result = {}
+    status = run_cascade_step(steps[0], drug_info, google_results_df, result, dict.fromkeys(FIELDS, False))
+
+    shared_sources = shared_info.get('_sources', {})
+    sources = result.setdefault('_sources', {})
+    for key, value in shared_info.items():
+        if key == '_sources' or shared_sources.get(key) == steps[0][0]:
+            continue
+        if key not in FIELDS:
+            result[key] = value
+        elif not is_filled(result.get(key, '')):
+            result[key] = value
+            sources[key] = shared_sources.get(key)
+    status = update_extraction_status(status, result)
+
+    # 代表藥物其餘步驟已嘗試過的欄位不再重試，只補齊代表藥物由第1步取得的欄位
+    from_step1 = [
+        field for field in FIELDS
+        if shared_sources.get(field) == steps[0][0] and is_filled(shared_info.get(field, ''))
+    ]
+    pending = {field: status[field] or field not in from_step1 for field in FIELDS}
+    if not all(pending.values()):
+        run_cascade(steps[1:], drug_info, google_results_df, result, pending)
+    return result
+
+
+def html_to_text(html: str) -> str:
+    """以BeautifulSoup移除腳本樣式並壓縮空白"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def extract_page_text(html: str) -> str:
+    """從已下載的HTML提取正文，trafilatura失敗時改用BeautifulSoup"""
+    if search_libs_available():
+        try:
+            return trafilatura.extract(html, include_comments=False, include_tables=False) or ""
+        except Exception as e:
+            logging.warning(f"trafilatura提取失敗: {e}")
+    return html_to_text(html)
+
+# 正文提取邏輯變更時遞增，使舊的正文緩存失效
+TEXT_EXTRACTOR_VERSION = 1
+
+def extract_source_text(html: str) -> str:
+    """按設置提取單一來源的正文 (流式提取只保留相關段落)"""
+    if STREAM_EXTRACT:
+        return extract_relevant_text(html, SOURCE_CONTENT_LIMIT)
+    return extract_page_text(html)
+
+def text_extractor_version() -> str:
+    """正文緩存鍵中的提取器版本 (本模組的提取邏輯與所用庫的版本)"""
+    if STREAM_EXTRACT:
+        return f"{TEXT_EXTRACTOR_VERSION}/stream-{SOURCE_CONTENT_LIMIT}"
+    if search_libs_available():
+        return f"{TEXT_EXTRACTOR_VERSION}/trafilatura-{trafilatura.__version__}"
+    import bs4
+    return f"{TEXT_EXTRACTOR_VERSION}/bs4-{bs4.__version__}"
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """正文提取的進程池 (EXTRACT_PROCESSES > 0 時使用)"""
+    global _extract_pool
+    if _extract_pool is None:
+        with _extract_pool_lock:
+            if _extract_pool is None:
+                # spawn 啟動的子進程不繼承抓取線程與網絡連接
+                _extract_pool = ProcessPoolExecutor(
+                    max_workers=EXTRACT_PROCESSES, mp_context=multiprocessing.get_context('spawn')
+                )
+    return _extract_pool
+
+def close_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown()
+            _extract_pool = None
+
+def page_text(url: str, html: str) -> str:
+    """提取網頁正文；以 (URL, 內容雜湊, 提取器版本) 緩存提取結果，相同內容不再重新解析"""
+    cache = get_page_cache() if PAGE_CACHE_ENABLED else None
+    if cache:
+        key = make_text_key(url, html, text_extractor_version())
+        text = cache.get_text(key)
+        if text is not None:
+            return text
+    if EXTRACT_PROCESSES > 0:
+        text = get_extract_pool().submit(extract_source_text, html).result()
+    else:
+        text = extract_source_text(html)
+    if cache:
+        cache.put_text(key, text)
+    return text
+
+# 依序下載時各主機下一次請求的最早開始時間
+_host_next_start = {}
+_host_next_start_lock = threading.Lock()
+
+def wait_for_host(url: str):
+    """同一主機相鄰兩次請求至少間隔 FETCH_PER_HOST_DELAY 秒 (與 AsyncPageFetcher 相同)"""
+    host = urlsplit(url).hostname or ''
+    with _host_next_start_lock:
+        now = time.monotonic()
+        start = max(now, _host_next_start.get(host, 0))
+        _host_next_start[host] = start + FETCH_PER_HOST_DELAY
+    if start > now:
+        time.sleep(start - now)
+
+def download_page(url: str, min_chars: int = None) -> tuple:
+    """以requests下載單一網頁，經網頁緩存：TTL內不發請求，過期後以條件請求重新驗證；
+    返回 (HTML, None)，min_chars 不為 None 且須下載時邊下載邊提取相關段落，返回 (None, 正文)"""
+    cache = get_page_cache() if PAGE_CACHE_ENABLED else None
+    cached = cache.get(url) if cache else None
+    if cached and cached.fresh:
+        metrics.add('page_cache_hits')
+        return cached.text, None
+
+    # 設置用戶代理頭
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        **(cached.conditional_headers() if cached else {})
+    }
+    # 首次下載與重新驗證緩存的條件請求同樣會訪問主機，都遵守每主機請求間隔
+    wait_for_host(url)
+    with network_slot(), metrics.timed('fetch'):
+        response = requests.get(url, headers=headers, timeout=10, stream=min_chars is not None)
+    with response:
+        if response.status_code == 304 and cached:
+            cache.mark_revalidated(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            metrics.add('page_cache_hits')
+            return cached.text, None
+        if response.status_code != 200:
+            return "", None
+        if min_chars is not None:
+            return None, stream_response_text(url, response, min_chars, cache)
+        metrics.add('bytes_fetched', len(response.content))
+        # 未聲明字符集時與 response.text 一樣以內容推測
+        encoding = response.encoding or response.apparent_encoding
+        if cache and is_cacheable(response.headers):
+            cache.put(url, response.content, encoding, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content.decode(encoding or 'utf-8', errors='replace'), None
+
+def stream_response_text(url: str, response, min_chars: int, cache) -> str:
+    """邊讀取響應邊提取相關段落，足夠 min_chars 字或達到 STREAM_MAX_BYTES 後即停止下載；
+    讀完整個響應時網頁仍寫入網頁緩存"""
+    # 響應頭未聲明字符集時由 <meta charset> 判斷 (requests 對 text/* 預設的 ISO-8859-1 不可靠)
+    charset = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else None
+    extractor = StreamingExtractor(min_chars, charset)
+    chunks = []
+    received = 0
+    complete = True
+    with network_slot(), metrics.timed('fetch'):
+        chunk_iter = response.iter_content(CHUNK_BYTES)
+        for chunk in chunk_iter:
+            chunks.append(chunk)
+            received += len(chunk)
+            with metrics.timed('extract'):
+                extractor.feed_bytes(chunk)
+            if extractor.done or received >= STREAM_MAX_BYTES:
+                # 提前停止時網路上的響應若已全部收到 (如小網頁)，讀出本地剩餘的 (解壓後) 內容仍寫入緩存；
+                # 不與 Content-Length 比較，壓縮響應的 Content-Length 是壓縮後的大小
+                complete = response.raw.closed
+                if complete:
+                    chunks.extend(chunk_iter)
+                break
+    metrics.add('bytes_fetched', received)
+    if complete:
+        extractor.close()
+        if cache and is_cacheable(response.headers):
+            cache.put(
+                url, b''.join(chunks), extractor.encoding or 'utf-8',
+                response.headers.get('ETag'), response.headers.get('Last-Modified')
+            )
+    return extractor.text()
+
+def fetch_page_text(url: str) -> str:
+    """依序下載單一網頁並提取正文 (未安裝aiohttp時的備用路徑)"""
+    try:
+        html, text = download_page(url, SOURCE_CONTENT_LIMIT if STREAM_EXTRACT else None)
+        if text is not None:
+            return text
+        if html:
+            with metrics.timed('extract'):
+                return page_text(url, html)
+    except Exception as e:
+        logging.warning(f"提取網頁內容失敗 {url}: {e}")
+    return ""
+
+# 各搜索類型的關鍵詞：(三個欄位都缺時使用的關鍵詞, 只缺部分欄位時各欄位的關鍵詞)
+SEARCH_KEYWORDS = {
+    # 中文搜索加強用法用量相關關鍵詞
+    "chinese_search": (
+        "用法 用量 劑量 服用方法 適應症 副作用 禁忌",
+        {"適應症": "適應症 治療", "用法用量": "用法 用量 劑量 服用方法", "注意事項": "副作用 禁忌 注意事項"}
+    ),
+    # 英文搜索使用更專業的醫學術語
+    "english_search": (
+        "dosage administration contraindications side effects",
+        {"適應症": "indications uses", "用法用量": "dosage administration", "注意事項": "contraindications side effects warnings"}
+    ),
+    "ingredient_search": (
+        "dosage",
+        {"適應症": "indications", "用法用量": "dosage", "注意事項": "contraindications warnings"}
+    ),
+    "general": (
+        "適應症 用法用量 注意事項",
+        {"適應症": "適應症", "用法用量": "用法用量", "注意事項": "注意事項"}
+    ),
+}
+
+def search_keywords(search_type: str, fields: list = FIELDS) -> str:
+    """搜索關鍵詞；只缺部分欄位時只搜索這些欄位的資訊"""
+    all_keywords, field_keywords = SEARCH_KEYWORDS.get(search_type, SEARCH_KEYWORDS["general"])
+    if len(fields) == len(FIELDS):
+        return all_keywords
+    return " ".join(field_keywords[field] for field in fields)
+
+def search_and_extract_web_content(query: str, drug_name: str, search_type: str, fields: list = FIELDS) -> dict:
+    """搜索並提取網頁內容 (只提取 fields 中的欄位)"""
     logging.info(f"執行 {search_type} 搜索: {query}")
     
     try:
-        # 構建搜索查詢 - 針對不同搜索類型優化關鍵詞
+        # 構建搜索查詢 - 針對不同搜索類型與缺少的欄位選擇關鍵詞 (成分搜索的查詢已含關鍵詞)
         if search_type == "ingredient_search":
             search_query = query
-        elif search_type == "chinese_search":
-            # 中文搜索加強用法用量相關關鍵詞
-            search_query = f"{query} 用法 用量 劑量 服用方法 適應症 副作用 禁忌"
-        elif search_type == "english_search":
-            # 英文搜索使用更專業的醫學術語
-            search_query = f"{query} dosage administration contraindications side effects"
         else:
-            search_query = f"{query} 適應症 用法用量 注意事項"
+            search_query = f"{query} {search_keywords(search_type, fields)}"
         
         urls = []
         
         # 方法1: 使用googlesearch-python (如果可用)
-        if HAS_SEARCH_LIBS:
+        if search_libs_available():
             try:
-                for url in google_search(search_query, num_results=3, lang="zh-tw", timeout=5):
-                    urls.append(url)
-                    if len(urls) >= 3:
-                        break
+                with network_slot(), metrics.timed('google_search'):
+                    for url in google_search(search_query, num_results=3, lang="zh-tw", timeout=5):
+                        urls.append(url)
+                        if len(urls) >= 3:
+                            break
             except Exception as e:
                 logging.warning(f"Google搜索庫失敗: {e}")
         
@@ -286,89 +546,60 @@ def search_and_extract_web_content(query: str, drug_name: str, search_type: str)
             return {}
         
         # 提取網頁內容
+        page_urls = []
+        for url in urls:
+            # 檢查URL類型
+            if url.endswith('.pdf'):
+                # PDF文件，跳過處理
+                logging.info(f"跳過PDF文件: {url}")
+                continue
+            page_urls.append(url)
+
+        raise_if_cancelled()
+        from scripts import async_fetcher
+        if ASYNC_FETCH and async_fetcher.HAS_AIOHTTP:
+            # 並行下載所有候選網頁，內容足夠填滿提示詞後即取消其餘請求
+            page_texts = async_fetcher.get_fetcher().fetch_texts(
+                page_urls, page_text, PROMPT_CONTENT_LIMIT, SOURCE_CONTENT_LIMIT
+            )
+        else:
+            page_texts = [(i, url, fetch_page_text(url)) for i, url in enumerate(page_urls)]
+
         combined_content = ""
-        for i, url in enumerate(urls):
-            try:
-                # 設置用戶代理頭
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                
-                # 檢查URL類型
-                if url.endswith('.pdf'):
-                    # PDF文件，跳過處理
-                    logging.info(f"跳過PDF文件: {url}")
-                    continue
-                
-                if HAS_SEARCH_LIBS:
-                    try:
-                        # 使用trafilatura提取 (不傳遞headers)
-                        downloaded = trafilatura.fetch_url(url)
-                        if downloaded:
-                            content = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
-                            if content:
-                                combined_content += f"--- 來源 {i+1}: {url} ---\n{content[:1000]}\n\n"
-                    except Exception as e:
-                        logging.warning(f"trafilatura提取失敗 {url}: {e}")
-                        # 備用方法
-                        try:
-                            # 加入隨機延遲避免被檢測為爬蟲
-                            time.sleep(random.uniform(1, 3))
-                            response = requests.get(url, headers=headers, timeout=10)
-                            if response.status_code == 200:
-                                soup = BeautifulSoup(response.text, 'html.parser')
-                                for script in soup(["script", "style"]):
-                                    script.decompose()
-                                text = soup.get_text()
-                                lines = (line.strip() for line in text.splitlines())
-                                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                                text = ' '.join(chunk for chunk in chunks if chunk)
-                                if text:
-                                    combined_content += f"--- 來源 {i+1}: {url} ---\n{text[:1000]}\n\n"
-                        except Exception as e2:
-                            logging.warning(f"備用提取也失敗 {url}: {e2}")
-                else:
-                    # 備用方法: 直接requests + BeautifulSoup
-                    try:
-                        # 加入隨機延遲避免被檢測為爬蟲
-                        time.sleep(random.uniform(1, 3))
-                        response = requests.get(url, headers=headers, timeout=10)
-                        if response.status_code == 200:
-                            soup = BeautifulSoup(response.text, 'html.parser')
-                            for script in soup(["script", "style"]):
-                                script.decompose()
-                            text = soup.get_text()
-                            lines = (line.strip() for line in text.splitlines())
-                            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                            text = ' '.join(chunk for chunk in chunks if chunk)
-                            if text:
-                                combined_content += f"--- 來源 {i+1}: {url} ---\n{text[:1000]}\n\n"
-                    except Exception as e:
-                        logging.warning(f"提取網頁內容失敗 {url}: {e}")
-                        
-            except Exception as e:
-                logging.warning(f"提取網頁內容失敗 {url}: {e}")
+        if PASSAGE_RANKING:
+            # 只送入與適應症/用法用量/注意事項相關的段落；成分搜索的查詢含網站語法，不作為查詢詞
+            names = (drug_name,) if search_type == "ingredient_search" else (drug_name, query)
+            with metrics.timed('rank'):
+                combined_content = pack_passages(
+                    [(i, url, text) for i, url, text in page_texts if text], PROMPT_CONTENT_LIMIT, names, fields
+                )
+        if not combined_content:
+            # 未啟用排序或沒有任何段落含查詢詞時，每個來源取開頭的內容
+            for i, url, text in page_texts:
+                if text:
+                    combined_content += f"--- 來源 {i+1}: {url} ---\n{text[:SOURCE_CONTENT_LIMIT]}\n\n"
         
         if not combined_content:
             logging.warning(f"無法提取 {search_type} 搜索內容: {query}")
             return {}
         
         # 使用LLM提取信息
-        return extract_info_with_llm(combined_content, drug_name, search_type)
+        raise_if_cancelled()
+        return extract_info_with_llm(combined_content, drug_name, search_type, fields)
         
     except Exception as e:
         logging.error(f"{search_type} 搜索失敗 {query}: {e}")
         return {}
 
-def step3_chinese_search(drug_info: dict) -> dict:
+def step3_chinese_search(drug_info: dict, fields: list = FIELDS) -> dict:
     """第3步: 中文名搜索"""
     drug_name = drug_info.get('藥品中文名稱', '')
     if not drug_name:
         return {}
     
-    return search_and_extract_web_content(drug_name, drug_name, "chinese_search")
+    return search_and_extract_web_content(drug_name, drug_name, "chinese_search", fields)
 
-def step4_english_search(drug_info: dict) -> dict:
+def step4_english_search(drug_info: dict, fields: list = FIELDS) -> dict:
     """第4步: 英文名搜索"""
     english_name = drug_info.get('藥品英文名稱', '')
     drug_name = drug_info.get('藥品中文名稱', '')
@@ -376,9 +607,9 @@ def step4_english_search(drug_info: dict) -> dict:
     if not english_name:
         return {}
     
-    return search_and_extract_web_content(english_name, drug_name, "english_search")
+    return search_and_extract_web_content(english_name, drug_name, "english_search", fields)
 
-def step5_ingredient_search(drug_info: dict) -> dict:
+def step5_ingredient_search(drug_info: dict, fields: list = FIELDS) -> dict:
     """第5步: 成分搜索"""
     ingredient = drug_info.get('成份', '')
     drug_name = drug_info.get('藥品中文名稱', '')
@@ -388,43 +619,33 @@ def step5_ingredient_search(drug_info: dict) -> dict:
     
     # 優先搜索權威醫療網站
     authority_sites = "site:drugs.com OR site:medscape.com OR site:webmd.com"
-    query = f"{ingredient} prescribing information dosage {authority_sites}"
+    query = f"{ingredient} prescribing information {search_keywords('ingredient_search', fields)} {authority_sites}"
     
-    return search_and_extract_web_content(query, drug_name, "ingredient_search")
+    return search_and_extract_web_content(query, drug_name, "ingredient_search", fields)
 
 def scrape_nhi(drug_name: str, manufacturer: str, ingredient: str) -> str:
-    """从NHI抓取药物信息"""
+    """从NHI参考资料表查询药物信息"""
     logging.info(f"尝试从NHI抓取: {drug_name}")
-    nhi_download_url = SOURCE_URLS["NHI_DATA_DOWNLOAD"]
-    
+
+    # 资料表每次运行只建立一次，查询为倒排索引的集合交集
+    nhi_table = load_nhi_table()
+    if nhi_table is None:
+        return ""
+
     try:
-        response = requests.get(nhi_download_url, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        
-        nhi_df = pd.read_csv(io.StringIO(response.text), encoding='utf-8', on_bad_lines='skip')
-        
-        search_drug_name_lower = drug_name.lower().replace(' ', '')
-        search_ingredient_lower = ingredient.lower().replace(' ', '')
-        search_manufacturer_lower = manufacturer.lower().replace(' ', '')
-
-        filtered_df = nhi_df[
-            (nhi_df['藥品中文名稱'].fillna('').str.lower().str.replace(' ', '').str.contains(search_drug_name_lower)) | 
-            (nhi_df['成份'].fillna('').str.lower().str.replace(' ', '').str.contains(search_ingredient_lower)) | 
-            (nhi_df['製造廠名稱'].fillna('').str.lower().str.replace(' ', '').str.contains(search_manufacturer_lower))
-        ]
-        
+        matched_rows = search_nhi_table(nhi_table, drug_name, manufacturer, ingredient)
+
         found_info = []
-        if not filtered_df.empty:
-            for index, row in filtered_df.iterrows():
-                info_parts = []
-                info_parts.append(f"健保代碼: {row.get('藥品代號', '資訊不足')}")
-                info_parts.append(f"給付資訊: {row.get('參考價', '資訊不足')}")
-                info_parts.append(f"劑型: {row.get('劑型', '資訊不足')}")
-                found_info.append("\n".join(info_parts))
-            if found_info:
-                logging.info(f"找到NHI数据: {drug_name}")
-                return "\n\n".join(found_info)
-        
+        for row in matched_rows:
+            info_parts = []
+            info_parts.append(f"健保代碼: {row.get('藥品代號', '資訊不足')}")
+            info_parts.append(f"給付資訊: {row.get('參考價', '資訊不足')}")
+            info_parts.append(f"劑型: {row.get('劑型', '資訊不足')}")
+            found_info.append("\n".join(info_parts))
+        if found_info:
+            logging.info(f"找到NHI数据: {drug_name}")
+            return "\n\n".join(found_info)
+
         logging.info(f"NHI中未找到相关数据: {drug_name}")
         return ""
 
@@ -432,50 +653,83 @@ def scrape_nhi(drug_name: str, manufacturer: str, ingredient: str) -> str:
         logging.error(f"NHI抓取失败: {e}")
         return ""
 
-def extract_info_with_llm(text_content: str, drug_name: str, search_type: str = "general") -> dict:
-    """使用本地LLM提取信息"""
+# 修改提示詞內容時遞增，使舊的LLM緩存失效
+PROMPT_TEMPLATE_VERSION = 1
+
+def build_extraction_prompt(template_name: str, text_content: str, fields: list = FIELDS) -> str:
+    """單一藥物的提取提示詞，只要求 fields 中的欄位"""
+    descriptions = "\n".join(f"- {FIELD_DESCRIPTIONS[template_name][field]}" for field in fields)
+    if template_name == "ingredient_translation":
+        intro = "你是藥品資訊提取和翻譯助手。請將以下英文藥理資訊翻譯成台灣繁體中文，並從中提取："
+        notes = []
+        rules = [
+            "先將英文內容翻譯成台灣繁體中文",
+            "從翻譯後的內容中提取資訊",
+            "每個欄位的回答必須少於100個字元",
+            "如果資訊不存在，在該欄位回答「資訊不足」",
+            "輸出格式為 JSON"
+        ]
+        content_label = "英文內容："
+    else:
+        intro = "你是藥品資訊提取助手。從以下內容提取："
+        notes = []
+        rules = ["以台灣繁體中文簡潔地回答。", "每個欄位的回答都必須少於100個字元。"]
+        if "用法用量" in fields:
+            notes.append("特別注意用法用量的提取，請尋找：服用方法、劑量、頻率、時間等資訊。")
+            rules.append("如果找不到明確的用法用量，請尋找任何劑量相關資訊。")
+        rules.append("如果資訊完全不存在，在該欄位回答「資訊不足」。")
+        rules.append(f"輸出格式為 JSON，使用以下格式：{json_format_example(fields)}")
+        content_label = "內容："
+
+    numbered_rules = "\n".join(f"{number}. {rule}" for number, rule in enumerate(rules, 1))
+    sections = [
+        f"{intro}\n{descriptions}",
+        *notes,
+        f"嚴格遵守以下規則：\n{numbered_rules}",
+        f"{content_label}\n{text_content[:PROMPT_CONTENT_LIMIT]}"
+    ]
+    return "\n\n".join(sections)
+
+def extract_info_with_llm(text_content: str, drug_name: str, search_type: str = "general", fields: list = FIELDS) -> dict:
+    """使用本地LLM提取信息；fields 為要提取的欄位 (只缺部分欄位時提示詞與回答都只含這些欄位)"""
     if not text_content:
-        return {"適應症": "", "用法用量": "", "注意事項": ""}
+        return dict.fromkeys(fields, "")
 
     logging.info(f"使用 {MODEL} 提取信息: {drug_name} ({search_type})")
     
     # 根據搜索類型調整提示詞
-    if search_type == "ingredient_translation":
-        prompt = f'''你是藥品資訊提取和翻譯助手。請將以下英文藥理資訊翻譯成台灣繁體中文，並從中提取：
-- 適應症（主治）
-- 用法及用量（劑量）
-- 注意事項（含禁忌）
-
-嚴格遵守以下規則：
-1. 先將英文內容翻譯成台灣繁體中文
-2. 從翻譯後的內容中提取資訊
-3. 每個欄位的回答必須少於100個字元
-4. 如果資訊不存在，在該欄位回答「資訊不足」
-5. 輸出格式為 JSON
-
-英文內容：
-{text_content[:4000]}'''
-    else:
-        prompt = f'''你是藥品資訊提取助手。從以下內容提取：
-- 適應症（主治、治療什麼疾病）
-- 用法用量（怎麼服用、一次多少劑量、一天幾次、飯前或飯後）
-- 注意事項（副作用、禁忌、注意什麼）
-
-特別注意用法用量的提取，請尋找：服用方法、劑量、頻率、時間等資訊。
-
-嚴格遵守以下規則：
-1. 以台灣繁體中文簡潔地回答。
-2. 每個欄位的回答都必須少於100個字元。
-3. 如果找不到明確的用法用量，請尋找任何劑量相關資訊。
-4. 如果資訊完全不存在，在該欄位回答「資訊不足」。
-5. 輸出格式為 JSON，使用以下格式：{{"適應症": "...", "用法用量": "...", "注意事項": "..."}}
-
-內容：
-{text_content[:4000]}'''
+    template_name = "ingredient_translation" if search_type == "ingredient_translation" else "general"
+    prompt = build_extraction_prompt(template_name, text_content, fields)
+    # 只提取部分欄位的提示詞不同，緩存鍵的模板名加上欄位
+    cache_template = template_name if len(fields) == len(FIELDS) else f"{template_name}:{'/'.join(fields)}"
+
+    # 相同模型、模板與內容的回應直接取自緩存
+    cache_key = None
+    if LLM_CACHE_ENABLED:
+        cache_key = make_llm_cache_key(MODEL, PROMPT_TEMPLATE_VERSION, cache_template, text_content[:PROMPT_CONTENT_LIMIT])
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None:
+            logging.info(f"LLM缓存命中: {drug_name} ({search_type})")
+            metrics.add('cache_hits')
+            return cached
 
     try:
-        response = ollama.generate(model=MODEL, prompt=prompt)
-        resp_text = response['response'].strip()
+        metrics.add('llm_calls')
+        if LLM_BATCH_MODE != 'off':
+            # 交由共享队列与其他药物的请求一起送出 (合并提示词无法按药物拆分token数，不计token)
+            raise_if_cancelled()
+            record_llm_call()
+            with metrics.timed('llm'):
+                resp_text = get_llm_batcher().generate(
+                    prompt, template_name, text_content[:PROMPT_CONTENT_LIMIT], drug_name, fields
+                ).strip()
+        else:
+            import ollama
+            with llm_slot(), metrics.timed('llm'):
+                response = ollama.generate(model=MODEL, prompt=prompt)
+            metrics.add('llm_tokens_in', response.get('prompt_eval_count') or 0)
+            metrics.add('llm_tokens_out', response.get('eval_count') or 0)
+            resp_text = response['response'].strip()
         
         if resp_text.startswith('{') and resp_text.endswith('}'):
             data = json.loads(resp_text)
@@ -483,26 +737,139 @@ def extract_info_with_llm(text_content: str, drug_name: str, search_type: str =
             json_match = re.search(r'```json(.*?)```', resp_text, re.DOTALL)
             if not json_match:
                 logging.error(f"LLM返回格式错误 {drug_name}: {resp_text}")
-                return {"適應症": "模型回傳格式錯誤", "用法用量": "模型回傳格式錯誤", "注意事項": "模型回傳格式錯誤"}
+                return dict.fromkeys(fields, "模型回傳格式錯誤")
 
             json_str = json_match.group(1).strip()
             data = json.loads(json_str)
         
-        for key in ["適應症", "用法用量", "注意事項"]:
-            data[key] = data.get(key, "資訊不足")[:100]
+        data = {key: data.get(key, "資訊不足")[:100] for key in fields}
+        if cache_key is not None:
+            get_llm_cache().put(cache_key, data)
         return data
     except Exception as e:
         logging.error(f"LLM提取失败 {drug_name}: {e}")
-        return {"適應症": "模型提取失敗", "用法用量": "模型提取失敗", "注意事項": "模型提取失敗"}
+        return dict.fromkeys(fields, "模型提取失敗")
+
+def has_key_info(row_data: dict) -> bool:
+    """是否具备品名、厂商、成份等关键信息"""
+    return all([row_data.get('藥品中文名稱', ''), row_data.get('製造廠名稱', ''), row_data.get('成份', '')])
+
+def process_input_row(row_data: dict, google_results_df: pd.DataFrame, cluster_results: ClusterResults = None,
+                      precomputed: tuple = None) -> tuple:
+    """处理单笔输入药物，返回 (输出行数据, 信息是否完整)；
+    提供 cluster_results 时同成份分组的药物共享一次提取结果，
+    precomputed 为流水线已算出的 (提取结果, LLM调用次数)"""
+    drug_code = row_data.get('藥品代號', '')
+    drug_name = row_data.get('藥品中文名稱', '')
+    logging.info(f"--- 处理药物: {drug_code} - {drug_name} ---")
+
+    current_row_data = dict(row_data)
+    if not has_key_info(row_data):
+        logging.warning(f"跳过 {drug_code}: 关键信息缺失")
+        for col in ['適應症', '用法用量', '注意事項']:
+            current_row_data[col] = "資訊不足 - 關鍵資訊缺失"
+        return current_row_data, False
+
+    # 使用五步法處理藥物信息
+    def run_five_steps():
+        if precomputed is not None:
+            return precomputed
+        with count_llm_calls() as llm_calls:
+            info = process_drug_with_five_steps(row_data, google_results_df)
+        return info, llm_calls[0]
+
+    if cluster_results is not None:
+        web_info, shared = cluster_results.get_or_compute(row_data, run_five_steps)
+        if shared:
+            logging.info(f"共享同成份分组的提取结果: {drug_code}")
+            web_info = apply_shared_result(row_data, google_results_df, web_info)
+    else:
+        web_info, _ = run_five_steps()
+
+    # 檢查信息是否完整
+    all_fields_complete = all(is_filled(web_info.get(col, "")) for col in FIELDS)
+
+    # 保存结果
+    for key, value in web_info.items():
+        current_row_data[key] = value
+
+    if all_fields_complete:
+        logging.info(f"成功处理: {drug_code}")
+    else:
+        logging.info(f"信息不完整: {drug_code}")
+    return current_row_data, all_fields_complete
+
+def run_pipelined(drug_rows, google_results_df: pd.DataFrame, cluster_results: ClusterResults = None):
+    """以多级流水线处理药物，结果按输入顺序产出 (输出行数据, 信息是否完整)；
+    各步骤各有队列与工作线程，欄位齊全的药物直接跳到合并"""
+    def make_stage(step):
+        def run_stage(job):
+            with count_llm_calls() as llm_calls:
+                job['status'] = run_cascade_step(step, job['row'], google_results_df, job['result'], job['status'])
+            job['llm_calls'] += llm_calls[0]
+        return run_stage
+
+    stages = [
+        (step[0], make_stage(step), PIPELINE_STAGE_WORKERS.get(step[0], 1))
+        for step in active_cascade_steps()
+    ]
+    logging.info("流水线模式: " + ", ".join(f"{name}×{workers}" for name, _, workers in stages))
+    pipeline = StagePipeline(stages, is_done=lambda job: all(job['status'].values()))
+
+    def make_job(row_data):
+        # 关键信息缺失或非分组代表的药物不进入流水线，于合并时处理
+        needs_compute = has_key_info(row_data) and (cluster_results is None or cluster_results.should_compute(row_data))
+        return {
+            'row': row_data,
+            'compute': needs_compute,
+            'result': {},
+            'status': {'適應症': False, '用法用量': False, '注意事項': False},
+            'llm_calls': 0
+        }
+
+    jobs = (make_job(row_data) for row_data in drug_rows)
+    for job in pipeline.run(jobs, skip=lambda job: not job['compute']):
+        # 合并阶段: 分组代表先于组内其他药物产出，其他药物此时即可共享结果
+        precomputed = (job['result'], job['llm_calls']) if job['compute'] else None
+        yield process_input_row(job['row'], google_results_df, cluster_results, precomputed)
+
+    logging.info("流水线各阶段处理数: " + ", ".join(f"{name}={count}" for name, count in pipeline.processed.items()))
+
+def save_batch_results(processed_drugs_batch: list, incomplete_drugs_batch: list, output_columns: list,
+                       ledger: ProgressLedger = None, stats: RunStats = None):
+    """将一个批次的结果追加到完整/不完整输出文件，并登记到进度账本与结果统计
+    (有账本时写入账本对应的输出文件，分片模式下即为该分片的部分输出)"""
+    output_csv = ledger.output_csv if ledger is not None else OUTPUT_CSV
+    incomplete_csv = ledger.incomplete_csv if ledger is not None else INCOMPLETE_OUTPUT_CSV
+    if processed_drugs_batch:
+        result_store.append_results(output_csv, processed_drugs_batch, output_columns)
+        logging.info(f"保存完整药物信息: {len(processed_drugs_batch)} 条记录 -> {output_csv}")
 
-def main():
-    """主函数"""
+    if incomplete_drugs_batch:
+        result_store.append_results(incomplete_csv, incomplete_drugs_batch, output_columns)
+        logging.info(f"保存不完整药物信息: {len(incomplete_drugs_batch)} 条记录 -> {incomplete_csv}")
+
+    if ledger is not None:
+        ledger.record_batch(
+            [row['藥品代號'] for row in processed_drugs_batch],
+            [row['藥品代號'] for row in incomplete_drugs_batch]
+        )
+
+    if stats is not None and (processed_drugs_batch or incomplete_drugs_batch):
+        stats.add_rows(processed_drugs_batch, True)
+        stats.add_rows(incomplete_drugs_batch, False)
+        stats.save()
+
+def main(workers: int = DRUG_WORKERS, shard: tuple = None):
+    """主函数 (workers: 同时处理的药物数量；shard: (分片序号, 分片数)，
+    只处理该分片的药物并写入分片自己的部分输出，见 scripts/shard_runner.py)"""
     logging.info("=" * 60)
-    logging.info("多来源药物信息提取开始")
+    logging.info("多来源药物信息提取开始" + (f" (分片 {shard[0] + 1}/{shard[1]})" if shard else ""))
     logging.info("=" * 60)
+    logging.info(f"并发药物数: {workers}")
     
     try:
-        input_df = pd.read_csv(INPUT_CSV, encoding='utf-8-sig', keep_default_na=False)
+        drug_input = DrugInput(INPUT_CSV)
     except FileNotFoundError:
         logging.error(f"输入文件不存在: {INPUT_CSV}")
         return
@@ -525,111 +892,131 @@ def main():
             logging.error(f"加载Google搜索结果失败: {e}")
             google_results_df = pd.DataFrame()
 
-    # 检查现有输出文件
-    output_columns = input_df.columns.tolist() + ['適應症', '用法用量', '注意事項']
-    
-    output_df = pd.DataFrame(columns=output_columns)
-    incomplete_df = pd.DataFrame(columns=output_columns)
-    
-    if os.path.exists(OUTPUT_CSV):
-        output_df = pd.read_csv(OUTPUT_CSV, encoding='utf-8-sig', keep_default_na=False)
-    if os.path.exists(INCOMPLETE_OUTPUT_CSV):
-        incomplete_df = pd.read_csv(INCOMPLETE_OUTPUT_CSV, encoding='utf-8-sig', keep_default_na=False)
-
-    # 确定需要处理的药物
-    all_existing_data = pd.concat([output_df, incomplete_df]).drop_duplicates(subset=['藥品代號'], keep='first')
-    processed_drug_codes = set(all_existing_data['藥品代號'].tolist())
-    drugs_to_process_df = input_df[~input_df['藥品代號'].isin(processed_drug_codes)].copy()
+    output_columns = drug_input.columns + ['適應症', '用法用量', '注意事項']
+
+    # 由进度账本确定需要处理的药物 (首次使用时由现有输出文件建立)
+    if shard is None:
+        # 由CSV改用 Parquet 后的首次运行，先将现有结果导入资料集
+        result_store.import_csv(OUTPUT_CSV)
+        result_store.import_csv(INCOMPLETE_OUTPUT_CSV)
+        ledger = ProgressLedger(OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV)
+        ledger.sync()
+        stats = RunStats()
+        processed_drug_codes = ledger.processed_codes()
+    else:
+        # 分片账本只记录本分片的部分输出，已合并到主输出的药物由主账本取得
+        ledger = ProgressLedger(*shard_paths(*shard))
+        ledger.sync()
+        stats = shard_stats(*shard)
+        main_ledger = ProgressLedger(OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV)
+        processed_drug_codes = ledger.processed_codes() | main_ledger.processed_codes()
+        main_ledger.close()
+    stats.sync()
+    pending_count = drug_input.count(exclude_codes=processed_drug_codes, shard=shard)
+    logging.info(f"已处理 {len(processed_drug_codes)} 种药物，待处理 {pending_count} 种")
 
     # 生产模式下分批处理
     if IS_DEMO:
-        limit = DEMO_LIMIT
+        limit = min(DEMO_LIMIT, pending_count)
         batch_size = DEMO_LIMIT
     else:
-        limit = len(drugs_to_process_df)
+        limit = pending_count
         batch_size = BATCH_SIZE  # 生产模式每批处理数量
     
     # 计算当前批次
     total_batches = (limit + batch_size - 1) // batch_size
     current_batch = 1
+
+    def pending_rows():
+        """逐行读取待处理药物，输入文件不整个载入内存"""
+        for record in drug_input.records(exclude_codes=processed_drug_codes, limit=limit, shard=shard):
+            yield drug_input.as_dict(record)
     
+    # 成份分组: 成份、ATC代码、剂型与含量相同的药物只执行一次提取
+    cluster_results = None
+    if DEDUP_BY_INGREDIENT:
+        cluster_results = ClusterResults()
+        for row_data in pending_rows():
+            if has_key_info(row_data):
+                cluster_results.register(row_data)
+        logging.info(f"成份分组: {limit} 种药物归为 {len(cluster_results)} 组")
+
     processed_drugs_batch = []
     incomplete_drugs_batch = []
-    
-    for batch_start in range(0, limit, batch_size):
-        batch_end = min(batch_start + batch_size, limit)
-        current_batch_df = drugs_to_process_df.iloc[batch_start:batch_end]
-        
-        logging.info(f"=== 处理批次 {current_batch}/{total_batches} ({len(current_batch_df)} 种药物) ===")
-        
-        for index, row in current_batch_df.iterrows():
-            drug_code = row.get('藥品代號', '')
-            drug_name = row.get('藥品中文名稱', '')
-            logging.info(f"--- 处理药物: {drug_code} - {drug_name} ---")
-            
-            manufacturer = row.get('製造廠名稱', '')
-            ingredient = row.get('成份', '')
-
-            if not all([drug_name, manufacturer, ingredient]):
-                logging.warning(f"跳过 {drug_code}: 关键信息缺失")
-                current_row_data = row.to_dict()
-                for col in ['適應症', '用法用量', '注意事項']:
-                    current_row_data[col] = "資訊不足 - 關鍵資訊缺失"
-                incomplete_drugs_batch.append(current_row_data)
-                continue
-
-            # 使用五步法處理藥物信息
-            web_info = process_drug_with_five_steps(row.to_dict(), google_results_df)
-            
-            # 檢查信息是否完整
-            all_fields_complete = all(web_info.get(col, "") not in ["", "資訊不足", "模型提取失敗", "模型回傳格式錯誤"] for col in ['適應症', '用法用量', '注意事項'])
-
-            # 保存结果
-            current_row_data = row.to_dict()
-            for key, value in web_info.items():
-                current_row_data[key] = value
-
-            if all_fields_complete:
-                processed_drugs_batch.append(current_row_data)
-                logging.info(f"成功处理: {drug_code}")
-            else:
-                incomplete_drugs_batch.append(current_row_data)
-                logging.info(f"信息不完整: {drug_code}")
+    drugs_done = 0
+    run_start = time.time()
+    trace_path = metrics.get_recorder().start_run()
+    logging.info(f"步骤量测追踪文件: {trace_path}")
+
+    # 药物可并发处理 (最多 workers 种同时进行)，结果按输入顺序依序归入批次，
+    # 因此每批的检查点内容与依序处理时完全一致
+    drug_rows = pending_rows()
+    if PIPELINE_MODE:
+        drug_results = run_pipelined(drug_rows, google_results_df, cluster_results)
+    else:
+        drug_results = imap_ordered(
+            lambda drug_row: process_input_row(drug_row, google_results_df, cluster_results),
+            drug_rows,
+            workers
+        )
+
+    for current_row_data, all_fields_complete in drug_results:
+        drugs_done += 1
+        if all_fields_complete:
+            processed_drugs_batch.append(current_row_data)
+        else:
+            incomplete_drugs_batch.append(current_row_data)
 
         # 每处理完一个批次就保存结果，支持接续处理
         if len(processed_drugs_batch) + len(incomplete_drugs_batch) >= batch_size:
-            # 保存当前批次结果
-            if processed_drugs_batch:
-                new_complete_df = pd.DataFrame(processed_drugs_batch, columns=output_columns)
-                new_complete_df.to_csv(OUTPUT_CSV, mode='a', header=not os.path.exists(OUTPUT_CSV), index=False, encoding='utf-8-sig')
-                logging.info(f"保存完整药物信息: {len(processed_drugs_batch)} 条记录 -> {OUTPUT_CSV}")
-            
-            if incomplete_drugs_batch:
-                new_incomplete_df = pd.DataFrame(incomplete_drugs_batch, columns=output_columns)
-                new_incomplete_df.to_csv(INCOMPLETE_OUTPUT_CSV, mode='a', header=not os.path.exists(INCOMPLETE_OUTPUT_CSV), index=False, encoding='utf-8-sig')
-                logging.info(f"保存不完整药物信息: {len(incomplete_drugs_batch)} 条记录 -> {INCOMPLETE_OUTPUT_CSV}")
-            
+            logging.info(f"=== 批次 {current_batch}/{total_batches} 处理完成 ===")
+            save_batch_results(processed_drugs_batch, incomplete_drugs_batch, output_columns, ledger, stats)
+
             # 清空当前批次数据
             processed_drugs_batch = []
             incomplete_drugs_batch = []
-            
+
             # 更新批次计数
             current_batch += 1
 
     # 保存最后一批次的结果
-    if processed_drugs_batch:
-        new_complete_df = pd.DataFrame(processed_drugs_batch, columns=output_columns)
-        new_complete_df.to_csv(OUTPUT_CSV, mode='a', header=not os.path.exists(OUTPUT_CSV), index=False, encoding='utf-8-sig')
-        logging.info(f"保存完整药物信息: {len(processed_drugs_batch)} 条记录 -> {OUTPUT_CSV}")
-    
-    if incomplete_drugs_batch:
-        new_incomplete_df = pd.DataFrame(incomplete_drugs_batch, columns=output_columns)
-        new_incomplete_df.to_csv(INCOMPLETE_OUTPUT_CSV, mode='a', header=not os.path.exists(INCOMPLETE_OUTPUT_CSV), index=False, encoding='utf-8-sig')
-        logging.info(f"保存不完整药物信息: {len(incomplete_drugs_batch)} 条记录 -> {INCOMPLETE_OUTPUT_CSV}")
+    save_batch_results(processed_drugs_batch, incomplete_drugs_batch, output_columns, ledger, stats)
+
+    elapsed_minutes = (time.time() - run_start) / 60
+    if drugs_done and elapsed_minutes > 0:
+        logging.info(f"处理 {drugs_done} 种药物，耗时 {elapsed_minutes:.1f} 分钟，吞吐量 {drugs_done / elapsed_minutes:.1f} 药物/分钟")
+
+    recorder = metrics.get_recorder()
+    recorder.close()
+    summary = recorder.summary()
+    if summary:
+        logging.info("各步骤量测汇总:\n" + metrics.format_table(summary))
+
+    if cluster_results is not None:
+        logging.info(
+            f"成份分组统计: 实际提取 {cluster_results.computed_drugs} 组, "
+            f"共享结果 {cluster_results.shared_drugs} 种药物, "
+            f"LLM调用 {cluster_results.llm_calls_made} 次, 节省 {cluster_results.llm_calls_avoided} 次"
+        )
+    if LLM_CACHE_ENABLED:
+        get_llm_cache().log_stats()
+    if PAGE_CACHE_ENABLED:
+        get_page_cache().log_stats()
+    close_extract_pool()
+    close_speculative_executor()
+    if LLM_BATCH_MODE != 'off':
+        get_llm_batcher().log_throughput()
+    ledger.close()
+
+    # Parquet 模式下CSV为导出产物 (分片模式于合并后导出)
+    if shard is None:
+        result_store.export_csv(OUTPUT_CSV)
+        result_store.export_csv(INCOMPLETE_OUTPUT_CSV)
 
     logging.info("=" * 60)
     logging.info("多来源药物信息提取完成")
     logging.info("=" * 60)
 
 if __name__ == "__main__":
+    setup_logging()
     main()
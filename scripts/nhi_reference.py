@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+NHI 参考资料表
+每次运行只建立一次NHI资料表 (原始CSV每日最多下载一次并缓存于本地)，
+预先计算正规化名称、成份、厂商栏位，并以二元字串倒排索引取代逐笔全表比对
+"""
+
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import (
+    SOURCE_URLS, REQUEST_TIMEOUT, NHI_REFERENCE_CACHE, NHI_REFERENCE_MAX_AGE
+)
+
+# 参与比对的栏位: 正规化后的名称 -> 原始栏位
+SEARCH_COLUMNS = {
+    'name': '藥品中文名稱',
+    'ingredient': '成份',
+    'manufacturer': '製造廠名稱'
+}
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def normalize_text(value) -> str:
+    """与原比对逻辑一致的正规化：转小写并去除空白"""
+    if value is None:
+        return ''
+    return str(value).lower().replace(' ', '')
+
+
+def _ngrams(text: str) -> set:
+    """二元字串集合，单字元文字则返回自身"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _build_index(values: list) -> dict:
+    """建立 二元字串 -> 列号集合 的倒排索引"""
+    index = {}
+    for row_id, value in enumerate(values):
+        for gram in _ngrams(value):
+            index.setdefault(gram, set()).add(row_id)
+        # 单字元查询也需要能命中较长的值
+        for char in set(value):
+            index.setdefault(char, set()).add(row_id)
+    return index
+
+
+def _read_nhi_csv_text() -> str:
+    """读取NHI原始CSV，本地缓存过期时才重新下载"""
+    cache_age = None
+    if os.path.exists(NHI_REFERENCE_CACHE):
+        cache_age = time.time() - os.path.getmtime(NHI_REFERENCE_CACHE)
+        if cache_age < NHI_REFERENCE_MAX_AGE:
+            logging.info(f"使用NHI本地缓存: {NHI_REFERENCE_CACHE}")
+            with open(NHI_REFERENCE_CACHE, 'r', encoding='utf-8') as f:
+                return f.read()
+
+    try:
+        response = requests.get(SOURCE_URLS["NHI_DATA_DOWNLOAD"], timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        text = response.text
+        os.makedirs(os.path.dirname(NHI_REFERENCE_CACHE), exist_ok=True)
+        tmp_path = NHI_REFERENCE_CACHE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, NHI_REFERENCE_CACHE)
+        logging.info(f"NHI资料已下载并缓存: {NHI_REFERENCE_CACHE}")
+        return text
+    except Exception as e:
+        if cache_age is not None:
+            logging.warning(f"NHI下载失败，沿用过期的本地缓存: {e}")
+            with open(NHI_REFERENCE_CACHE, 'r', encoding='utf-8') as f:
+                return f.read()
+        raise
+
+
+def build_table(nhi_df: pd.DataFrame) -> dict:
+    """由NHI DataFrame建立带正规化栏位与倒排索引的资料表"""
+    records = nhi_df.to_dict('records')
+    columns = {}
+    indexes = {}
+    for key, column in SEARCH_COLUMNS.items():
+        if column in nhi_df.columns:
+            values = [normalize_text(v) for v in nhi_df[column].fillna('').tolist()]
+        else:
+            values = [''] * len(records)
+        columns[key] = values
+        indexes[key] = _build_index(values)
+    return {'records': records, 'columns': columns, 'indexes': indexes}
+
+
+def load_table(force: bool = False):
+    """每次运行只建立一次NHI资料表，失败时返回 None"""
+    global _table
+    if _table is not None and not force:
+        return _table
+    with _table_lock:
+        if _table is None or force:
+            try:
+                text = _read_nhi_csv_text()
+                nhi_df = pd.read_csv(io.StringIO(text), encoding='utf-8', on_bad_lines='skip')
+                _table = build_table(nhi_df)
+                logging.info(f"NHI资料表已建立: {len(_table['records'])} 笔")
+            except Exception as e:
+                logging.error(f"NHI资料表建立失败: {e}")
+                return None
+    return _table
+
+
+def _match_column(table: dict, key: str, query: str) -> set:
+    """返回该栏位包含查询字串的列号集合"""
+    values = table['columns'][key]
+    if not query:
+        # 与 str.contains('') 一致：空查询命中所有列
+        return set(range(len(values)))
+
+    postings = []
+    for gram in _ngrams(query):
+        rows = table['indexes'][key].get(gram)
+        if not rows:
+            return set()
+        postings.append(rows)
+    postings.sort(key=len)
+    candidates = set(postings[0]).intersection(*postings[1:])
+    return {row_id for row_id in candidates if query in values[row_id]}
+
+
+def search(table: dict, drug_name: str, manufacturer: str, ingredient: str) -> list:
+    """名称、成份或厂商任一相符的NHI记录 (依原始顺序)"""
+    matched = (
+        _match_column(table, 'name', normalize_text(drug_name))
+        | _match_column(table, 'ingredient', normalize_text(ingredient))
+        | _match_column(table, 'manufacturer', normalize_text(manufacturer))
+    )
+    return [table['records'][row_id] for row_id in sorted(matched)]
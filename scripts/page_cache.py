@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+网页响应缓存
+以 URL 为键，将搜索步骤下载的网页以 zlib 压缩存于 SQLite，连同 ETag/Last-Modified；
+TTL 内直接使用缓存，过期后以条件请求重新验证 (304 时沿用缓存内容)，
+按最近使用时间淘汰以限制总大小，重跑、接续批次与相邻药物不会重复下载未变更的网页
+
+同一数据库另存提取后的正文，以 (URL, 网页内容哈希, 提取器版本) 为键，
+再次查询相同内容的网页时无需重新解析 HTML；两类条目共用容量上限与淘汰顺序
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import PAGE_CACHE_DB, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_TTL
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    validated_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access);
+CREATE TABLE IF NOT EXISTS texts (
+    key TEXT PRIMARY KEY,
+    text BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_texts_last_access ON texts(last_access);
+-- 两表的总大小由触发器在写入的同一事务中维护，多个进程共用数据库时也一致
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size (id, bytes)
+    SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM pages) + (SELECT COALESCE(SUM(size), 0) FROM texts);
+CREATE TRIGGER IF NOT EXISTS pages_size_insert AFTER INSERT ON pages BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS pages_size_update AFTER UPDATE OF size ON pages BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS pages_size_delete AFTER DELETE ON pages BEGIN
+    UPDATE cache_size SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS texts_size_insert AFTER INSERT ON texts BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS texts_size_update AFTER UPDATE OF size ON texts BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS texts_size_delete AFTER DELETE ON texts BEGIN
+    UPDATE cache_size SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+
+# 本进程已执行过 SCHEMA 的数据库路径
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def make_text_key(url: str, html: str, extractor_version: str) -> str:
+    """正文缓存键: URL、网页内容哈希与提取器版本的 SHA-256"""
+    content_hash = hashlib.sha256(html.encode('utf-8', errors='replace')).hexdigest()
+    payload = json.dumps([url, content_hash, extractor_version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CachedPage(namedtuple('CachedPage', 'url body encoding etag last_modified fresh')):
+    """缓存的网页；body 为解压后的原始字节，fresh 表示仍在 TTL 内 (否则须先重新验证)"""
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.encoding or 'utf-8', errors='replace')
+
+    def conditional_headers(self) -> dict:
+        """重新验证用的条件请求头 (无验证信息时为空，即完整下载)"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def is_cacheable(headers) -> bool:
+    """响应头要求不保存 (Cache-Control: no-store) 时不缓存"""
+    return 'no-store' not in (headers.get('Cache-Control') or '').lower()
+
+
+class PageCache:
+    """容量受限、按最近使用淘汰的网页缓存 (线程安全，可多进程共享同一数据库)"""
+
+    def __init__(self, db_path: str = PAGE_CACHE_DB, max_bytes: int = PAGE_CACHE_MAX_BYTES,
+                 ttl: float = PAGE_CACHE_TTL):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.text_hits = 0
+        self.text_misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 建表与总大小初始化 (含全表 SUM 的写事务) 每个进程每个数据库只执行一次，新线程的连接不再重复
+            with _schema_lock:
+                if self.db_path not in _schema_ready:
+                    conn.executescript(SCHEMA)
+                    _schema_ready.add(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def get(self, url: str):
+        """返回缓存的网页 (可能已过期，见 CachedPage.fresh)，无缓存时返回 None"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT body, encoding, etag, last_modified, validated_at FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with conn:
+            conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+        body, encoding, etag, last_modified, validated_at = row
+        fresh = time.time() - validated_at < self.ttl
+        if fresh:
+            with self._lock:
+                self.hits += 1
+        return CachedPage(url, zlib.decompress(body), encoding, etag, last_modified, fresh)
+
+    def mark_revalidated(self, url: str, etag: str = None, last_modified: str = None):
+        """服务器返回 304：内容未变更，重新计算 TTL (并更新服务器给出的新验证信息)"""
+        conn = self._connect()
+        with self._lock:
+            self.revalidated += 1
+            with conn:
+                conn.execute(
+                    "UPDATE pages SET validated_at = ?, etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (time.time(), etag, last_modified, url)
+                )
+
+    def put(self, url: str, body: bytes, encoding: str = None, etag: str = None, last_modified: str = None):
+        """保存 200 响应的内容，超出容量时淘汰最久未使用的网页"""
+        data = zlib.compress(body)
+        size = len(data)
+        now = time.time()
+        conn = self._connect()
+        with self._lock:
+            with conn:
+                conn.execute(
+                    "INSERT INTO pages "
+                    "(url, body, encoding, etag, last_modified, size, validated_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(url) DO UPDATE SET body = excluded.body, encoding = excluded.encoding, "
+                    "etag = excluded.etag, last_modified = excluded.last_modified, size = excluded.size, "
+                    "validated_at = excluded.validated_at, last_access = excluded.last_access",
+                    (url, data, encoding, etag, last_modified, size, now, now)
+                )
+                self._evict_if_full(conn)
+
+    def get_text(self, key: str):
+        """命中时返回缓存的正文，否则返回 None"""
+        conn = self._connect()
+        row = conn.execute("SELECT text FROM texts WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.text_misses += 1
+                return None
+            self.text_hits += 1
+        with conn:
+            conn.execute("UPDATE texts SET last_access = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put_text(self, key: str, text: str):
+        """保存提取后的正文 (键由 make_text_key 生成)"""
+        data = zlib.compress(text.encode('utf-8'))
+        size = len(data)
+        conn = self._connect()
+        with self._lock:
+            with conn:
+                conn.execute(
+                    "INSERT INTO texts (key, text, size, last_access) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET text = excluded.text, size = excluded.size, "
+                    "last_access = excluded.last_access",
+                    (key, data, size, time.time())
+                )
+                self._evict_if_full(conn)
+
+    @staticmethod
+    def _total_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def _evict_if_full(self, conn: sqlite3.Connection):
+        # 写入后在同一事务中读取总大小 (此时已持有写锁，其他进程的写入不会穿插)；
+        # 超出上限时淘汰至容量上限的 90%，避免每次写入都触发淘汰；网页与正文按同一最近使用顺序
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for table, key, size, _ in conn.execute(
+            "SELECT 'pages', url, size, last_access FROM pages "
+            "UNION ALL SELECT 'texts', key, size, last_access FROM texts ORDER BY last_access"
+        ).fetchall():
+            if total <= target:
+                break
+            conn.execute(f"DELETE FROM {table} WHERE {'url' if table == 'pages' else 'key'} = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """命中/重新验证/未命中统计 (过期后重新下载的网页不计入命中)"""
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'text_hits': self.text_hits,
+            'text_misses': self.text_misses,
+            'evictions': self.evictions,
+            'bytes': self._total_bytes(self._connect())
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(
+            f"网页缓存统计: 命中 {stats['hits']} 次, 304重新验证 {stats['revalidated']} 次, "
+            f"未命中 {stats['misses']} 次, 正文命中 {stats['text_hits']} 次, "
+            f"正文未命中 {stats['text_misses']} 次, 淘汰 {stats['evictions']} 条, "
+            f"占用 {stats['bytes'] / 1024 / 1024:.1f} MB"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> PageCache:
+    """取得全进程共享的网页缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PageCache()
+    return _cache
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+提示词段落排序
+将各来源正文切分为句子段落，以 BM25 对适应症/用法用量/注意事项相关词 (中英文) 与药品名评分，
+按分数挑选段落装入提示词字数预算，再按来源与原文顺序输出；
+导航、页脚等不含相关词的段落不再占用提示词
+"""
+
+import math
+import re
+
+# 各栏位评分用的查询词 (中文以二字组、英文以单词比对)
+FIELD_TERMS = {
+    '適應症': ('適應症', '治療', '用於', 'indication', 'indicated', 'treatment'),
+    '用法用量': (
+        '用法', '用量', '劑量', '每日', '每次', '口服', '服用', '毫克',
+        'dosage', 'dose', 'daily', 'mg', 'administration'
+    ),
+    '注意事項': (
+        '注意事項', '副作用', '禁忌', '禁用', '警語', '不良反應', '慎用',
+        'contraindication', 'contraindicated', 'warning', 'precaution', 'side', 'effects', 'adverse'
+    ),
+}
+BM25_K1 = 1.5
+BM25_B = 0.75
+# 每个来源参与排序的字符上限，避免超长页面耗用过多CPU
+SOURCE_SCAN_CHARS = 20000
+# 过短的段落 (如按钮、单个链接文字) 不参与排序
+MIN_PASSAGE_CHARS = 8
+# 超过此长度的句子再按字数切开
+MAX_PASSAGE_CHARS = 300
+
+_SPLIT_PATTERN = re.compile(r'(?<=[。！？；!?;])\s*|\n+|(?<=\.)\s+')
+_TOKEN_PATTERN = re.compile(r'[a-z]+|[0-9]+|[㐀-鿿]+')
+
+
+def tokenize(text: str) -> list:
+    """英文单词与数字分开 (500mg 为 500 与 mg)，中文按相邻二字组 (单字词保留单字)"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def split_passages(text: str) -> list:
+    """按句末标点与换行切分，过长的句子按 MAX_PASSAGE_CHARS 切开"""
+    passages = []
+    for sentence in _SPLIT_PATTERN.split(text):
+        sentence = ' '.join(sentence.split())
+        for start in range(0, len(sentence), MAX_PASSAGE_CHARS):
+            passages.append(sentence[start:start + MAX_PASSAGE_CHARS])
+    return [passage for passage in passages if len(passage) >= MIN_PASSAGE_CHARS]
+
+
+def bm25_scores(passages: list, query_tokens: set) -> list:
+    """以段落集合本身计算 IDF 的 BM25 分数"""
+    documents = [tokenize(passage) for passage in passages]
+    if not documents:
+        return []
+    average_length = sum(len(document) for document in documents) / len(documents) or 1
+    document_frequency = {}
+    for document in documents:
+        for token in query_tokens.intersection(document):
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+    idf = {
+        token: math.log(1 + (len(documents) - count + 0.5) / (count + 0.5))
+        for token, count in document_frequency.items()
+    }
+
+    scores = []
+    for document in documents:
+        counts = {}
+        for token in document:
+            if token in idf:
+                counts[token] = counts.get(token, 0) + 1
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(document) / average_length)
+        scores.append(sum(
+            idf[token] * count * (BM25_K1 + 1) / (count + norm) for token, count in counts.items()
+        ))
+    return scores
+
+
+def pack_passages(sources: list, budget: int, names: tuple = (), fields: list = None) -> str:
+    """sources 为 [(序号, url, 正文)]；按分数挑选段落直到 budget 字 (含来源标题)，
+    fields 为要提取的栏位 (None 为全部，只用这些栏位的查询词)；
+    重复的段落只保留一次；没有任何段落含查询词时返回空字符串 (由调用方改用原始截断)"""
+    terms = [term for field in (fields or FIELD_TERMS) for term in FIELD_TERMS[field]]
+    query_tokens = set()
+    for term in terms + [name for name in names if name]:
+        query_tokens.update(tokenize(term))
+
+    passages = []
+    seen = set()
+    for index, url, text in sources:
+        for passage in split_passages(text[:SOURCE_SCAN_CHARS]):
+            if passage not in seen:
+                seen.add(passage)
+                passages.append((index, url, passage))
+
+    scores = bm25_scores([passage for _, _, passage in passages], query_tokens)
+    chosen = set()
+    opened_sources = set()
+    used = 0
+    for position in sorted(range(len(passages)), key=lambda k: -scores[k]):
+        if scores[position] <= 0:
+            break
+        index, url, passage = passages[position]
+        cost = len(passage) + 1
+        if index not in opened_sources:
+            cost += len(_source_header(index, url)) + 1
+        if used + cost > budget:
+            continue
+        chosen.add(position)
+        opened_sources.add(index)
+        used += cost
+
+    sections = {}
+    for position in sorted(chosen):
+        index, url, passage = passages[position]
+        sections.setdefault((index, url), []).append(passage)
+    return "".join(
+        f"{_source_header(index, url)}{' '.join(texts)}\n\n" for (index, url), texts in sorted(sections.items())
+    )
+
+
+def _source_header(index: int, url: str) -> str:
+    return f"--- 來源 {index + 1}: {url} ---\n"
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+处理进度账本
+以 SQLite 记录 药品代号 → 状态 → 时间，每次检查点写入，
+接续处理时只需读取药品代号，无需重新解析不断增长的输出CSV
+"""
+
+import logging
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import PROGRESS_LEDGER_DB
+from scripts import result_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    drug_code TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+STATUS_COMPLETE = 'complete'
+STATUS_INCOMPLETE = 'incomplete'
+
+
+class ProgressLedger:
+    """药物处理进度账本，与完整/不完整输出CSV保持同步"""
+
+    def __init__(self, output_csv: str, incomplete_csv: str, db_path: str = PROGRESS_LEDGER_DB):
+        self.output_csv = output_csv
+        self.incomplete_csv = incomplete_csv
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _output_signature(self) -> str:
+        """输出文件大小与修改时间，用于判断CSV是否在账本之外被修改或删除"""
+        return result_store.output_signature(self.output_csv, self.incomplete_csv)
+
+    def _recorded_signature(self) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'output_signature'").fetchone()
+        return row[0] if row else None
+
+    def sync(self):
+        """账本与输出文件不一致时 (首次使用、中断于写入之间或手动清除输出)，由输出重建 (只读取药品代号栏)"""
+        if self._recorded_signature() == self._output_signature():
+            return
+        logging.info("进度账本与输出文件不一致，由输出重建")
+        with self._conn:
+            self._conn.execute("DELETE FROM progress")
+            # 与旧逻辑相同：同时出现在两个文件时以完整结果为准
+            for path, status in ((self.incomplete_csv, STATUS_INCOMPLETE), (self.output_csv, STATUS_COMPLETE)):
+                if result_store.exists(path):
+                    self._write(result_store.read_codes(path), status)
+            self._save_signature()
+        logging.info(f"进度账本重建完成: {self.count()} 种药物")
+
+    def _write(self, drug_codes, status: str):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO progress (drug_code, status, updated_at) VALUES (?, ?, ?)",
+            ((str(code), status, now) for code in drug_codes)
+        )
+
+    def _save_signature(self):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('output_signature', ?)",
+            (self._output_signature(),)
+        )
+
+    def record_batch(self, complete_codes, incomplete_codes):
+        """在批次结果写入CSV后调用，登记该批次药物的状态"""
+        with self._conn:
+            self._write(incomplete_codes, STATUS_INCOMPLETE)
+            self._write(complete_codes, STATUS_COMPLETE)
+            self._save_signature()
+
+    def is_processed(self, drug_code) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM progress WHERE drug_code = ?", (str(drug_code),)
+        ).fetchone() is not None
+
+    def processed_codes(self) -> set:
+        """所有已处理的药品代号 (仅代号，不含输出内容)"""
+        return {row[0] for row in self._conn.execute("SELECT drug_code FROM progress")}
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM progress").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -4,125 +4,183 @@ import os
 import re
 import time
 import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, List, Optional
-from qwen_agent.agents import Assistant
-from qwen_agent.llm.schema import Message
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import OLLAMA_HOST, OLLAMA_MODEL
+from scripts.drug_input import DrugInput
+from scripts.summary_parser import parse_google_summary
 
 # --- Configuration ---
 INPUT_CSV = "data/sample_drugs.csv"
 OUTPUT_CSV = "output/google_search_results.csv"
 LOG_FILE = "logs/qwen_agent.log"
 ERROR_LOG_FILE = "logs/qwen_agent_errors.log"
-CACHE_FILE = "output/qwen_agent_cache.json"
+CACHE_FILE = "output/qwen_agent_cache.jsonl"
+LEGACY_CACHE_FILE = "output/qwen_agent_cache.json"
+# 日誌行數超過有效條目數的此倍數時壓縮
+CACHE_COMPACT_RATIO = 2
+# 同時送往 Ollama 的搜尋請求數 (建議與 OLLAMA_NUM_PARALLEL 一致，1 為逐筆處理)
+LLM_PARALLELISM = 4
 
-# --- Setup Logging ---
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-os.makedirs(os.path.dirname(ERROR_LOG_FILE), exist_ok=True)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8'),
-        logging.FileHandler(ERROR_LOG_FILE, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def load_cache() -> Dict[str, Dict]:
-    """載入處理緩存"""
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load cache: {e}")
-    return {}
+# --- Setup Logging ---
+def setup_logging():
+    """直接執行本腳本時的日誌配置 (由主流程調用時沿用其配置)"""
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(ERROR_LOG_FILE), exist_ok=True)
+
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8'),
+            logging.FileHandler(ERROR_LOG_FILE, mode='a', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+class LogCache:
+    """僅追加的 JSON Lines 處理緩存：每次寫入追加一行，記憶體中只保留鍵到檔案位移的索引"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._scan()
+        self._writer = open(path, 'ab')
+        self._reader = open(path, 'rb')
+
+    def _scan(self):
+        """逐行掃描日誌建立索引，後寫入的同鍵條目覆蓋先前的"""
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb+') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 只有最後一行會缺少換行：寫入中途中斷留下的殘行，截斷後繼續追加
+                    logger.warning(f"Truncating incomplete cache entry at offset {offset}")
+                    f.truncate(offset)
+                    break
+                try:
+                    key = json.loads(line)['key']
+                except (ValueError, KeyError, TypeError):
+                    # 中間的損壞行略過，不影響其後的有效條目 (壓縮時移除)
+                    logger.warning(f"Skipping damaged cache entry at offset {offset}")
+                else:
+                    self._offsets[key] = offset
+                self._lines += 1
+                offset += len(line)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, key: str) -> Dict:
+        offset = self._offsets[key]
+        with self._lock:
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line)['value']
 
-def save_cache(cache: Dict[str, Dict]):
-    """保存處理緩存"""
+    def __setitem__(self, key: str, value: Dict):
+        line = json.dumps({'key': key, 'value': value}, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            self._writer.seek(0, os.SEEK_END)
+            offset = self._writer.tell()
+            self._writer.write(line)
+            self._writer.flush()
+            self._offsets[key] = offset
+            self._lines += 1
+
+    def keys(self):
+        return self._offsets.keys()
+
+    def compact(self):
+        """只保留每個鍵的最新條目，寫入暫存檔後原子替換"""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            offsets = {}
+            with open(tmp_path, 'wb') as out:
+                for key, offset in self._offsets.items():
+                    self._reader.seek(offset)
+                    offsets[key] = out.tell()
+                    out.write(self._reader.readline())
+                out.flush()
+                os.fsync(out.fileno())
+            self._writer.close()
+            self._reader.close()
+            os.replace(tmp_path, self.path)
+            self._offsets = offsets
+            self._lines = len(offsets)
+            self._writer = open(self.path, 'ab')
+            self._reader = open(self.path, 'rb')
+
+    def flush(self):
+        """將已寫入的條目落盤，過期條目過多時壓縮"""
+        with self._lock:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+        if self._lines > CACHE_COMPACT_RATIO * max(len(self._offsets), 1):
+            logger.info(f"Compacting cache: {self._lines} lines -> {len(self._offsets)} entries")
+            self.compact()
+
+def migrate_legacy_cache(cache: LogCache):
+    """將舊版 JSON 緩存中日誌尚未包含的條目追加到日誌；全部寫入並落盤後才將舊檔改名為 .migrated，
+    中途失敗時舊檔保留，下次執行繼續轉換"""
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
+        with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        migrated = 0
+        for key, value in legacy.items():
+            if key not in cache:
+                cache[key] = value
+                migrated += 1
+        cache.flush()
+        os.replace(LEGACY_CACHE_FILE, LEGACY_CACHE_FILE + '.migrated')
+        logger.info(f"Migrated {migrated} entries from {LEGACY_CACHE_FILE}")
     except Exception as e:
-        logger.error(f"Failed to save cache: {e}")
+        logger.warning(f"Failed to migrate legacy cache: {e}")
 
-def parse_google_summary(summary_text: str) -> Dict[str, str]:
-    """從 Google 搜尋的 AI 摘要中解析出我們需要的資訊"""
-    info = {"適應症": "", "用法用量": "", "注意事項": ""}
-    
-    if not summary_text or summary_text.strip() == "":
-        return info
-
-    # 多種解析策略
-    patterns = [
-        # 策略1: Markdown格式 (## 1. 適應症（Indications）)
-        (r'##\s*\d+\.\s*(適應症|用法用量|注意事項)[^\n]*\n(.*?)(?=\n##|\Z)', re.DOTALL),
-        # 策略2: Markdown格式 (### **標題**)
-        (r'### \*\*(.*?)\*\*\n(.*?)(?=\n###|\Z)', re.DOTALL),
-        # 策略3: 簡單標題格式
-        (r'(適應症|用法用量|注意事項)[:：]?\s*(.*?)(?=\n|$)', re.IGNORECASE),
-        # 策略4: 中文標題
-        (r'(【(適應症|用法用量|注意事項)】)\s*(.*?)(?=\n【|$)', re.DOTALL),
-        # 策略5: 數字標題格式 (1. 適應症)
-        (r'(\d+\.\s*(適應症|用法用量|注意事項))\s*(.*?)(?=\n\d+\.|$)', re.IGNORECASE | re.DOTALL),
-        # 策略6: 冒號分隔格式
-        (r'(適應症|用法用量|注意事項)\s*[:：]\s*(.*?)(?=\n|$)', re.IGNORECASE)
-    ]
-    
-    for pattern, flags in patterns:
-        try:
-            matches = re.findall(pattern, summary_text, flags)
-            for match in matches:
-                if len(match) == 2:
-                    title, content = match
-                elif len(match) == 3:
-                    _, title, content = match
-                elif len(match) == 4:
-                    _, _, title, content = match
-                else:
-                    continue
-                
-                title = title.strip().lower()
-                content = content.strip().replace('\n', ' ')
-                
-                if '適應症' in title or 'indication' in title or 'indications' in title:
-                    info['適應症'] = content[:200] if content else "資訊不足"
-                elif '用法用量' in title or 'dosage' in title or '劑量' in title or 'administration' in title:
-                    info['用法用量'] = content[:200] if content else "資訊不足"
-                elif '注意事項' in title or 'precaution' in title or 'warning' in title or 'precautions' in title:
-                    info['注意事項'] = content[:200] if content else "資訊不足"
-                    
-        except Exception as e:
-            logger.debug(f"Pattern {pattern} failed: {e}")
-            continue
-    
-    # 如果所有欄位都為空，嘗試直接提取關鍵信息
-    if all(not value for value in info.values()):
-        direct_patterns = {
-            "適應症": r'(用於|治療|適用於)[^。]*?[。\n]',
-            "用法用量": r'(每次|每日|劑量)[^。]*?[。\n]',
-            "注意事項": r'(禁忌|注意|警告)[^。]*?[。\n]'
-        }
-        
-        for key, pattern in direct_patterns.items():
-            matches = re.findall(pattern, summary_text, re.IGNORECASE)
-            if matches:
-                info[key] = matches[0][:200]
+def load_cache() -> LogCache:
+    """載入處理緩存（存在舊版 JSON 緩存時自動轉換）"""
+    cache = LogCache(CACHE_FILE)
+    if os.path.exists(LEGACY_CACHE_FILE):
+        migrate_legacy_cache(cache)
+    logger.info(f"Loaded cache index: {len(cache)} entries")
+    return cache
 
-    return info
+def save_cache(cache: LogCache):
+    """保存處理緩存（條目已逐筆追加，此處僅落盤與必要時壓縮）"""
+    try:
+        cache.flush()
+    except Exception as e:
+        logger.error(f"Failed to save cache: {e}")
 
 def initialize_qwen_agent() -> Optional[object]:
     """初始化 Qwen LLM（直接使用LLM避免Assistant的bug）"""
+    # qwen_agent 只在本階段執行時導入，未安裝時 ImportError 交由調用方提示安裝
+    from qwen_agent.llm import get_chat_model
+
     try:
-        from qwen_agent.llm import get_chat_model
-        
         # 使用本地Ollama模型 - 使用Ollama原生API端點
         llm_config = {
-            'model': 'gpt-oss:20b',  # 直接使用模型名稱
-            'model_server': 'http://localhost:11434',  # Ollama默认端口
-            'api_base': 'http://localhost:11434/v1',  # 使用Ollama的OpenAI兼容端點
+            'model': OLLAMA_MODEL,  # 直接使用模型名稱
+            'model_server': OLLAMA_HOST,  # Ollama默认端口，可用 OLLAMA_HOST 指向桩服务器
+            'api_base': f"{OLLAMA_HOST}/v1",  # 使用Ollama的OpenAI兼容端點
             'api_type': 'open_ai',  # 使用open_ai API類型
             'generate_cfg': {'temperature': 0.1}
         }
@@ -255,6 +313,49 @@ def search_with_retry(llm: object, search_query: str, max_retries: int = 3) -> O
     
     return None
 
+def process_drug(llm: object, drug_code: str, drug_name: str) -> tuple:
+    """搜尋並解析單一藥物，返回 (結果, 是否成功)"""
+    logger.info(f"Processing: {drug_code} - {drug_name}")
+
+    # 構建搜尋查詢
+    search_query = f"{drug_name} 適應症 用法用量 注意事項 台灣"
+
+    try:
+        # 使用 Qwen LLM 進行搜尋
+        search_result_text = search_with_retry(llm, search_query)
+        
+        if not search_result_text:
+            raise Exception("Search returned no results")
+
+        logger.info(f"Received search results for {drug_name}")
+
+        # 解析搜尋結果
+        extracted_info = parse_google_summary(search_result_text)
+
+        # 構建結果
+        result = {
+            "藥品代號": drug_code,
+            "藥品中文名稱": drug_name,
+            "適應症": extracted_info["適應症"] or "資訊不足",
+            "用法用量": extracted_info["用法用量"] or "資訊不足",
+            "注意事項": extracted_info["注意事項"] or "資訊不足",
+        }
+        logger.info(f"Successfully processed {drug_name}")
+        return result, True
+
+    except Exception as e:
+        logger.error(f"Failed to process {drug_name} with error: {e}")
+        
+        # 錯誤結果
+        error_result = {
+            "藥品代號": drug_code,
+            "藥品中文名稱": drug_name,
+            "適應症": "搜尋失敗",
+            "用法用量": "搜尋失敗",
+            "注意事項": "搜尋失敗",
+        }
+        return error_result, False
+
 def main():
     """主函數：使用 Qwen-Agent 進行 Google 搜尋和資訊提取"""
     logger.info("Starting Qwen-Agent Google search integration")
@@ -269,7 +370,7 @@ def main():
 
     # 讀取輸入文件
     try:
-        input_df = pd.read_csv(INPUT_CSV, encoding='utf-8-sig', keep_default_na=False)
+        drug_input = DrugInput(INPUT_CSV)
         logger.info(f"Successfully read input file: {INPUT_CSV}")
     except FileNotFoundError:
         logger.error(f"Input file not found: {INPUT_CSV}")
@@ -278,17 +379,19 @@ def main():
         logger.error(f"Error reading input file: {e}")
         return
 
-    if '藥品中文名稱' not in input_df.columns:
+    if '藥品中文名稱' not in drug_input.columns:
         logger.error(f"Input file {INPUT_CSV} must contain a '藥品中文名稱' column.")
         return
 
     results = []
     processed_count = 0
+    pending = []
+    started_at = time.time()
 
-    # 迭代處理每一種藥物
-    for index, row in input_df.iterrows():
-        drug_name = row['藥品中文名稱']
-        drug_code = row.get('藥品代號', 'N/A')
+    # 先以緩存填入結果，未命中的藥物留待並行搜尋
+    for record in drug_input:
+        drug_name = record.藥品中文名稱
+        drug_code = getattr(record, '藥品代號', 'N/A')
         
         # 檢查緩存
         cache_key = f"{drug_code}_{drug_name}"
@@ -297,58 +400,28 @@ def main():
             results.append(cache[cache_key])
             continue
 
-        logger.info(f"Processing: {drug_code} - {drug_name}")
-
-        # 構建搜尋查詢
-        search_query = f"{drug_name} 適應症 用法用量 注意事項 台灣"
-
-        try:
-            # 使用 Qwen LLM 進行搜尋
-            search_result_text = search_with_retry(agent, search_query)
-            
-            if not search_result_text:
-                raise Exception("Search returned no results")
-
-            logger.info(f"Received search results for {drug_name}")
-
-            # 解析搜尋結果
-            extracted_info = parse_google_summary(search_result_text)
+        results.append(None)
+        pending.append((len(results) - 1, cache_key, drug_code, drug_name))
 
-            # 構建結果
-            result = {
-                "藥品代號": drug_code,
-                "藥品中文名稱": drug_name,
-                "適應症": extracted_info["適應症"] or "資訊不足",
-                "用法用量": extracted_info["用法用量"] or "資訊不足",
-                "注意事項": extracted_info["注意事項"] or "資訊不足",
-            }
-
-            # 保存到緩存
+    # 多種藥物的搜尋請求同時送出，讓 Ollama 的並行槽位保持忙碌；結果按輸入順序寫回
+    with ThreadPoolExecutor(max_workers=max(1, LLM_PARALLELISM)) as executor:
+        outcomes = executor.map(lambda item: process_drug(agent, item[2], item[3]), pending)
+        for (position, cache_key, drug_code, drug_name), (result, succeeded) in zip(pending, outcomes):
             cache[cache_key] = result
-            results.append(result)
-            
+            results[position] = result
+            if not succeeded:
+                continue
+
             processed_count += 1
-            logger.info(f"Successfully processed {drug_name}")
             
             # 每處理10個藥物保存一次緩存
             if processed_count % 10 == 0:
                 save_cache(cache)
                 logger.info(f"Checkpoint: Processed {processed_count} drugs")
 
-        except Exception as e:
-            logger.error(f"Failed to process {drug_name} with error: {e}")
-            
-            # 錯誤結果
-            error_result = {
-                "藥品代號": drug_code,
-                "藥品中文名稱": drug_name,
-                "適應症": "搜尋失敗",
-                "用法用量": "搜尋失敗",
-                "注意事項": "搜尋失敗",
-            }
-            
-            cache[cache_key] = error_result
-            results.append(error_result)
+    elapsed_minutes = (time.time() - started_at) / 60
+    if pending and elapsed_minutes > 0:
+        logger.info(f"Throughput: {len(pending)} drugs in {elapsed_minutes:.1f} min ({len(pending) / elapsed_minutes:.1f} drugs/min)")
 
     # 將所有結果保存到 CSV 文件
     if results:
@@ -356,7 +429,7 @@ def main():
         
         # 讀取原始數據來合併完整資訊
         try:
-            original_df = pd.read_csv(INPUT_CSV, encoding='utf-8-sig', keep_default_na=False)
+            original_df = pd.read_csv(INPUT_CSV, encoding='utf-8-sig', keep_default_na=False, dtype={'藥品代號': str})
             
             # 合併結果：以藥品代號為鍵，將Qwen-Agent結果合併到原始數據
             merged_df = original_df.merge(
@@ -415,7 +488,5 @@ def main():
     logger.info("Qwen-Agent integration process completed")
 
 if __name__ == "__main__":
-    # 確保日誌目錄存在
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    
+    setup_logging()
     main()
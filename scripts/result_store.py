@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+提取结果存储
+OUTPUT_FORMAT = 'csv' 时结果直接追加到CSV；'parquet' 时每个批次写成资料集目录中的一个
+Parquet 文件 (单一 row group)，CSV 改由 export_csv() 从资料集导出；
+由CSV改用 Parquet 时，首次运行以 import_csv() 将现有CSV的行导入资料集。
+接续处理、汇总计数与下游查询可只读取所需栏位，并以 filters 做谓词下推
+
+各函数都以CSV路径 (如 OUTPUT_CSV) 指称一份结果，Parquet 资料集位于同名的 .parquet 目录
+"""
+
+import glob
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import OUTPUT_FORMAT
+
+# pandas 只在读写结果时导入；pyarrow 只在 Parquet 模式下导入，
+# 计算签名与检查是否存在 (查看统计时) 不需载入这两者
+HAS_PYARROW = False
+if OUTPUT_FORMAT == 'parquet':
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        HAS_PYARROW = True
+    except ImportError:
+        pass
+
+CODE_COLUMN = '藥品代號'
+
+
+def use_parquet() -> bool:
+    """是否以 Parquet 为主存储 (未安装 pyarrow 时退回CSV)"""
+    return OUTPUT_FORMAT == 'parquet' and HAS_PYARROW
+
+
+if OUTPUT_FORMAT == 'parquet' and not HAS_PYARROW:
+    logging.warning("未安装 pyarrow，结果改以CSV保存，请运行: uv pip install pyarrow")
+
+
+def parquet_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def _batch_files(csv_path: str) -> list:
+    # 文件名以写入时间开头，排序即为追加顺序
+    return sorted(glob.glob(os.path.join(parquet_path(csv_path), '*.parquet')))
+
+
+def _to_text(value) -> str:
+    return '' if value is None or (isinstance(value, float) and value != value) else str(value)
+
+
+def append_results(csv_path: str, rows: list, columns: list):
+    """追加一个批次的结果行 (字典列表)"""
+    if not rows:
+        return
+    if not use_parquet():
+        import pandas as pd
+
+        batch_df = pd.DataFrame(rows, columns=columns)
+        batch_df.to_csv(csv_path, mode='a', header=not os.path.exists(csv_path), index=False, encoding='utf-8-sig')
+        return
+
+    # 所有栏位以字符串保存，与CSV读取 (dtype=str) 的结果一致
+    table = pa.table({
+        column: pa.array([_to_text(row.get(column)) for row in rows], type=pa.string())
+        for column in columns
+    })
+    directory = parquet_path(csv_path)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.time_ns():020d}-{os.getpid()}.parquet"
+    # 先写临时文件再改名，中断时不会留下不完整的 Parquet 文件
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def exists(csv_path: str) -> bool:
+    if use_parquet():
+        return bool(_batch_files(csv_path))
+    return os.path.exists(csv_path)
+
+
+def signature(csv_path: str) -> str:
+    """结果的大小与修改时间签名，用于判断进度账本是否与输出一致
+    (含修改时间，大小不变的修改如更正等长的栏位值也能发现)"""
+    if use_parquet():
+        stats = [os.stat(path) for path in _batch_files(csv_path)]
+        return (
+            f"parquet:{len(stats)}:{sum(stat.st_size for stat in stats)}:"
+            f"{max((stat.st_mtime_ns for stat in stats), default=0)}"
+        )
+    if not os.path.exists(csv_path):
+        return '0'
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def output_signature(output_csv: str, incomplete_csv: str) -> str:
+    """完整与不完整输出的合并签名"""
+    return f"{signature(output_csv)}:{signature(incomplete_csv)}"
+
+
+def read_results(csv_path: str, columns: list = None, filters=None) -> 'pandas.DataFrame':
+    """读取结果 (所有栏位为字符串)；columns 限定栏位，
+    filters 为 pyarrow 表达式 (如 pyarrow.dataset.field('藥品代號') == 'A000072100')，仅 Parquet 支持"""
+    import pandas as pd
+
+    if use_parquet():
+        files = _batch_files(csv_path)
+        if not files:
+            return pd.DataFrame(columns=columns or [])
+        return ds.dataset(files, format='parquet').to_table(columns=columns, filter=filters).to_pandas()
+    if filters is not None:
+        raise ValueError("CSV 结果不支持 filters，请设置 OUTPUT_FORMAT = 'parquet'")
+    if not os.path.exists(csv_path):
+        return pd.DataFrame(columns=columns or [])
+    return pd.read_csv(csv_path, encoding='utf-8-sig', usecols=columns, dtype=str, keep_default_na=False)
+
+
+def read_codes(csv_path: str) -> list:
+    """只读取药品代号栏"""
+    return read_results(csv_path, columns=[CODE_COLUMN])[CODE_COLUMN].tolist()
+
+
+def count_results(csv_path: str) -> int:
+    """结果行数；Parquet 只读取文件尾的元数据"""
+    if use_parquet():
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in _batch_files(csv_path))
+    if not os.path.exists(csv_path):
+        return 0
+    return len(read_results(csv_path, columns=[CODE_COLUMN]))
+
+
+def remove(csv_path: str):
+    """删除结果 (CSV文件与 Parquet 资料集)"""
+    if os.path.exists(csv_path):
+        os.remove(csv_path)
+    shutil.rmtree(parquet_path(csv_path), ignore_errors=True)
+
+
+# 由CSV导入 Parquet 资料集时每个批次文件的行数
+IMPORT_CHUNK_ROWS = 50000
+
+
+def import_csv(csv_path: str) -> int:
+    """由CSV改用 Parquet 时，将现有CSV的行导入 (尚无批次文件的) 资料集，返回导入的行数；
+    须在进度账本同步前调用，否则账本按空资料集重建，已处理的药物会全部重新处理"""
+    if not use_parquet() or _batch_files(csv_path) or not os.path.exists(csv_path):
+        return 0
+    import pandas as pd
+
+    imported = 0
+    for chunk in pd.read_csv(csv_path, encoding='utf-8-sig', dtype=str, keep_default_na=False,
+                             chunksize=IMPORT_CHUNK_ROWS):
+        append_results(csv_path, chunk.to_dict('records'), chunk.columns.tolist())
+        imported += len(chunk)
+    if imported:
+        logging.info(f"已将现有CSV的 {imported} 行导入 Parquet 资料集: {parquet_path(csv_path)}")
+    return imported
+
+
+def _csv_codes(csv_path: str) -> set:
+    import pandas as pd
+
+    return set(pd.read_csv(csv_path, encoding='utf-8-sig', usecols=[CODE_COLUMN], dtype=str,
+                           keep_default_na=False)[CODE_COLUMN])
+
+
+def export_csv(csv_path: str) -> bool:
+    """由 Parquet 资料集重新生成CSV (非 Parquet 模式时不需导出，返回 False)；
+    现有CSV含有资料集中没有的药物时 (未经 import_csv 导入) 不覆盖，返回 False"""
+    if not use_parquet() or not _batch_files(csv_path):
+        return False
+    if os.path.exists(csv_path):
+        missing = _csv_codes(csv_path) - set(read_codes(csv_path))
+        if missing:
+            logging.error(
+                f"CSV中有 {len(missing)} 种药物不在 Parquet 资料集中，未导出以免覆盖: {csv_path} "
+                f"(请先以 import_csv 导入)"
+            )
+            return False
+    tmp_path = f"{csv_path}.tmp"
+    header = True
+    with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+        for path in _batch_files(csv_path):
+            pq.read_table(path).to_pandas().to_csv(f, header=header, index=False)
+            header = False
+    os.replace(tmp_path, csv_path)
+    logging.info(f"已由 Parquet 导出CSV: {csv_path}")
+    return True
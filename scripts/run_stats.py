@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+提取结果统计
+在每次检查点累加完整/不完整行数、各栏位填充数与各来源提供的栏位数，
+保存为输出目录中的 JSON 文件，汇总时无需重新读取输出
+
+查看统计:
+    python run_extraction_pipeline.py --stats
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV, RUN_STATS_FILE
+from scripts import result_store
+from scripts.extraction_fields import FIELDS, is_filled
+
+# 由输出重建统计时无法得知来源
+UNKNOWN_SOURCE = 'unrecorded'
+
+
+def _empty() -> dict:
+    return {
+        'complete': 0,
+        'incomplete': 0,
+        'fields': dict.fromkeys(FIELDS, 0),
+        'sources': {},
+        'output_signature': None,
+        'updated_at': None
+    }
+
+
+class RunStats:
+    """累计统计；output_signature 与输出不一致时 (输出在统计之外被修改) 由输出重建"""
+
+    def __init__(self, path: str = RUN_STATS_FILE, output_csv: str = OUTPUT_CSV,
+                 incomplete_csv: str = INCOMPLETE_OUTPUT_CSV):
+        self.path = path
+        self.output_csv = output_csv
+        self.incomplete_csv = incomplete_csv
+        self.data = _empty()
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.data.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"读取统计文件失败，将由输出重建: {e}")
+
+    def _signature(self) -> str:
+        return result_store.output_signature(self.output_csv, self.incomplete_csv)
+
+    def is_current(self) -> bool:
+        return self.data['output_signature'] == self._signature()
+
+    def sync(self):
+        """统计与输出不一致时，只读取药品代号与三个栏位重建 (来源记为 unrecorded)"""
+        if self.is_current():
+            return
+        logging.info("统计文件与输出不一致，由输出重建")
+        self.data = _empty()
+        for path, complete in ((self.output_csv, True), (self.incomplete_csv, False)):
+            if result_store.exists(path):
+                rows = result_store.read_results(path, columns=list(FIELDS)).to_dict('records')
+                self.add_rows(rows, complete)
+        self.save()
+
+    def add_rows(self, rows: list, complete: bool):
+        """累加一批输出行；行中的 _sources 为 {栏位: 提供该栏位的步骤}"""
+        self.data['complete' if complete else 'incomplete'] += len(rows)
+        fields, sources = self.data['fields'], self.data['sources']
+        for row in rows:
+            row_sources = row.get('_sources') or {}
+            for field in FIELDS:
+                if not is_filled(row.get(field)):
+                    continue
+                fields[field] += 1
+                counts = sources.setdefault(row_sources.get(field, UNKNOWN_SOURCE), dict.fromkeys(FIELDS, 0))
+                counts[field] += 1
+
+    def merge(self, other: 'RunStats'):
+        """加入另一份统计 (分片合并时使用)"""
+        self.data['complete'] += other.data['complete']
+        self.data['incomplete'] += other.data['incomplete']
+        for field in FIELDS:
+            self.data['fields'][field] += other.data['fields'][field]
+        for source, counts in other.data['sources'].items():
+            mine = self.data['sources'].setdefault(source, dict.fromkeys(FIELDS, 0))
+            for field in FIELDS:
+                mine[field] += counts.get(field, 0)
+
+    def save(self):
+        """以当前输出签名原子写入统计文件"""
+        self.data['output_signature'] = self._signature()
+        self.data['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def report_lines(self) -> list:
+        data = self.data
+        total = data['complete'] + data['incomplete']
+        lines = [
+            f"药物总数: {total} (完整 {data['complete']}, 不完整 {data['incomplete']})",
+            "栏位填充率: " + ", ".join(
+                f"{field} {data['fields'][field]} ({data['fields'][field] / total:.1%})" if total else f"{field} 0"
+                for field in FIELDS
+            ),
+        ]
+        for source, counts in sorted(data['sources'].items(), key=lambda item: -sum(item[1].values())):
+            lines.append(f"来源 {source}: " + ", ".join(f"{field} {counts[field]}" for field in FIELDS))
+        if data['updated_at']:
+            lines.append(f"更新时间: {data['updated_at']}")
+        return lines
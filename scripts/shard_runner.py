@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+分片多进程执行
+按药品代号哈希将待处理药物分为 N 片，每片在独立进程中执行 multi_source_extraction.main，
+写入各自的部分输出与进度账本；全部完成后按输入文件顺序合并到 OUTPUT_CSV 与 INCOMPLETE_OUTPUT_CSV
+"""
+
+import glob
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import INPUT_CSV, OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV, SHARD_DIR, LOG_DIR
+from scripts.drug_input import CODE_COLUMN, DrugInput
+from scripts.progress_ledger import ProgressLedger
+from scripts import result_store
+from scripts.run_stats import RunStats
+
+
+def shard_paths(index: int, count: int) -> tuple:
+    """分片的 (完整输出, 不完整输出, 进度账本) 路径"""
+    suffix = f"{index:03d}-of-{count:03d}"
+    return (
+        os.path.join(SHARD_DIR, f"complete-{suffix}.csv"),
+        os.path.join(SHARD_DIR, f"incomplete-{suffix}.csv"),
+        os.path.join(SHARD_DIR, f"ledger-{suffix}.sqlite"),
+    )
+
+
+def shard_stats(index: int, count: int) -> RunStats:
+    """分片自己的结果统计"""
+    output_csv, incomplete_csv, _ = shard_paths(index, count)
+    return RunStats(os.path.join(SHARD_DIR, f"stats-{index:03d}-of-{count:03d}.json"), output_csv, incomplete_csv)
+
+
+def run_shard(index: int, count: int):
+    """子进程入口：日志写入分片自己的文件，再执行一个分片"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - %(levelname)s - [分片 {index}] %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(LOG_DIR, f"multi_source_extraction.shard{index:03d}.log"), mode='w', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+    from scripts.multi_source_extraction import main as extraction_main
+    from scripts.async_fetcher import HAS_AIOHTTP, get_fetcher
+    try:
+        extraction_main(shard=(index, count))
+    finally:
+        if HAS_AIOHTTP:
+            get_fetcher().close()
+
+
+def _part_names(prefix: str) -> list:
+    """分片部分输出的CSV路径 (Parquet 模式下对应同名的 .parquet 目录)"""
+    paths = glob.glob(os.path.join(SHARD_DIR, f"{prefix}-*.csv")) + glob.glob(os.path.join(SHARD_DIR, f"{prefix}-*.parquet"))
+    return sorted({os.path.splitext(path)[0] + '.csv' for path in paths})
+
+
+def _read_parts(prefix: str) -> pd.DataFrame:
+    frames = [result_store.read_results(path) for path in _part_names(prefix) if result_store.exists(path)]
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _append_in_input_order(parts: pd.DataFrame, target: str, positions: dict, merged: set) -> pd.DataFrame:
+    """将尚未合并的行按输入文件顺序追加到目标输出，返回追加的行"""
+    if parts.empty:
+        return parts
+    parts = parts[~parts[CODE_COLUMN].isin(merged)]
+    order = parts[CODE_COLUMN].map(lambda code: positions.get(code, len(positions)))
+    parts = parts.iloc[order.argsort(kind='stable')]
+    if not parts.empty:
+        result_store.append_results(target, parts.to_dict('records'), parts.columns.tolist())
+        logging.info(f"合并分片结果: {len(parts)} 条记录 -> {target}")
+    return parts
+
+
+def _merge_stats(stats: RunStats, appended: list, skipped: bool):
+    """将各分片统计加入主统计；部分行先前已合并过 (合并中断后重跑) 时，
+    改由本次追加的行 (appended: [(行, 是否完整)]) 计算，来源记为 unrecorded"""
+    if skipped:
+        for rows, complete in appended:
+            stats.add_rows(rows.to_dict('records'), complete)
+        return
+    shards = set()
+    for path in _part_names("complete") + _part_names("incomplete"):
+        # complete-000-of-004.csv -> (0, 4)
+        suffix = os.path.basename(path)[:-len('.csv')].split('-', 1)[1]
+        shards.add(tuple(int(part) for part in suffix.split('-of-')))
+    for index, count in sorted(shards):
+        shard = shard_stats(index, count)
+        shard.sync()
+        stats.merge(shard)
+
+
+def merge_shards(input_csv: str = INPUT_CSV) -> int:
+    """合并 SHARD_DIR 中所有分片的部分输出 (包括上次中断留下的)，返回合并的药物数；
+    已在主进度账本中的药物不重复写入，因此合并中断后可安全重跑"""
+    complete = _read_parts("complete")
+    incomplete = _read_parts("incomplete")
+    if complete.empty and incomplete.empty:
+        return 0
+
+    positions = {}
+    for position, code in enumerate(DrugInput(input_csv).codes()):
+        positions.setdefault(code, position)
+
+    ledger = ProgressLedger(OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV)
+    stats = RunStats()
+    try:
+        ledger.sync()
+        stats.sync()
+        merged = ledger.processed_codes()
+        appended_complete = _append_in_input_order(complete, OUTPUT_CSV, positions, merged)
+        appended_incomplete = _append_in_input_order(incomplete, INCOMPLETE_OUTPUT_CSV, positions, merged)
+        ledger.record_batch(
+            appended_complete[CODE_COLUMN].tolist() if not appended_complete.empty else [],
+            appended_incomplete[CODE_COLUMN].tolist() if not appended_incomplete.empty else []
+        )
+        appended = len(appended_complete) + len(appended_incomplete)
+        _merge_stats(
+            stats, [(appended_complete, True), (appended_incomplete, False)],
+            skipped=appended < len(complete) + len(incomplete)
+        )
+        stats.save()
+    finally:
+        ledger.close()
+
+    for path in glob.glob(os.path.join(SHARD_DIR, "*")):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return appended
+
+
+def run_sharded(shard_count: int) -> bool:
+    """以 shard_count 个进程处理全部待处理药物并合并结果；所有分片成功时返回 True"""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    # 由CSV改用 Parquet 后的首次运行，先将现有结果导入资料集 (合并与各分片都以主账本为准)
+    result_store.import_csv(OUTPUT_CSV)
+    result_store.import_csv(INCOMPLETE_OUTPUT_CSV)
+    leftover = merge_shards()
+    if leftover:
+        logging.info(f"已合并上次运行留下的 {leftover} 条分片结果")
+
+    # 主进度账本先与输出同步，各分片进程只读取
+    ledger = ProgressLedger(OUTPUT_CSV, INCOMPLETE_OUTPUT_CSV)
+    ledger.sync()
+    ledger.close()
+
+    # TFDA 快照与 NHI 对照表先在父进程建立，避免各分片同时下载与写入
+    from scripts.tfda_snapshot import ensure_snapshot
+    from scripts.nhi_reference import load_table
+    ensure_snapshot()
+    load_table()
+
+    logging.info(f"分片模式: {shard_count} 个进程")
+    succeeded = True
+    # spawn 启动的子进程不继承父进程的线程与网络连接
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=shard_count, mp_context=context) as executor:
+        futures = {executor.submit(run_shard, index, shard_count): index for index in range(shard_count)}
+        for future, index in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"分片 {index} 执行失败: {e}")
+                succeeded = False
+
+    # 失败分片已完成的批次也一并合并，重跑时只处理剩余药物
+    logging.info(f"分片结果合并完成: {merge_shards()} 种药物")
+    result_store.export_csv(OUTPUT_CSV)
+    result_store.export_csv(INCOMPLETE_OUTPUT_CSV)
+    return succeeded
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+多级流水线执行器
+每一级各有独立的队列与工作线程池，项目依序流经各级，
+已完成的项目直接跳到出口；不同项目可同时处于不同级，使网络与LLM工作互相重叠
+"""
+
+import logging
+import queue
+import threading
+
+_STOP = object()
+
+
+class PipelineItem:
+    """流水线中的一个项目，payload 由各级处理函数读写"""
+
+    __slots__ = ('index', 'payload', 'error')
+
+    def __init__(self, index: int, payload):
+        self.index = index
+        self.payload = payload
+        self.error = None
+
+
+class StagePipeline:
+    """stages 为 [(名称, 处理函数, 工作线程数)]；处理函数接收 payload 并就地更新，
+    is_done(payload) 为真时项目不再进入后续各级"""
+
+    def __init__(self, stages: list, is_done, max_in_flight: int = None):
+        self.stages = stages
+        self.is_done = is_done
+        self.max_in_flight = max_in_flight or max(2, 2 * sum(workers for _, _, workers in stages))
+        self._queues = [queue.Queue() for _ in stages]
+        self._output = queue.Queue()
+        self.processed = {name: 0 for name, _, _ in stages}
+        self._stats_lock = threading.Lock()
+
+    def _forward(self, item: PipelineItem, next_stage: int):
+        """送往下一级；已完成、出错或已是最后一级时送往出口"""
+        if item.error is not None or next_stage >= len(self.stages) or self.is_done(item.payload):
+            self._output.put(item)
+        else:
+            self._queues[next_stage].put(item)
+
+    def _worker(self, stage_index: int):
+        name, func, _ = self.stages[stage_index]
+        stage_queue = self._queues[stage_index]
+        while True:
+            item = stage_queue.get()
+            if item is _STOP:
+                return
+            try:
+                func(item.payload)
+                with self._stats_lock:
+                    self.processed[name] += 1
+            except Exception as e:
+                logging.error(f"流水线阶段 {name} 处理失败: {e}")
+                item.error = e
+            self._forward(item, stage_index + 1)
+
+    def run(self, payloads, skip=None):
+        """依序送入 payloads，按输入顺序产出处理完成的 payload；
+        skip(payload) 为真的项目不进入任何一级，直接按顺序产出"""
+        threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f'stage-{name}-{n}', daemon=True)
+            for i, (name, _, workers) in enumerate(self.stages)
+            for n in range(max(1, workers))
+        ]
+        for thread in threads:
+            thread.start()
+
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        submitted = [0]
+        feeding_done = threading.Event()
+        feed_errors = []
+
+        def feed():
+            try:
+                for payload in payloads:
+                    slots.acquire()
+                    item = PipelineItem(submitted[0], payload)
+                    submitted[0] += 1
+                    if skip is not None and skip(payload):
+                        self._output.put(item)
+                    else:
+                        self._forward(item, 0)
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                feeding_done.set()
+                self._output.put(None)
+
+        feeder = threading.Thread(target=feed, name='stage-feeder', daemon=True)
+        feeder.start()
+
+        # 重排缓冲：只在下一个序号到达时产出，保证输出顺序与输入一致
+        buffered = {}
+        next_index = 0
+        try:
+            while not (feeding_done.is_set() and next_index >= submitted[0]):
+                item = self._output.get()
+                if item is None:
+                    continue
+                buffered[item.index] = item
+                while next_index in buffered:
+                    ready = buffered.pop(next_index)
+                    next_index += 1
+                    slots.release()
+                    if ready.error is not None:
+                        raise ready.error
+                    yield ready.payload
+            if feed_errors:
+                raise feed_errors[0]
+        finally:
+            for stage_queue, (_, _, workers) in zip(self._queues, self.stages):
+                for _ in range(max(1, workers)):
+                    stage_queue.put(_STOP)
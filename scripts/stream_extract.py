@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+流式网页正文提取
+边下载边以 html.parser 增量解析，只保留「適應症/用法/注意事項/dosage」等标题附近的段落，
+收集到足够字数后即停止下载与解析；页面没有相关段落时退回页面开头的正文
+"""
+
+import codecs
+import re
+from html.parser import HTMLParser
+
+# 相关段落的关键词 (英文比较时不分大小写)
+RELEVANT_KEYWORDS = (
+    '適應症', '用法', '用量', '劑量', '注意事項', '副作用', '禁忌', '警語',
+    'indication', 'dosage', 'dose', 'administration', 'contraindication',
+    'side effect', 'adverse', 'warning', 'precaution'
+)
+# 其中的文字不属于正文
+SKIP_TAGS = {'head', 'script', 'style', 'noscript', 'template', 'svg', 'nav', 'footer', 'aside', 'form'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'dt', 'th', 'summary', 'caption', 'legend'}
+# 相关章节在其标题所在的容器结束时结束 (p、li 等可省略结束标签，不作为容器)
+CONTAINER_TAGS = {
+    'div', 'section', 'article', 'main', 'ul', 'ol', 'dl', 'table', 'blockquote', 'header', 'details'
+}
+BLOCK_TAGS = HEADING_TAGS | CONTAINER_TAGS | {'p', 'li', 'dd', 'tr', 'td', 'br', 'hr', 'pre'}
+# 不超过此字数且含关键词的段落 (如 <p><b>用法用量</b></p>) 视为标题
+HEADING_MAX_CHARS = 20
+# 未由响应头得知编码时，在开头这么多字节内寻找 <meta charset>
+CHARSET_SNIFF_BYTES = 2048
+# 下载时每次读取的字节数 / 解析完整 HTML 时每次送入的字符数
+CHUNK_BYTES = 16 * 1024
+CHUNK_CHARS = 16 * 1024
+
+_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def is_relevant(text: str) -> bool:
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in RELEVANT_KEYWORDS)
+
+
+def sniff_charset(head: bytes, default: str = 'utf-8') -> str:
+    """由 <meta charset> 判断编码，无法判断时返回 default"""
+    match = _CHARSET_PATTERN.search(head[:CHARSET_SNIFF_BYTES])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return default
+
+
+class StreamingExtractor(HTMLParser):
+    """增量解析 HTML；done 为 True 后忽略之后的内容，结果与分块方式无关"""
+
+    def __init__(self, min_chars: int, encoding: str = None):
+        super().__init__(convert_charrefs=True)
+        self.min_chars = min_chars
+        self.encoding = encoding
+        self.done = False
+        self._decoder = None
+        self._skip_depth = 0
+        self._block = []
+        self._containers = []
+        # 相关章节标题所在的容器层数，None 表示不在相关章节内
+        self._section_depth = None
+        self._relevant = []
+        self._relevant_chars = 0
+        self._leading = []
+        self._leading_chars = 0
+
+    def feed_bytes(self, chunk: bytes):
+        """送入一段原始字节 (未指定编码时由首段判断)"""
+        if self._decoder is None:
+            self.encoding = self.encoding or sniff_charset(chunk)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        self.feed(self._decoder.decode(chunk))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in CONTAINER_TAGS:
+                self._containers.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self._flush(heading=tag in HEADING_TAGS)
+            if tag in CONTAINER_TAGS and tag in self._containers:
+                # 关闭到最近一个同名容器 (中间未关闭的容器一并视为结束)
+                while self._containers.pop() != tag:
+                    pass
+                if self._section_depth is not None and len(self._containers) < self._section_depth:
+                    self._section_depth = None
+
+    def handle_data(self, data):
+        if not self.done and not self._skip_depth:
+            self._block.append(data)
+
+    def _flush(self, heading: bool = False):
+        text = ' '.join(''.join(self._block).split())
+        self._block = []
+        if not text or self.done:
+            return
+        if self._leading_chars < self.min_chars:
+            self._leading.append(text)
+            self._leading_chars += len(text)
+
+        relevant = is_relevant(text)
+        if heading or (relevant and len(text) <= HEADING_MAX_CHARS):
+            # 标题决定其后 (同一容器内) 的段落是否属于相关章节
+            self._section_depth = len(self._containers) if relevant else None
+        if relevant or self._section_depth is not None:
+            self._relevant.append(text)
+            self._relevant_chars += len(text)
+            self.done = self._relevant_chars >= self.min_chars
+
+    def close(self):
+        if self._decoder is not None:
+            self.feed(self._decoder.decode(b'', final=True))
+        super().close()
+        self._flush()
+
+    def text(self) -> str:
+        """相关段落；没有相关段落时为页面开头的正文"""
+        return ' '.join(self._relevant or self._leading)
+
+
+def extract_text(html: str, min_chars: int) -> str:
+    """从完整的 HTML (如缓存的网页) 提取，收集足够字数后即停止解析"""
+    extractor = StreamingExtractor(min_chars)
+    for start in range(0, len(html), CHUNK_CHARS):
+        extractor.feed(html[start:start + CHUNK_CHARS])
+        if extractor.done:
+            return extractor.text()
+    extractor.close()
+    return extractor.text()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+搜索摘要解析
+从 Google AI 摘要或 LLM 回答中解析 適應症、用法用量、注意事項 三个栏位，
+所有正则在导入时编译一次，供各搜索脚本共用
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+# 导入项目模块
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from scripts.extraction_fields import FIELDS
+
+INSUFFICIENT = "資訊不足"
+
+_KEYWORDS = "適應症|用法用量|注意事項"
+
+# 解析策略 (原顺序)。后面的策略会覆盖前面策略的结果，
+# 因此每个栏位的最终值 = 有匹配的编号最大策略中的最后一个匹配
+_STRATEGIES = [
+    # 策略1: Markdown格式 (## 1. 適應症（Indications）)
+    re.compile(rf'##\s*\d+\.\s*({_KEYWORDS})[^\n]*\n(.*?)(?=\n##|\Z)', re.DOTALL),
+    # 策略2: Markdown格式 (### **標題**)
+    re.compile(r'### \*\*(.*?)\*\*\n(.*?)(?=\n###|\Z)', re.DOTALL),
+    # 策略3: 簡單標題格式
+    re.compile(rf'({_KEYWORDS})[:：]?\s*(.*?)(?=\n|$)', re.IGNORECASE),
+    # 策略4: 中文標題
+    re.compile(rf'(【({_KEYWORDS})】)\s*(.*?)(?=\n【|$)', re.DOTALL),
+    # 策略5: 數字標題格式 (1. 適應症)
+    re.compile(rf'(\d+\.\s*({_KEYWORDS}))\s*(.*?)(?=\n\d+\.|$)', re.IGNORECASE | re.DOTALL),
+    # 策略6: 冒號分隔格式
+    re.compile(rf'({_KEYWORDS})\s*[:：]\s*(.*?)(?=\n|$)', re.IGNORECASE),
+]
+
+# 策略1、3-6 都需要中文栏位名，策略1、2 都需要 Markdown 标题
+_KEYWORD_PATTERN = re.compile(_KEYWORDS)
+_NEEDS_KEYWORD = (True, False, True, True, True, True)
+_NEEDS_HEADING = (True, True, False, False, False, False)
+
+# 找不到任何标题时的关键句提取
+_DIRECT_PATTERNS = {
+    "適應症": re.compile(r'(用於|治療|適用於)[^。]*?[。\n]', re.IGNORECASE),
+    "用法用量": re.compile(r'(每次|每日|劑量)[^。]*?[。\n]', re.IGNORECASE),
+    "注意事項": re.compile(r'(禁忌|注意|警告)[^。]*?[。\n]', re.IGNORECASE),
+}
+
+# ### **標題** 段落格式
+_SECTION_PATTERN = re.compile(r'### \*\*(.*?)\*\*\n(.*?)(?=\n###|\Z)', re.DOTALL)
+
+# 模擬數據格式：適應症：...用法用量：...注意事項：...
+_LABELED_PATTERNS = {
+    "適應症": re.compile(r'適應症[：:]\s*(.*?)(?=用法用量|注意事項|$)'),
+    "用法用量": re.compile(r'用法用量[：:]\s*(.*?)(?=注意事項|$)'),
+    "注意事項": re.compile(r'注意事項[：:]\s*(.*?)$'),
+}
+
+
+def classify_title(title: str):
+    """标题对应的栏位，无法对应时返回 None"""
+    title = title.strip().lower()
+    if '適應症' in title or 'indication' in title:
+        return "適應症"
+    if '用法用量' in title or 'dosage' in title or '劑量' in title or 'administration' in title:
+        return "用法用量"
+    if '注意事項' in title or 'precaution' in title or 'warning' in title:
+        return "注意事項"
+    return None
+
+
+def _strategy_matches(pattern, text: str):
+    """逐一产出 (栏位, 内容)"""
+    for match in pattern.finditer(text):
+        groups = match.groups()
+        if len(groups) == 2:
+            title, content = groups
+        else:
+            _, title, content = groups
+        field = classify_title(title)
+        if field:
+            yield field, content.strip().replace('\n', ' ')
+
+
+def parse_google_summary(summary_text: str, max_length: int = 200) -> dict:
+    """解析带标题的摘要，结果与依序套用六种策略 (后者覆盖前者) 相同；
+    由编号最大的策略开始，栏位取得值后不再由较前的策略处理，
+    常见的「栏位：内容」格式只需扫描一次"""
+    info = {"適應症": "", "用法用量": "", "注意事項": ""}
+
+    if not summary_text or summary_text.strip() == "":
+        return info
+
+    has_keyword = _KEYWORD_PATTERN.search(summary_text) is not None
+    has_heading = '##' in summary_text
+    resolved = set()
+
+    for index in range(len(_STRATEGIES) - 1, -1, -1):
+        if len(resolved) == len(FIELDS):
+            break
+        if (_NEEDS_KEYWORD[index] and not has_keyword) or (_NEEDS_HEADING[index] and not has_heading):
+            continue
+        found = {}
+        for field, content in _strategy_matches(_STRATEGIES[index], summary_text):
+            if field not in resolved:
+                found[field] = content[:max_length] if content else INSUFFICIENT
+        info.update(found)
+        resolved.update(found)
+
+    # 如果所有欄位都為空，嘗試直接提取關鍵信息
+    if all(not value for value in info.values()):
+        for key, pattern in _DIRECT_PATTERNS.items():
+            match = pattern.search(summary_text)
+            if match:
+                info[key] = match.group(1)[:max_length]
+
+    return info
+
+
+def parse_section_summary(summary_text: str, max_length: int = 150, labeled: bool = False) -> dict:
+    """解析 JSON 或 ### **標題** 段落格式的搜索摘要；
+    labeled 为真时另外支持「適應症：...用法用量：...注意事項：...」格式"""
+    info = {"適應症": "", "用法用量": "", "注意事項": ""}
+    if not summary_text:
+        return info
+
+    # 嘗試解析 JSON 格式的響應
+    try:
+        if isinstance(summary_text, str) and summary_text.strip().startswith('{'):
+            data = json.loads(summary_text)
+            for key in FIELDS:
+                info[key] = data.get(key, "")[:max_length]
+            return info
+    except json.JSONDecodeError:
+        pass
+
+    if labeled and all(f"{key}：" in summary_text for key in FIELDS):
+        for key, pattern in _LABELED_PATTERNS.items():
+            match = pattern.search(summary_text)
+            if match:
+                info[key] = match.group(1).strip()[:max_length]
+        return info
+
+    for title, content in _SECTION_PATTERN.findall(summary_text):
+        title = title.strip()
+        content = content.strip().replace('\n', ' ')
+        if '適應症' in title:
+            info['適應症'] = content
+        elif '用法用量' in title or '劑量' in title:
+            info['用法用量'] = content
+        elif '注意事項' in title:
+            info['注意事項'] = content
+
+    for key, value in info.items():
+        info[key] = value.strip()[:max_length]  # 限制長度
+
+    return info
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+TFDA 开放资料本地快照
+下载一次TFDA药品许可证资料集 (InfoId=36)，以 ETag/Last-Modified 重新验证，
+存为 SQLite 并建立正规化品名索引，供逐笔药物快速查询
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+# 导入项目配置
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.project_config import (
+    SOURCE_URLS, REQUEST_TIMEOUT, TFDA_SNAPSHOT_DB, TFDA_SNAPSHOT_MAX_AGE
+)
+from scripts.concurrency import network_slot
+
+TFDA_PARAMS = {
+    'method': 'openData',
+    'InfoId': '36'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS drugs (
+    id INTEGER PRIMARY KEY,
+    c_name TEXT NOT NULL,
+    e_name TEXT NOT NULL,
+    manuf TEXT NOT NULL,
+    app_manuf TEXT NOT NULL,
+    ingredient TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drugs_c_name ON drugs(c_name);
+CREATE INDEX IF NOT EXISTS idx_drugs_e_name ON drugs(e_name);
+-- 厂商与成份只在品名候选中比对，不需索引 (删除旧版快照的索引以减少重建耗时)
+DROP INDEX IF EXISTS idx_drugs_manuf;
+DROP INDEX IF EXISTS idx_drugs_app_manuf;
+DROP INDEX IF EXISTS idx_drugs_ingredient;
+"""
+
+# 品名子字串索引 (SQLite >= 3.34 支持 trigram 分词)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS drug_names USING fts5(
+    c_name, e_name, content='drugs', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_local = threading.local()
+_refresh_lock = threading.Lock()
+# 本次运行的快照检查结果 (None 为尚未检查)
+_available_this_run = None
+
+
+def normalize_text(value) -> str:
+    """与原比对逻辑一致的正规化：转小写并去除空白"""
+    if value is None:
+        return ''
+    return str(value).lower().replace(' ', '')
+
+
+def _connect(db_path: str = TFDA_SNAPSHOT_DB) -> sqlite3.Connection:
+    """取得当前线程的快照连接"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path)
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logging.warning(f"SQLite不支持trigram索引，品名查询改用全表比对: {e}")
+        connections[db_path] = conn
+    return conn
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'drug_names'"
+    ).fetchone()
+    return row is not None
+
+
+def _get_meta(conn: sqlite3.Connection) -> dict:
+    return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+
+def _set_meta(conn: sqlite3.Connection, values: dict):
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(key, '' if value is None else str(value)) for key, value in values.items()]
+    )
+
+
+def snapshot_row_count(db_path: str = TFDA_SNAPSHOT_DB) -> int:
+    """快照中的药品笔数"""
+    conn = _connect(db_path)
+    return conn.execute("SELECT COUNT(*) FROM drugs").fetchone()[0]
+
+
+def _load_entries(conn: sqlite3.Connection, entries: list, etag: str, last_modified: str):
+    """以单一交易替换快照内容并重建索引"""
+    rows = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        rows.append((
+            normalize_text(entry.get('中文品名', '')),
+            normalize_text(entry.get('英文品名', '')),
+            normalize_text(entry.get('製造廠名稱', '')),
+            normalize_text(entry.get('申請商名稱', '')),
+            normalize_text(entry.get('成份', '')),
+            json.dumps(entry, ensure_ascii=False)
+        ))
+
+    with conn:
+        conn.execute("DELETE FROM drugs")
+        conn.executemany(
+            "INSERT INTO drugs (c_name, e_name, manuf, app_manuf, ingredient, entry) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        if _has_fts(conn):
+            conn.execute("INSERT INTO drug_names(drug_names) VALUES ('rebuild')")
+        _set_meta(conn, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'checked_at': time.time(),
+            'downloaded_at': time.time()
+        })
+    logging.info(f"TFDA快照已更新: {len(rows)} 笔药品 -> {TFDA_SNAPSHOT_DB}")
+
+
+def refresh_snapshot(force: bool = False, db_path: str = TFDA_SNAPSHOT_DB) -> bool:
+    """下载或重新验证TFDA快照，返回快照是否可用"""
+    conn = _connect(db_path)
+    meta = _get_meta(conn)
+    has_rows = snapshot_row_count(db_path) > 0
+
+    checked_at = float(meta.get('checked_at') or 0)
+    if has_rows and not force and time.time() - checked_at < TFDA_SNAPSHOT_MAX_AGE:
+        return True
+
+    headers = {}
+    if has_rows:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    # 重试机制
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            response = requests.get(SOURCE_URLS["TFDA"], params=TFDA_PARAMS, headers=headers, timeout=REQUEST_TIMEOUT)
+
+            if response.status_code == 304:
+                with conn:
+                    _set_meta(conn, {'checked_at': time.time()})
+                logging.info("TFDA快照未变更 (304)，沿用本地快照")
+                return True
+
+            response.raise_for_status()
+
+            # 檢查 Content-Type 是否為 JSON
+            content_type = response.headers.get('Content-Type', '')
+            if 'application/json' not in content_type:
+                debug_dir = Path("logs/debug")
+                debug_dir.mkdir(parents=True, exist_ok=True)
+                error_file = debug_dir / "tfda_error_snapshot.html"
+                with open(error_file, 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+                logging.warning(f"TFDA 返回非JSON內容，已保存到 {error_file}")
+                return has_rows
+
+            all_drugs_data = response.json()
+            if not isinstance(all_drugs_data, list) or len(all_drugs_data) == 0:
+                logging.warning("TFDA 返回空资料，沿用本地快照")
+                return has_rows
+
+            _load_entries(
+                conn, all_drugs_data,
+                response.headers.get('ETag', ''),
+                response.headers.get('Last-Modified', '')
+            )
+            return True
+
+        except requests.exceptions.Timeout:
+            logging.warning(f"TFDA快照请求超时 (尝试 {attempt + 1}/{max_retries})")
+            if attempt < max_retries - 1:
+                time.sleep(2)  # 等待2秒后重试
+                continue
+
+        except requests.exceptions.ConnectionError:
+            logging.warning(f"TFDA快照连接错误 (尝试 {attempt + 1}/{max_retries})")
+            if attempt < max_retries - 1:
+                time.sleep(3)  # 等待3秒后重试
+                continue
+
+        except json.JSONDecodeError:
+            logging.error("TFDA快照 JSON 解析失敗")
+            if attempt < max_retries - 1:
+                time.sleep(1)  # 等待1秒后重试
+                continue
+
+        except Exception as e:
+            logging.error(f"TFDA快照下载失败: {e}")
+            if attempt < max_retries - 1:
+                time.sleep(1)  # 等待1秒后重试
+                continue
+
+    logging.error("TFDA快照更新失败: 超过最大重试次数")
+    return has_rows
+
+
+def ensure_snapshot(db_path: str = TFDA_SNAPSHOT_DB) -> bool:
+    """每次运行只重新验证一次快照并记住结果，之后的查询不再访问数据库或占用网络名额"""
+    global _available_this_run
+    if _available_this_run is None:
+        with _refresh_lock:
+            if _available_this_run is None:
+                # 只有下载或重新验证需要网络名额
+                with network_slot():
+                    _available_this_run = refresh_snapshot(db_path=db_path)
+    return _available_this_run
+
+
+def _name_candidates(conn: sqlite3.Connection, search_name: str):
+    """按原始资料顺序返回品名包含查询字串的药品"""
+    if _has_fts(conn) and len(search_name) >= 3:
+        phrase = '"' + search_name.replace('"', '""') + '"'
+        return conn.execute(
+            "SELECT d.manuf, d.app_manuf, d.ingredient, d.entry FROM drug_names "
+            "JOIN drugs d ON d.id = drug_names.rowid "
+            "WHERE drug_names MATCH ? ORDER BY d.id",
+            (f"{{c_name e_name}} : {phrase}",)
+        )
+    return conn.execute(
+        "SELECT manuf, app_manuf, ingredient, entry FROM drugs "
+        "WHERE instr(c_name, ?) > 0 OR instr(e_name, ?) > 0 ORDER BY id",
+        (search_name, search_name)
+    )
+
+
+def find_entry(drug_name: str, manufacturer: str, ingredient: str, db_path: str = TFDA_SNAPSHOT_DB):
+    """查找第一笔品名相符且厂商或成份相符的药品"""
+    search_drug_name = normalize_text(drug_name)
+    search_manufacturer = normalize_text(manufacturer)
+    search_ingredient = normalize_text(ingredient)
+    if not search_drug_name:
+        return None
+
+    conn = _connect(db_path)
+    for entry_manuf, entry_app_manuf, entry_ingredient, entry in _name_candidates(conn, search_drug_name):
+        manuf_match = search_manufacturer and (search_manufacturer in entry_manuf or search_manufacturer in entry_app_manuf)
+        ingredient_match = search_ingredient and search_ingredient in entry_ingredient
+        if manuf_match or ingredient_match:
+            return json.loads(entry)
+    return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if refresh_snapshot(force='--force' in sys.argv):
+        print(f"TFDA快照可用: {snapshot_row_count()} 笔药品 ({TFDA_SNAPSHOT_DB})")
+    else:
+        print("TFDA快照不可用")
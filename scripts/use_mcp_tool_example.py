@@ -3,6 +3,14 @@ import logging
 import os
 import re
 import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from scripts.summary_parser import parse_section_summary
 
 # --- Configuration ---
 INPUT_CSV = "data/uncomplete-research.csv"
@@ -22,39 +30,7 @@ logger = logging.getLogger(__name__)
 
 def parse_google_summary(summary_text):
     """從 Google 搜尋的 AI 摘要中解析出我們需要的資訊"""
-    info = {"適應症": "", "用法用量": "", "注意事項": ""}
-    if not summary_text:
-        return info
-
-    # 嘗試解析 JSON 格式的響應
-    try:
-        if isinstance(summary_text, str) and summary_text.strip().startswith('{'):
-            data = json.loads(summary_text)
-            info["適應症"] = data.get("適應症", "")[:150]
-            info["用法用量"] = data.get("用法用量", "")[:150]
-            info["注意事項"] = data.get("注意事項", "")[:150]
-            return info
-    except json.JSONDecodeError:
-        pass
-
-    # 如果沒有 JSON，嘗試解析文本格式
-    pattern = re.compile(r'### \*\*(.*?)\*\*\n(.*?)(?=\n###|\Z)', re.DOTALL)
-    matches = pattern.findall(summary_text)
-
-    for title, content in matches:
-        title = title.strip()
-        content = content.strip().replace('\n', ' ')
-        if '適應症' in title:
-            info['適應症'] = content
-        elif '用法用量' in title or '劑量' in title:
-            info['用法用量'] = content
-        elif '注意事項' in title:
-            info['注意事項'] = content
-            
-    for key, value in info.items():
-        info[key] = value.strip()[:150]  # 限制長度
-
-    return info
+    return parse_section_summary(summary_text, max_length=150)
 
 def main():
     """主函數：展示如何使用 MCP 工具進行 Google 搜尋"""
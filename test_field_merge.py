@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+五步法结果合并测试
+已取得的栏位保留较早步骤的值，之后的「資訊不足」或提取失败不会覆盖
+"""
+
+import pytest
+
+from scripts.extraction_fields import FIELDS
+from scripts.multi_source_extraction import merge_step_result
+
+
+def new_status():
+    return dict.fromkeys(FIELDS, False)
+
+
+@pytest.mark.parametrize('later_value', ['資訊不足', '資訊不足 - 關鍵資訊缺失', '模型提取失敗', '模型回傳格式錯誤', ''])
+def test_later_missing_value_keeps_filled_field(later_value):
+    result, status = {}, new_status()
+    status = merge_step_result('tfda', {'適應症': '高血壓', '用法用量': '資訊不足'}, result, status)
+    status = merge_step_result('chinese_search', {'適應症': later_value, '用法用量': later_value}, result, status)
+
+    assert result['適應症'] == '高血壓'
+    assert result['_sources']['適應症'] == 'tfda'
+    assert status == {'適應症': True, '用法用量': False, '注意事項': False}
+
+
+def test_later_filled_value_does_not_replace_earlier_one():
+    result, status = {}, new_status()
+    merge_step_result('tfda', {'適應症': '高血壓'}, result, status)
+    merge_step_result('chinese_search', {'適應症': '心絞痛'}, result, status)
+
+    assert result['適應症'] == '高血壓'
+    assert result['_sources']['適應症'] == 'tfda'
+
+
+def test_missing_field_filled_by_later_step():
+    result, status = {}, new_status()
+    status = merge_step_result('tfda', {'適應症': '高血壓', '注意事項': '模型提取失敗'}, result, status)
+    status = merge_step_result('english_search', {'注意事項': '孕婦禁用', '藥品代號': 'A001'}, result, status)
+
+    assert result['注意事項'] == '孕婦禁用'
+    assert result['_sources'] == {'適應症': 'tfda', '注意事項': 'english_search'}
+    # 非栏位的键照常写入，不记录来源
+    assert result['藥品代號'] == 'A001'
+    assert status == {'適應症': True, '用法用量': False, '注意事項': True}
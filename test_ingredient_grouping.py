@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+成份分组测试
+同组药物共享第2-5步的提取结果，但第1步的Google搜索结果按各自的药品代号取得
+"""
+
+import pandas as pd
+import pytest
+
+from scripts import multi_source_extraction as extraction
+from scripts.ingredient_grouping import ClusterResults
+
+
+def make_row(code: str) -> dict:
+    return {
+        '藥品代號': code, '藥品中文名稱': f'測試錠{code}', '藥品英文名稱': 'TEST TABLETS 5MG',
+        '製造廠名稱': f'廠商{code}', '成份': 'AMLODIPINE', 'ATC_CODE': 'C08CA01', '劑型': '錠劑'
+    }
+
+
+@pytest.fixture
+def tfda_calls(monkeypatch):
+    """以假的第2步取代TFDA查询与LLM，记录每次调用的药物与栏位"""
+    calls = []
+
+    def fake_tfda(drug_info, google_results_df, fields):
+        calls.append((drug_info['藥品代號'], list(fields)))
+        return {field: f"TFDA {field}" for field in fields}
+
+    steps = [
+        extraction.CASCADE_STEPS[0],
+        ("tfda", "第2步: 嘗試TFDA API", fake_tfda, False),
+    ]
+    monkeypatch.setattr(extraction, 'CASCADE_STEPS', steps)
+    return calls
+
+
+def process_cluster(codes: list, google_results_df: pd.DataFrame) -> dict:
+    cluster_results = ClusterResults()
+    rows = [make_row(code) for code in codes]
+    for row in rows:
+        cluster_results.register(row)
+    return {
+        row['藥品代號']: extraction.process_input_row(row, google_results_df, cluster_results)[0]
+        for row in rows
+    }
+
+
+def test_members_use_their_own_step1_rows(tfda_calls):
+    google_results_df = pd.DataFrame([
+        {'藥品代號': 'A001', '適應症': '高血壓', '用法用量': '資訊不足', '注意事項': '資訊不足'},
+        {'藥品代號': 'A002', '適應症': '狹心症', '用法用量': '每日一次', '注意事項': '資訊不足'},
+    ]).set_index('藥品代號')
+
+    rows = process_cluster(['A001', 'A002'], google_results_df)
+
+    assert rows['A001']['適應症'] == '高血壓'
+    assert rows['A002']['適應症'] == '狹心症'
+    assert rows['A002']['用法用量'] == '每日一次'
+    # 代表药物第2步的栏位共享给组内药物
+    assert rows['A002']['注意事項'] == 'TFDA 注意事項'
+    assert rows['A002']['_sources'] == {'適應症': 'google_results', '用法用量': 'google_results', '注意事項': 'tfda'}
+    assert tfda_calls == [('A001', ['用法用量', '注意事項'])]
+
+
+def test_member_without_step1_row_completes_missing_fields(tfda_calls):
+    """代表药物由第1步取得的栏位不共享，成员自行执行后续步骤补齐"""
+    google_results_df = pd.DataFrame([
+        {'藥品代號': 'A001', '適應症': '高血壓', '用法用量': '資訊不足', '注意事項': '資訊不足'},
+    ]).set_index('藥品代號')
+
+    rows = process_cluster(['A001', 'A002'], google_results_df)
+
+    assert rows['A002']['適應症'] == 'TFDA 適應症'
+    assert rows['A002']['用法用量'] == 'TFDA 用法用量'
+    assert tfda_calls == [('A001', ['用法用量', '注意事項']), ('A002', ['適應症'])]
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+进度账本测试
+输出文件在账本之外被修改或删除后，sync() 由输出重建账本
+"""
+
+import os
+
+from scripts import result_store
+from scripts.progress_ledger import STATUS_COMPLETE, ProgressLedger
+
+COLUMNS = ['藥品代號', '適應症']
+
+
+def write_rows(path, codes):
+    result_store.append_results(str(path), [{'藥品代號': code, '適應症': '高血壓'} for code in codes], COLUMNS)
+
+
+def open_ledger(tmp_path):
+    return ProgressLedger(
+        str(tmp_path / 'complete.csv'), str(tmp_path / 'incomplete.csv'), str(tmp_path / 'ledger.sqlite')
+    )
+
+
+def test_record_batch_keeps_ledger_in_sync(tmp_path):
+    """正常登记后签名一致，sync() 不重建"""
+    write_rows(tmp_path / 'complete.csv', ['A001', 'A002'])
+    write_rows(tmp_path / 'incomplete.csv', ['A003'])
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.record_batch(['A001', 'A002'], ['A003'])
+        ledger.sync()
+        assert ledger.processed_codes() == {'A001', 'A002', 'A003'}
+    finally:
+        ledger.close()
+
+
+def test_resync_after_output_rewritten(tmp_path):
+    """手动删掉输出中的一行后，该药物不再视为已处理"""
+    complete = tmp_path / 'complete.csv'
+    write_rows(complete, ['A001', 'A002', 'A003'])
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.record_batch(['A001', 'A002', 'A003'], [])
+    finally:
+        ledger.close()
+
+    os.remove(complete)
+    write_rows(complete, ['A001', 'A003'])
+
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.sync()
+        assert ledger.processed_codes() == {'A001', 'A003'}
+        assert not ledger.is_processed('A002')
+    finally:
+        ledger.close()
+
+
+def test_resync_after_same_size_edit(tmp_path):
+    """等长的修改 (如更正一个药品代号) 不改变文件大小，由修改时间发现"""
+    complete = tmp_path / 'complete.csv'
+    write_rows(complete, ['A001', 'A002'])
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.record_batch(['A001', 'A002'], [])
+        size = complete.stat().st_size
+        mtime_ns = complete.stat().st_mtime_ns
+        complete.write_bytes(complete.read_bytes().replace(b'A002', b'A003'))
+        # 保证修改时间前进 (部分文件系统的时间精度较粗)
+        os.utime(complete, ns=(mtime_ns + 1_000_000_000, mtime_ns + 1_000_000_000))
+        assert complete.stat().st_size == size
+        ledger.sync()
+        assert ledger.processed_codes() == {'A001', 'A003'}
+    finally:
+        ledger.close()
+
+
+def test_resync_after_outputs_removed(tmp_path):
+    """清除全部输出后账本清空，所有药物重新处理"""
+    write_rows(tmp_path / 'complete.csv', ['A001'])
+    write_rows(tmp_path / 'incomplete.csv', ['A002'])
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.record_batch(['A001'], ['A002'])
+        result_store.remove(str(tmp_path / 'complete.csv'))
+        result_store.remove(str(tmp_path / 'incomplete.csv'))
+        ledger.sync()
+        assert ledger.count() == 0
+    finally:
+        ledger.close()
+
+
+def test_resync_from_outputs_appended_outside_ledger(tmp_path):
+    """中断于写入输出与登记之间：由输出补回，同时出现在两个文件的药物只登记一次"""
+    write_rows(tmp_path / 'complete.csv', ['A001'])
+    ledger = open_ledger(tmp_path)
+    try:
+        ledger.record_batch(['A001'], [])
+        write_rows(tmp_path / 'complete.csv', ['A002'])
+        write_rows(tmp_path / 'incomplete.csv', ['A002', 'A003'])
+        ledger.sync()
+        assert ledger.processed_codes() == {'A001', 'A002', 'A003'}
+        assert ledger.count() == 3
+        status = dict(ledger._conn.execute("SELECT drug_code, status FROM progress"))
+        assert status['A002'] == STATUS_COMPLETE
+    finally:
+        ledger.close()
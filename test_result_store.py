@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+结果存储测试
+已有CSV结果时改用 Parquet：现有结果导入资料集，导出的CSV不丢失任何药物
+"""
+
+import pyarrow
+import pyarrow.dataset
+import pyarrow.parquet
+import pytest
+
+from scripts import result_store
+from scripts.progress_ledger import ProgressLedger
+
+COLUMNS = ['藥品代號', '適應症']
+
+
+def write_rows(path, codes):
+    result_store.append_results(str(path), [{'藥品代號': code, '適應症': '高血壓'} for code in codes], COLUMNS)
+
+
+@pytest.fixture
+def csv_results(tmp_path):
+    """CSV模式下已有 A1、A2 两种药物的结果与进度账本"""
+    output_csv = tmp_path / 'complete.csv'
+    write_rows(output_csv, ['A1', 'A2'])
+    ledger = ProgressLedger(str(output_csv), str(tmp_path / 'incomplete.csv'), str(tmp_path / 'ledger.sqlite'))
+    ledger.record_batch(['A1', 'A2'], [])
+    ledger.close()
+    return output_csv
+
+
+@pytest.fixture
+def parquet_mode(monkeypatch):
+    monkeypatch.setattr(result_store, 'OUTPUT_FORMAT', 'parquet')
+    monkeypatch.setattr(result_store, 'HAS_PYARROW', True)
+    monkeypatch.setattr(result_store, 'pa', pyarrow, raising=False)
+    monkeypatch.setattr(result_store, 'ds', pyarrow.dataset, raising=False)
+    monkeypatch.setattr(result_store, 'pq', pyarrow.parquet, raising=False)
+
+
+def test_switch_to_parquet_keeps_csv_results(tmp_path, csv_results, parquet_mode):
+    output_csv = str(csv_results)
+    assert result_store.import_csv(output_csv) == 2
+    # 再次运行时资料集已有批次文件，不重复导入
+    assert result_store.import_csv(output_csv) == 0
+
+    ledger = ProgressLedger(output_csv, str(tmp_path / 'incomplete.csv'), str(tmp_path / 'ledger.sqlite'))
+    try:
+        ledger.sync()
+        assert ledger.processed_codes() == {'A1', 'A2'}
+    finally:
+        ledger.close()
+
+    write_rows(output_csv, ['A3'])
+    assert result_store.export_csv(output_csv)
+    with open(output_csv, encoding='utf-8-sig') as f:
+        assert [line.split(',')[0] for line in f.read().splitlines()] == ['藥品代號', 'A1', 'A2', 'A3']
+
+
+def test_export_does_not_replace_csv_with_rows_missing_from_dataset(csv_results, parquet_mode):
+    output_csv = str(csv_results)
+    before = csv_results.read_bytes()
+    write_rows(output_csv, ['A3'])
+
+    assert not result_store.export_csv(output_csv)
+    assert csv_results.read_bytes() == before
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+分片合并测试
+合并结果按输入文件顺序排列；合并中断后重跑时，已合并的药物不再重复写入
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from scripts import result_store, shard_runner
+from scripts.progress_ledger import ProgressLedger
+from scripts.run_stats import RunStats
+
+COLUMNS = ['藥品代號', '適應症', '用法用量', '注意事項']
+INPUT_CODES = ['A001', 'A002', 'A003', 'A004', 'A005']
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    """将分片目录、主输出、进度账本与统计文件改到临时目录"""
+    shard_dir = tmp_path / 'shards'
+    shard_dir.mkdir()
+    output_csv = str(tmp_path / 'complete.csv')
+    incomplete_csv = str(tmp_path / 'incomplete.csv')
+    ledger_db = str(tmp_path / 'ledger.sqlite')
+    stats_file = str(tmp_path / 'run_stats.json')
+
+    monkeypatch.setattr(shard_runner, 'SHARD_DIR', str(shard_dir))
+    monkeypatch.setattr(shard_runner, 'OUTPUT_CSV', output_csv)
+    monkeypatch.setattr(shard_runner, 'INCOMPLETE_OUTPUT_CSV', incomplete_csv)
+    monkeypatch.setattr(
+        shard_runner, 'ProgressLedger',
+        lambda output, incomplete: ProgressLedger(output, incomplete, ledger_db)
+    )
+    monkeypatch.setattr(
+        shard_runner, 'RunStats',
+        lambda *args: RunStats(*args) if args else RunStats(stats_file, output_csv, incomplete_csv)
+    )
+
+    pd.DataFrame({'藥品代號': INPUT_CODES, '中文品名': '測試藥品'}).to_csv(
+        tmp_path / 'input.csv', index=False, encoding='utf-8-sig'
+    )
+    return tmp_path
+
+
+def write_part(prefix, index, count, codes):
+    complete_csv, incomplete_csv, _ = shard_runner.shard_paths(index, count)
+    path = complete_csv if prefix == 'complete' else incomplete_csv
+    rows = [dict.fromkeys(COLUMNS, '高血壓') | {'藥品代號': code} for code in codes]
+    result_store.append_results(path, rows, COLUMNS)
+
+
+def merge(output_dir):
+    return shard_runner.merge_shards(str(output_dir / 'input.csv'))
+
+
+def test_merge_follows_input_order(output_dir):
+    write_part('complete', 0, 2, ['A004', 'A001'])
+    write_part('complete', 1, 2, ['A005', 'A002'])
+    write_part('incomplete', 1, 2, ['A003'])
+
+    assert merge(output_dir) == 5
+    assert result_store.read_codes(shard_runner.OUTPUT_CSV) == ['A001', 'A002', 'A004', 'A005']
+    assert result_store.read_codes(shard_runner.INCOMPLETE_OUTPUT_CSV) == ['A003']
+    assert os.listdir(shard_runner.SHARD_DIR) == []
+
+
+def test_merge_rerun_skips_merged_codes(output_dir):
+    """模拟合并中途中断：分片输出仍在，其中部分药物已写入主输出"""
+    write_part('complete', 0, 2, ['A001', 'A004'])
+    assert merge(output_dir) == 2
+
+    write_part('complete', 0, 2, ['A001', 'A004'])
+    write_part('complete', 1, 2, ['A002'])
+    write_part('incomplete', 1, 2, ['A003'])
+    assert merge(output_dir) == 2
+
+    assert result_store.read_codes(shard_runner.OUTPUT_CSV) == ['A001', 'A004', 'A002']
+    assert result_store.read_codes(shard_runner.INCOMPLETE_OUTPUT_CSV) == ['A003']
+
+    stats = RunStats(str(output_dir / 'run_stats.json'), shard_runner.OUTPUT_CSV, shard_runner.INCOMPLETE_OUTPUT_CSV)
+    assert stats.is_current()
+    assert (stats.data['complete'], stats.data['incomplete']) == (3, 1)
+
+    # 再次重跑且没有分片输出时不写入任何内容
+    assert merge(output_dir) == 0
+    assert result_store.count_results(shard_runner.OUTPUT_CSV) == 3